@@ -2,6 +2,7 @@ from flask import Flask, jsonify
 from config import Config
 from database.database import init_db
 from routes import init_routes
+from utils.http_cache import init_http_cache
 import os
 
 from flask_cors import CORS
@@ -26,6 +27,9 @@ init_db(app)
 # Enregistrer les routes
 init_routes(app)
 
+# GET conditionnels (ETag / 304) sur les routes de lecture
+init_http_cache(app)
+
 @app.route('/')
 def index():
     """Route racine"""
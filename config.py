@@ -6,6 +6,12 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JSON_SORT_KEYS = False
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max
+    # Processus de rendu des PDF (0 = nombre de cœurs)
+    PDF_WORKERS = int(os.environ.get('PDF_WORKERS') or 0)
+    # Envoi des emails : connexions SMTP simultanées, messages/seconde (0 = sans limite)
+    SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE') or 4)
+    SMTP_RATE_LIMIT = float(os.environ.get('SMTP_RATE_LIMIT') or 10)
+    SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT') or 30)
     # Comma-separated list of allowed CORS origins (example: 'http://localhost:3000,http://example.com')
     # Leave empty to use a sensible localhost-only default in development.
     CORS_ALLOWED_ORIGINS = os.environ.get('CORS_ALLOWED_ORIGINS') or ''
@@ -0,0 +1,325 @@
+"""
+database/aggregates.py
+Tables d'agrégats par session, maintenues par triggers SQLite
+
+- agg_charge_enseignant   : nombre de surveillances par enseignant et session
+- agg_surveillants_creneau: nombre de surveillants par créneau
+- agg_charge_grade_jour   : nombre de surveillances par grade et par jour
+
+Chaque écriture sur `affectation` (optimisation, permutation, ajout/suppression
+unitaire ou par lot) met les compteurs à jour dans la même transaction, ce qui
+permet aux tableaux de bord de lire directement ces tables au lieu de refaire
+des COUNT / GROUP BY sur affectation JOIN creneau JOIN enseignant.
+
+Les compteurs suivent la sémantique des jointures : une affectation n'est
+comptée que si son créneau et son enseignant existent.
+
+Suppressions en cascade : SQLite exécute les triggers BEFORE DELETE du parent
+(creneau, enseignant) avant la cascade, puis supprime les affectations alors
+que le parent n'existe plus. Les triggers du parent retirent donc les
+compteurs en bloc, et ceux d'affectation ne comptent rien (jointure vide).
+"""
+
+AGGREGATE_TABLES = ['agg_charge_enseignant', 'agg_surveillants_creneau', 'agg_charge_grade_jour']
+
+_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS agg_charge_enseignant (
+        id_session INTEGER NOT NULL,
+        code_smartex_ens INTEGER NOT NULL,
+        nb_affectations INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_session, code_smartex_ens)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agg_surveillants_creneau (
+        creneau_id INTEGER PRIMARY KEY,
+        id_session INTEGER NOT NULL,
+        nb_surveillants INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_agg_surveillants_creneau_session
+    ON agg_surveillants_creneau(id_session)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agg_charge_grade_jour (
+        id_session INTEGER NOT NULL,
+        grade_code_ens TEXT NOT NULL,
+        dateExam TEXT NOT NULL,
+        nb_affectations INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (id_session, grade_code_ens, dateExam)
+    )
+    """
+]
+
+
+# ============================================================================
+# CORPS DES TRIGGERS
+# ============================================================================
+
+def _add_affectation(ref):
+    """Compter l'affectation `ref` (NEW ou OLD) dans les trois agrégats"""
+    source = f"""
+        FROM creneau c, enseignant e
+        WHERE c.creneau_id = {ref}.creneau_id
+            AND e.code_smartex_ens = {ref}.code_smartex_ens
+    """
+    return f"""
+        INSERT INTO agg_charge_enseignant (id_session, code_smartex_ens, nb_affectations)
+        SELECT c.id_session, e.code_smartex_ens, 1 {source}
+        ON CONFLICT (id_session, code_smartex_ens)
+        DO UPDATE SET nb_affectations = nb_affectations + 1;
+
+        INSERT INTO agg_surveillants_creneau (creneau_id, id_session, nb_surveillants)
+        SELECT c.creneau_id, c.id_session, 1 {source}
+        ON CONFLICT (creneau_id)
+        DO UPDATE SET nb_surveillants = nb_surveillants + 1;
+
+        INSERT INTO agg_charge_grade_jour (id_session, grade_code_ens, dateExam, nb_affectations)
+        SELECT c.id_session, e.grade_code_ens, c.dateExam, 1 {source}
+        ON CONFLICT (id_session, grade_code_ens, dateExam)
+        DO UPDATE SET nb_affectations = nb_affectations + 1;
+    """
+
+
+def _remove_affectation(ref):
+    """Retirer l'affectation `ref` des trois agrégats (et les compteurs à zéro)"""
+    source = f"""
+        FROM creneau c, enseignant e
+        WHERE c.creneau_id = {ref}.creneau_id
+            AND e.code_smartex_ens = {ref}.code_smartex_ens
+    """
+    return f"""
+        UPDATE agg_charge_enseignant SET nb_affectations = nb_affectations - 1
+        WHERE (id_session, code_smartex_ens) = (SELECT c.id_session, e.code_smartex_ens {source});
+
+        UPDATE agg_surveillants_creneau SET nb_surveillants = nb_surveillants - 1
+        WHERE creneau_id = (SELECT c.creneau_id {source});
+
+        UPDATE agg_charge_grade_jour SET nb_affectations = nb_affectations - 1
+        WHERE (id_session, grade_code_ens, dateExam) = (SELECT c.id_session, e.grade_code_ens, c.dateExam {source});
+
+        DELETE FROM agg_charge_enseignant
+        WHERE (id_session, code_smartex_ens) = (SELECT c.id_session, e.code_smartex_ens {source})
+            AND nb_affectations <= 0;
+        DELETE FROM agg_surveillants_creneau
+        WHERE creneau_id = {ref}.creneau_id AND nb_surveillants <= 0;
+        DELETE FROM agg_charge_grade_jour
+        WHERE (id_session, grade_code_ens, dateExam) = (SELECT c.id_session, e.grade_code_ens, c.dateExam {source})
+            AND nb_affectations <= 0;
+    """
+
+
+def _remove_creneau(ref):
+    """Retirer en bloc les affectations du créneau `ref` (valeurs de OLD)"""
+    return f"""
+        UPDATE agg_charge_enseignant SET nb_affectations = nb_affectations - (
+            SELECT COUNT(*) FROM affectation a
+            JOIN enseignant e ON e.code_smartex_ens = a.code_smartex_ens
+            WHERE a.creneau_id = {ref}.creneau_id
+                AND a.code_smartex_ens = agg_charge_enseignant.code_smartex_ens
+        )
+        WHERE id_session = {ref}.id_session
+            AND code_smartex_ens IN (SELECT code_smartex_ens FROM affectation WHERE creneau_id = {ref}.creneau_id);
+
+        UPDATE agg_charge_grade_jour SET nb_affectations = nb_affectations - (
+            SELECT COUNT(*) FROM affectation a
+            JOIN enseignant e ON e.code_smartex_ens = a.code_smartex_ens
+            WHERE a.creneau_id = {ref}.creneau_id
+                AND e.grade_code_ens = agg_charge_grade_jour.grade_code_ens
+        )
+        WHERE id_session = {ref}.id_session AND dateExam = {ref}.dateExam;
+
+        DELETE FROM agg_charge_enseignant WHERE id_session = {ref}.id_session AND nb_affectations <= 0;
+        DELETE FROM agg_charge_grade_jour WHERE id_session = {ref}.id_session AND nb_affectations <= 0;
+    """
+
+
+def _add_creneau(ref):
+    """Compter en bloc les affectations du créneau `ref` (valeurs de NEW)"""
+    return f"""
+        INSERT INTO agg_charge_enseignant (id_session, code_smartex_ens, nb_affectations)
+        SELECT {ref}.id_session, a.code_smartex_ens, COUNT(*)
+        FROM affectation a
+        JOIN enseignant e ON e.code_smartex_ens = a.code_smartex_ens
+        WHERE a.creneau_id = {ref}.creneau_id
+        GROUP BY a.code_smartex_ens
+        ON CONFLICT (id_session, code_smartex_ens)
+        DO UPDATE SET nb_affectations = nb_affectations + excluded.nb_affectations;
+
+        INSERT INTO agg_charge_grade_jour (id_session, grade_code_ens, dateExam, nb_affectations)
+        SELECT {ref}.id_session, e.grade_code_ens, {ref}.dateExam, COUNT(*)
+        FROM affectation a
+        JOIN enseignant e ON e.code_smartex_ens = a.code_smartex_ens
+        WHERE a.creneau_id = {ref}.creneau_id
+        GROUP BY e.grade_code_ens
+        ON CONFLICT (id_session, grade_code_ens, dateExam)
+        DO UPDATE SET nb_affectations = nb_affectations + excluded.nb_affectations;
+    """
+
+
+def _remove_enseignant_grade(ref):
+    """Retirer les affectations de l'enseignant `ref` du compteur de son grade"""
+    return f"""
+        UPDATE agg_charge_grade_jour SET nb_affectations = nb_affectations - (
+            SELECT COUNT(*) FROM affectation a
+            JOIN creneau c ON c.creneau_id = a.creneau_id
+            WHERE a.code_smartex_ens = {ref}.code_smartex_ens
+                AND c.id_session = agg_charge_grade_jour.id_session
+                AND c.dateExam = agg_charge_grade_jour.dateExam
+        )
+        WHERE grade_code_ens = {ref}.grade_code_ens;
+
+        DELETE FROM agg_charge_grade_jour
+        WHERE grade_code_ens = {ref}.grade_code_ens AND nb_affectations <= 0;
+    """
+
+
+_TRIGGERS_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_affectation_insert
+    AFTER INSERT ON affectation
+    BEGIN
+        {_add_affectation('NEW')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_affectation_delete
+    AFTER DELETE ON affectation
+    BEGIN
+        {_remove_affectation('OLD')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_affectation_update
+    AFTER UPDATE OF code_smartex_ens, creneau_id ON affectation
+    BEGIN
+        {_remove_affectation('OLD')}
+        {_add_affectation('NEW')}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_creneau_delete
+    BEFORE DELETE ON creneau
+    BEGIN
+        {_remove_creneau('OLD')}
+        DELETE FROM agg_surveillants_creneau WHERE creneau_id = OLD.creneau_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_creneau_update
+    AFTER UPDATE OF id_session, dateExam ON creneau
+    BEGIN
+        {_remove_creneau('OLD')}
+        {_add_creneau('NEW')}
+        UPDATE agg_surveillants_creneau SET id_session = NEW.id_session
+        WHERE creneau_id = NEW.creneau_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_enseignant_delete
+    BEFORE DELETE ON enseignant
+    BEGIN
+        {_remove_enseignant_grade('OLD')}
+        DELETE FROM agg_charge_enseignant WHERE code_smartex_ens = OLD.code_smartex_ens;
+
+        UPDATE agg_surveillants_creneau SET nb_surveillants = nb_surveillants - (
+            SELECT COUNT(*) FROM affectation a
+            JOIN creneau c ON c.creneau_id = a.creneau_id
+            WHERE a.code_smartex_ens = OLD.code_smartex_ens
+                AND a.creneau_id = agg_surveillants_creneau.creneau_id
+        )
+        WHERE creneau_id IN (SELECT creneau_id FROM affectation WHERE code_smartex_ens = OLD.code_smartex_ens);
+        DELETE FROM agg_surveillants_creneau
+        WHERE creneau_id IN (SELECT creneau_id FROM affectation WHERE code_smartex_ens = OLD.code_smartex_ens)
+            AND nb_surveillants <= 0;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_agg_enseignant_grade
+    AFTER UPDATE OF grade_code_ens ON enseignant
+    BEGIN
+        {_remove_enseignant_grade('OLD')}
+
+        INSERT INTO agg_charge_grade_jour (id_session, grade_code_ens, dateExam, nb_affectations)
+        SELECT c.id_session, NEW.grade_code_ens, c.dateExam, COUNT(*)
+        FROM affectation a
+        JOIN creneau c ON c.creneau_id = a.creneau_id
+        WHERE a.code_smartex_ens = NEW.code_smartex_ens
+        GROUP BY c.id_session, c.dateExam
+        ON CONFLICT (id_session, grade_code_ens, dateExam)
+        DO UPDATE SET nb_affectations = nb_affectations + excluded.nb_affectations;
+    END
+    """
+]
+
+
+# ============================================================================
+# CRÉATION / RECALCUL
+# ============================================================================
+
+def create_aggregate_tables(cursor):
+    """Créer les tables d'agrégats et leurs triggers (idempotent)"""
+    for sql in _TABLES_SQL + _TRIGGERS_SQL:
+        cursor.execute(sql)
+
+
+def rebuild_aggregates(db, id_session=None):
+    """
+    Recalculer entièrement les agrégats (d'une session ou de toutes)
+
+    Utile pour initialiser les tables sur une base existante ; en
+    fonctionnement normal les triggers suffisent.
+    """
+    where = 'WHERE c.id_session = :id_session' if id_session is not None else ''
+    params = {'id_session': id_session}
+
+    for table in AGGREGATE_TABLES:
+        if id_session is None:
+            db.execute(f'DELETE FROM {table}')
+        else:
+            db.execute(f'DELETE FROM {table} WHERE id_session = :id_session', params)
+
+    source = f'''
+        FROM affectation a
+        JOIN creneau c ON c.creneau_id = a.creneau_id
+        JOIN enseignant e ON e.code_smartex_ens = a.code_smartex_ens
+        {where}
+    '''
+    db.execute(f'''
+        INSERT INTO agg_charge_enseignant (id_session, code_smartex_ens, nb_affectations)
+        SELECT c.id_session, a.code_smartex_ens, COUNT(*) {source}
+        GROUP BY c.id_session, a.code_smartex_ens
+    ''', params)
+    db.execute(f'''
+        INSERT INTO agg_surveillants_creneau (creneau_id, id_session, nb_surveillants)
+        SELECT c.creneau_id, c.id_session, COUNT(*) {source}
+        GROUP BY c.creneau_id
+    ''', params)
+    db.execute(f'''
+        INSERT INTO agg_charge_grade_jour (id_session, grade_code_ens, dateExam, nb_affectations)
+        SELECT c.id_session, e.grade_code_ens, c.dateExam, COUNT(*) {source}
+        GROUP BY c.id_session, e.grade_code_ens, c.dateExam
+    ''', params)
+
+
+def ensure_aggregate_tables(db):
+    """
+    Créer (et remplir) les agrégats sur une base qui ne les a pas encore
+
+    Returns:
+        bool: False si le schéma de base (affectation...) n'existe pas encore
+    """
+    existing = {row[0] for row in db.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    ).fetchall()}
+    if not {'affectation', 'creneau', 'enseignant'} <= existing:
+        return False
+
+    missing = not set(AGGREGATE_TABLES) <= existing
+    create_aggregate_tables(db)
+    if missing:
+        rebuild_aggregates(db)
+    db.commit()
+    return True
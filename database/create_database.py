@@ -1,6 +1,10 @@
 import sqlite3
 import os
 
+from database.aggregates import create_aggregate_tables
+from utils.email_outbox import ensure_outbox_table
+from utils.import_engine import ensure_import_history_tables
+
 DB_NAME = 'surveillance.db'
 
 def create_database():
@@ -90,6 +94,11 @@ def create_database():
         CREATE INDEX IF NOT EXISTS idx_creneau_date
         ON creneau(dateExam, h_debut)
     """)
+    # Clé de l'UPSERT lors de l'import des créneaux
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_creneau_session_salle
+        ON creneau(id_session, dateExam, h_debut, cod_salle)
+    """)
     print("✅ Table 'creneau' créée")
     
     # =========================================================================
@@ -140,6 +149,11 @@ def create_database():
         CREATE INDEX IF NOT EXISTS idx_voeu_session
         ON voeu(id_session)
     """)
+    # Clé de l'UPSERT lors de l'import des vœux
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_voeu_ens_session_jour_seance
+        ON voeu(code_smartex_ens, id_session, jour, seance)
+    """)
     print("✅ Table 'voeu' créée")
     
     # =========================================================================
@@ -255,6 +269,24 @@ def create_database():
     """)
     print("✅ Table 'responsable_absent_jour_examen' créée")
 
+    # =========================================================================
+    # TABLES: import_fichier / import_fichier_ligne (historique des uploads)
+    # =========================================================================
+    ensure_import_history_tables(cursor)
+    print("✅ Tables 'import_fichier' et 'import_fichier_ligne' créées")
+
+    # =========================================================================
+    # TABLES: agrégats par session (maintenus par triggers sur affectation)
+    # =========================================================================
+    create_aggregate_tables(cursor)
+    print("✅ Tables d'agrégats 'agg_charge_enseignant', 'agg_surveillants_creneau', 'agg_charge_grade_jour' créées")
+
+    # =========================================================================
+    # TABLE: email_outbox (file d'envoi durable des emails)
+    # =========================================================================
+    ensure_outbox_table(cursor)
+    print("✅ Table 'email_outbox' créée")
+
     print("\n✅ Base de données créée avec succès")
     print("✅ Tables créées : grade, session, enseignant, creneau, jour_seance, voeu, affectation, salle_par_creneau")
     
@@ -1,6 +1,10 @@
 import sqlite3
 from flask import g
 from config import Config
+from database.aggregates import ensure_aggregate_tables
+
+# Bases dont les tables d'agrégats ont déjà été vérifiées par ce processus
+_aggregates_ready = set()
 
 def get_db():
     """Obtenir une connexion à la base de données"""
@@ -9,6 +13,9 @@ def get_db():
         g.db.row_factory = sqlite3.Row  # Permet d'accéder aux colonnes par nom
         # IMPORTANT : Activer les contraintes de clés étrangères (nécessaire pour ON DELETE CASCADE)
         g.db.execute("PRAGMA foreign_keys = ON")
+        # Bases créées avant les agrégats : les créer et les remplir une fois
+        if Config.DB_NAME not in _aggregates_ready and ensure_aggregate_tables(g.db):
+            _aggregates_ready.add(Config.DB_NAME)
     return g.db
 
 def close_db(e=None):
@@ -21,6 +28,77 @@ def init_db(app):
     """Initialiser la base de données"""
     app.teardown_appcontext(close_db)
 
+# Calcul ensembliste : un seul INSERT ... SELECT agrège, par responsable,
+# ses jours d'examen et la présence (ou non) d'une affectation ce jour-là.
+# {filtre} permet de restreindre le calcul à quelques responsables.
+_RESPONSABLES_ABSENTS_SQL = '''
+    INSERT INTO responsable_absent_jour_examen (
+        id_session,
+        code_smartex_ens,
+        nom,
+        prenom,
+        grade_code,
+        participe_surveillance,
+        nbre_jours_absents,
+        nbre_creneaux_absents,
+        nbre_total_jours_responsable,
+        nbre_total_creneaux_responsable,
+        dates_absentes
+    )
+    WITH jours AS (
+        SELECT c.enseignant AS responsable,
+               c.dateExam,
+               COUNT(*) AS nbre_creneaux_ce_jour
+        FROM creneau c
+        WHERE c.id_session = :id_session
+            AND c.enseignant IS NOT NULL
+            {filtre}
+        GROUP BY c.enseignant, c.dateExam
+    ),
+    presences AS (
+        SELECT DISTINCT a.code_smartex_ens, c.dateExam
+        FROM affectation a
+        JOIN creneau c ON a.creneau_id = c.creneau_id
+        WHERE c.id_session = :id_session
+    ),
+    jours_statut AS (
+        SELECT j.responsable,
+               j.dateExam,
+               j.nbre_creneaux_ce_jour,
+               p.code_smartex_ens IS NULL AS absent
+        FROM jours j
+        LEFT JOIN presences p
+            ON p.code_smartex_ens = j.responsable
+            AND p.dateExam = j.dateExam
+        ORDER BY j.responsable, j.dateExam
+    ),
+    bilan AS (
+        SELECT responsable,
+               SUM(absent) AS nbre_jours_absents,
+               SUM(CASE WHEN absent THEN nbre_creneaux_ce_jour ELSE 0 END) AS nbre_creneaux_absents,
+               COUNT(*) AS nbre_total_jours,
+               SUM(nbre_creneaux_ce_jour) AS nbre_total_creneaux,
+               GROUP_CONCAT(CASE WHEN absent THEN dateExam END, ',') AS dates_absentes
+        FROM jours_statut
+        GROUP BY responsable
+        HAVING SUM(absent) > 0
+    )
+    SELECT :id_session,
+           b.responsable,
+           COALESCE(e.nom_ens, ''),
+           COALESCE(e.prenom_ens, ''),
+           COALESCE(e.grade_code_ens, ''),
+           COALESCE(e.participe_surveillance, 0),
+           b.nbre_jours_absents,
+           b.nbre_creneaux_absents,
+           b.nbre_total_jours,
+           b.nbre_total_creneaux,
+           b.dates_absentes
+    FROM bilan b
+    LEFT JOIN enseignant e ON e.code_smartex_ens = b.responsable
+'''
+
+
 def remplir_responsables_absents(id_session):
     """
     Remplit la table responsable_absent_jour_examen pour les responsables qui ne sont PAS présents 
@@ -39,97 +117,40 @@ def remplir_responsables_absents(id_session):
     # Supprimer les anciennes entrées pour cette session
     db.execute('DELETE FROM responsable_absent_jour_examen WHERE id_session = ?', (id_session,))
     
-    # Récupérer tous les responsables avec leurs dates d'examens
-    rows = db.execute('''
-        SELECT 
-            c.enseignant as responsable,
-            c.dateExam,
-            COUNT(*) as nbre_creneaux_ce_jour
-        FROM creneau c
-        WHERE c.id_session = ? 
-            AND c.enseignant IS NOT NULL
-        GROUP BY c.enseignant, c.dateExam
-    ''', (id_session,)).fetchall()
+    # Recalculer toute la session en une seule requête
+    db.execute(_RESPONSABLES_ABSENTS_SQL.format(filtre=''), {'id_session': id_session})
     
-    # Dictionnaire pour stocker les infos par responsable
-    responsables_data = {}
+    db.commit()
+
+
+def maj_responsables_absents(id_session, codes):
+    """
+    Mise à jour incrémentale de responsable_absent_jour_examen
     
-    for row in rows:
-        resp_code = row['responsable']
-        date_exam = row['dateExam']
-        nbre_creneaux = row['nbre_creneaux_ce_jour']
-        
-        if resp_code not in responsables_data:
-            responsables_data[resp_code] = {
-                'dates_absentes': [],
-                'creneaux_absents': 0,
-                'total_jours': 0,
-                'total_creneaux': 0
-            }
-        
-        # Compter le total
-        responsables_data[resp_code]['total_jours'] += 1
-        responsables_data[resp_code]['total_creneaux'] += nbre_creneaux
-        
-        # Vérifier si le responsable est affecté À N'IMPORTE QUEL CRÉNEAU de cette date
-        affectation_ce_jour = db.execute('''
-            SELECT COUNT(*) as count
-            FROM affectation a
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE a.code_smartex_ens = ?
-                AND c.dateExam = ?
-                AND c.id_session = ?
-        ''', (resp_code, date_exam, id_session)).fetchone()
-        
-        # Si aucune affectation ce jour-là → jour absent
-        if affectation_ce_jour['count'] == 0:
-            responsables_data[resp_code]['dates_absentes'].append(date_exam)
-            responsables_data[resp_code]['creneaux_absents'] += nbre_creneaux
+    Seule la ligne d'un responsable dépend de ses propres affectations :
+    après la modification des affectations de quelques enseignants, il
+    suffit de recalculer ces enseignants-là plutôt que toute la session.
+    
+    Args:
+        id_session: session concernée
+        codes: codes des enseignants dont les affectations ont changé
+    """
+    codes = sorted({int(c) for c in codes if c is not None})
+    if not codes:
+        return
+    
+    db = get_db()
+    params = {'id_session': id_session}
+    params.update({f'c{i}': code for i, code in enumerate(codes)})
+    placeholders = ','.join(f':c{i}' for i in range(len(codes)))
     
-    # Insérer uniquement les responsables qui ont au moins un jour absent
-    for resp_code, data in responsables_data.items():
-        if len(data['dates_absentes']) > 0:  # Au moins un jour absent
-            # Récupérer les infos de l'enseignant
-            ens = db.execute('''
-                SELECT participe_surveillance, nom_ens, prenom_ens, grade_code_ens
-                FROM enseignant
-                WHERE code_smartex_ens = ?
-            ''', (resp_code,)).fetchone()
-            
-            participe_surveillance = ens['participe_surveillance'] if ens else 0
-            nom = ens['nom_ens'] if ens else ''
-            prenom = ens['prenom_ens'] if ens else ''
-            grade = ens['grade_code_ens'] if ens else ''
-            
-            # Convertir la liste des dates en JSON/string
-            dates_absentes_str = ','.join(data['dates_absentes'])
-            
-            db.execute('''
-                INSERT INTO responsable_absent_jour_examen (
-                    id_session, 
-                    code_smartex_ens, 
-                    nom, 
-                    prenom, 
-                    grade_code,
-                    participe_surveillance, 
-                    nbre_jours_absents,
-                    nbre_creneaux_absents,
-                    nbre_total_jours_responsable,
-                    nbre_total_creneaux_responsable,
-                    dates_absentes
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                id_session,
-                resp_code,
-                nom,
-                prenom,
-                grade,
-                participe_surveillance,
-                len(data['dates_absentes']),
-                data['creneaux_absents'],
-                data['total_jours'],
-                data['total_creneaux'],
-                dates_absentes_str
-            ))
+    db.execute(f'''
+        DELETE FROM responsable_absent_jour_examen
+        WHERE id_session = :id_session AND code_smartex_ens IN ({placeholders})
+    ''', params)
+    db.execute(
+        _RESPONSABLES_ABSENTS_SQL.format(filtre=f'AND c.enseignant IN ({placeholders})'),
+        params
+    )
     
     db.commit()
@@ -1,19 +1,26 @@
 import sqlite3
-from flask import Blueprint, jsonify, request,send_file
-from database.database import get_db, remplir_responsables_absents
+from flask import Blueprint, Response, jsonify, request, send_file
+from database.database import get_db, remplir_responsables_absents, maj_responsables_absents
+from utils.list_query import list_response
+from utils.zip_stream import zip_response
+from utils.csv_export import PARTS, csv_files, iter_csv, load_affectations, write_csv_files, zip_entries
+from utils.planning_index import PlanningIndex
+from utils.plan_validator import validate_plan, validation_summary
+from utils.xlsx_export import XLSX_MIMETYPE, write_planning_xlsx
+from utils.pdf_documents import header_table, footer_callback, get_styles, LISTE_SURVEILLANTS_TABLE_STYLE
+from utils.document_pipeline import (
+    fetch_convocation_jobs,
+    fetch_presence_jobs,
+    render_documents,
+    get_progress
+)
 import os
-import pandas as pd
+import tempfile
 from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
 from reportlab.lib.units import cm
-from reportlab.platypus import Image as RLImage
-from reportlab.lib.styles import ParagraphStyle
-from io import BytesIO
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.enums import TA_LEFT, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
-import zipfile
 from datetime import datetime
 
 
@@ -21,7 +28,12 @@ affectation_bp = Blueprint('affectations', __name__)
 
 @affectation_bp.route('', methods=['GET'])
 def get_all_affectations():
-    """GET /api/affectations - Récupérer toutes les affectations"""
+    """
+    GET /api/affectations - Récupérer toutes les affectations
+
+    Pagination / projection / flux : limit, after, fields, format
+    (voir utils/list_query.py)
+    """
     try:
         db = get_db()
         # Paramètres de filtrage optionnels
@@ -55,14 +67,13 @@ def get_all_affectations():
             conditions.append('c.id_session = ?')
             params.append(id_session)
         
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
-        
-        query += ' ORDER BY c.dateExam, c.h_debut, e.nom_ens'
-        
-        cursor = db.execute(query, params)
-        affectations = [dict(row) for row in cursor.fetchall()]
-        return jsonify(affectations), 200
+        sort_keys = [
+            ('c.dateExam', 'dateExam'),
+            ('c.h_debut', 'h_debut'),
+            ('e.nom_ens', 'nom_ens'),
+            ('a.affectation_id', 'affectation_id'),
+        ]
+        return list_response(db, query, conditions, params, sort_keys)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -142,7 +153,7 @@ def create_affectation():
         cursor = db.execute('SELECT id_session FROM creneau WHERE creneau_id = ?', (data['creneau_id'],))
         creneau = cursor.fetchone()
         if creneau:
-            remplir_responsables_absents(creneau['id_session'])
+            maj_responsables_absents(creneau['id_session'], [data['code_smartex_ens']])
         
         return jsonify({
             'message': 'Affectation créée avec succès',
@@ -166,6 +177,8 @@ def delete_all_affectations():
         db = get_db()
         cursor = db.execute('DELETE FROM affectation')
         db.commit()
+        for row in db.execute('SELECT id_session FROM session').fetchall():
+            remplir_responsables_absents(row['id_session'])
         return jsonify({'message': 'Toutes les affectations ont été supprimées.'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -177,6 +190,7 @@ def delete_affectations_by_session(id_session):
         db = get_db()
         cursor = db.execute('DELETE FROM affectation WHERE id_session = ?', (id_session,))
         db.commit()
+        remplir_responsables_absents(id_session)
 
         if cursor.rowcount > 0:
             return jsonify({'message': f'Toutes les affectations de la session {id_session} ont été supprimées.'}), 200
@@ -261,6 +275,7 @@ def create_affectations_batch():
         db = get_db()
         created = []
         errors = []
+        touched = {}  # id_session -> enseignants dont les affectations ont changé
         
         for aff in affectations_list:
             try:
@@ -311,6 +326,10 @@ def create_affectations_batch():
                     VALUES (?, ?)
                 ''', (aff['code_smartex_ens'], aff['creneau_id']))
                 created.append(aff)
+                session_row = db.execute('SELECT id_session FROM creneau WHERE creneau_id = ?',
+                                         (aff['creneau_id'],)).fetchone()
+                if session_row:
+                    touched.setdefault(session_row['id_session'], set()).add(aff['code_smartex_ens'])
                 
             except sqlite3.IntegrityError as e:
                 if 'UNIQUE' in str(e) or 'PRIMARY KEY' in str(e):
@@ -330,11 +349,16 @@ def create_affectations_batch():
                 })
         
         db.commit()
+        validation = {}
+        for id_session, codes in touched.items():
+            maj_responsables_absents(id_session, codes)
+            validation[id_session] = validation_summary(validate_plan(db, id_session, max_details=0))
         
         return jsonify({
             'message': f'{len(created)} affectations créées avec succès',
             'created': created,
-            'errors': errors
+            'errors': errors,
+            'validation': validation
         }), 201 if created else 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -406,47 +430,45 @@ def get_statistiques_session(id_session):
     try:
         db = get_db()
         
-        # Nombre total d'affectations
+        # Lectures directes des agrégats maintenus par triggers (database/aggregates.py)
         cursor = db.execute('''
-            SELECT COUNT(*) as total_affectations
-            FROM affectation a
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE c.id_session = ?
+            SELECT COALESCE(SUM(nb_affectations), 0) as total_affectations,
+                   COUNT(*) as nb_enseignants
+            FROM agg_charge_enseignant
+            WHERE id_session = ?
         ''', (id_session,))
         stats = dict(cursor.fetchone())
         
-        # Nombre d'enseignants distincts affectés
-        cursor = db.execute('''
-            SELECT COUNT(DISTINCT a.code_smartex_ens) as nb_enseignants
-            FROM affectation a
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE c.id_session = ?
-        ''', (id_session,))
-        stats.update(cursor.fetchone())
-        
         # Affectations par grade
         cursor = db.execute('''
             SELECT e.grade_code_ens, g.quota,
-                   COUNT(*) as nb_affectations,
-                   COUNT(DISTINCT a.code_smartex_ens) as nb_enseignants
-            FROM affectation a
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+                   SUM(ace.nb_affectations) as nb_affectations,
+                   COUNT(*) as nb_enseignants
+            FROM agg_charge_enseignant ace
+            JOIN enseignant e ON ace.code_smartex_ens = e.code_smartex_ens
             LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
-            WHERE c.id_session = ?
+            WHERE ace.id_session = ?
             GROUP BY e.grade_code_ens
         ''', (id_session,))
         stats['par_grade'] = [dict(row) for row in cursor.fetchall()]
         
+        # Affectations par grade et par jour
+        cursor = db.execute('''
+            SELECT grade_code_ens, dateExam, nb_affectations
+            FROM agg_charge_grade_jour
+            WHERE id_session = ?
+            ORDER BY dateExam, grade_code_ens
+        ''', (id_session,))
+        stats['par_grade_jour'] = [dict(row) for row in cursor.fetchall()]
+        
         # Créneaux avec nombre de surveillants
         cursor = db.execute('''
             SELECT c.creneau_id, c.dateExam, c.h_debut, c.h_fin, 
-                   c.cod_salle, COUNT(a.code_smartex_ens) as nb_surveillants
+                   c.cod_salle, COALESCE(s.nb_surveillants, 0) as nb_surveillants
             FROM creneau c
-            LEFT JOIN affectation a ON c.creneau_id = a.creneau_id
+            LEFT JOIN agg_surveillants_creneau s ON c.creneau_id = s.creneau_id
             WHERE c.id_session = ?
-            GROUP BY c.creneau_id
-            ORDER BY c.dateExam, c.h_debut
+            ORDER BY c.dateExam, c.h_debut, c.creneau_id
         ''', (id_session,))
         stats['creneaux'] = [dict(row) for row in cursor.fetchall()]
         
@@ -492,16 +514,17 @@ def check_conflits_enseignant(code_smartex_ens):
 
 PDF_DIR = os.path.join("results", "convocations")
 
-def add_footer(canvas, doc, footer_image_path):
-    """Fonction pour ajouter le footer en bas de page"""
-    canvas.saveState()
-    # Positionner l'image en bas de la page
-    footer = RLImage(footer_image_path, width=18*cm, height=1.5*cm)
-    footer.drawOn(canvas, 1.5*cm, 1*cm)  # Position x, y depuis le bas
-    canvas.restoreState()
-
 @affectation_bp.route("/generate_convocations/<int:id_session>", methods=["GET"])
 def generate_convocations(id_session):
+    """
+    GET /api/affectations/generate_convocations/<id_session>
+    Génère une convocation PDF par enseignant affecté dans la session
+    
+    Les documents sont rendus en parallèle (utils/document_pipeline.py) ;
+    la progression est suivie via GET /documents/progress/<id_session>.
+    Seules les convocations dont les données ont changé sont régénérées
+    (?force=1 pour tout régénérer).
+    """
     try:
         # Créer le dossier convocations pour cette session s'il n'existe pas
         session_pdf_dir = os.path.join(PDF_DIR, f"session_{id_session}")
@@ -509,137 +532,38 @@ def generate_convocations(id_session):
         
         db = get_db()
 
-        # Récupérer les enseignants distincts avec leurs noms
-        cursor = db.execute("""
-            SELECT DISTINCT a.code_smartex_ens, e.nom_ens, e.prenom_ens
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            WHERE a.id_session = ?
-        """, (id_session,))
-        enseignants = cursor.fetchall()
+        # Toutes les affectations de la session, groupées par enseignant
+        jobs = fetch_convocation_jobs(db, id_session, session_pdf_dir)
 
-        if not enseignants:
+        if not jobs:
             return jsonify({"message": f"Aucune affectation trouvée pour la session {id_session}"}), 404
 
-        for ens in enseignants:
-            code = ens["code_smartex_ens"]
-            nom = ens["nom_ens"]
-            prenom = ens["prenom_ens"]
-
-            # Récupérer les lignes d'affectation de cet enseignant
-            cursor.execute("""
-                SELECT date_examen, h_debut, h_fin 
-                FROM affectation 
-                WHERE id_session = ? AND code_smartex_ens = ?
-                ORDER BY date_examen, h_debut
-            """, (id_session, code))
-            rows = cursor.fetchall()
-
-            # Créer le PDF dans le dossier de la session
-            pdf_path = os.path.join(session_pdf_dir, f"convocation_{code}_{nom}_{prenom}_{id_session}.pdf")
-            doc = SimpleDocTemplate(pdf_path, pagesize=A4, 
-                                   leftMargin=50, rightMargin=50,
-                                   topMargin=100, bottomMargin=80)
-            styles = getSampleStyleSheet()
-            elements = []
-            logo_path="assets/logo.png"
-            # Créer l'image du logo en gardant le ratio
-            from PIL import Image as PILImage
-            img = PILImage.open(logo_path)
-            img_width, img_height = img.size
-            aspect_ratio = img_height / img_width
-            
-            desired_width = 3*cm
-            logo = RLImage(logo_path, width=desired_width, height=desired_width * aspect_ratio)
-            
-            from datetime import datetime
-            date_approbation = datetime.now().strftime("%d%m-%y")
-            
-            header_data = [
-                [logo, "GESTION DES EXAMENS ET\n\n DÉLIBÉRATIONS\n", "EXD-FR-08-01"],
-                ["", "Procédure d'exécution des épreuves", f"Date d'approbation\n{date_approbation}"],
-                ["", "Liste d'affectation des surveillants", "Page 1/1"]
-            ]
-            
-            header_table = Table(header_data, colWidths=[4*cm, 12*cm, 4*cm])
-            header_table.setStyle(TableStyle([
-                ("ALIGN", (0, 0), (0, -1), "CENTER"),
-                ("ALIGN", (1, 0), (1, -1), "CENTER"),
-                ("ALIGN", (2, 0), (2, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("FONTNAME", (1, 0), (1, 2), "Helvetica-Bold"),
-                ("FONTSIZE", (1, 0), (1, 0), 16),
-                ("FONTSIZE", (1, 1), (1, 2), 12),
-                ("FONTSIZE", (2, 0), (2, -1), 10),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ("TEXTCOLOR", (1, 0), (1, -1), colors.HexColor("#003366")),
-                ("SPAN", (0, 0), (0, 2)),  # Le logo prend les 3 lignes
-                ("LEFTPADDING", (0, 0), (-1, -1), 8),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 8),
-                ("TOPPADDING", (0, 0), (-1, -1), 6),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(header_table)
-            elements.append(Spacer(1, 30))
-
-
-            # --- Nom enseignant ---
-            elements.append(Paragraph(f"<b>Notes à</b>", ParagraphStyle(name="centered", parent=styles["Normal"], alignment=TA_CENTER)))
-            elements.append(Spacer(1, 5))
-            elements.append(Paragraph(f"<b>Mr/Mme {prenom} {nom}</b>", ParagraphStyle(name="centered", parent=styles["Heading2"], alignment=TA_CENTER)))
-            elements.append(Spacer(1, 20))
-            # --- Texte d'intro ---
-            intro = ("Cher(e) collègue,<br/>"
-                     "Vous êtes prié(e) d'assurer la surveillance et (ou) la responsabilité des examens selon le calendrier ci-joint.")
-            elements.append(Paragraph(intro, styles["Normal"]))
-            elements.append(Spacer(1, 20))
-
-            # --- Tableau ---
-            data = [["Date", "Heure", "Durée"]]
-            for row in rows:
-                h_debut = row["h_debut"]
-                h_fin = row["h_fin"]
-
-                # Calculer la durée
-                from datetime import datetime
-                fmt = "%H:%M"
-                try:
-                    h1 = datetime.strptime(h_debut, fmt)
-                    h2 = datetime.strptime(h_fin, fmt)
-                    duration = round((h2 - h1).seconds / 3600, 1)
-                except Exception:
-                    duration = "—"
-
-                data.append([row["date_examen"], h_debut, f"{duration} H"])
-
-            table = Table(data, colWidths=[120, 120, 120])
-            table.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 30))
-
-            footer_text = Paragraph("Merci de votre collaboration.", styles["Italic"])
-            elements.append(footer_text)
-            
-           
-            # Construire le PDF avec le footer
-            doc.build(elements, onFirstPage=lambda c, d: add_footer(c, d, "assets/footer.png"),
-                                onLaterPages=lambda c, d: add_footer(c, d, "assets/footer.png"))
+        force = request.args.get('force', '0') == '1'
+        rapport = render_documents('convocations', id_session, jobs, force=force)
+        if rapport['erreurs']:
+            return jsonify({
+                'error': f"{len(rapport['erreurs'])} convocation(s) n'ont pas pu être générées",
+                'generation': rapport
+            }), 500
 
-        cursor.close()
         return jsonify({
             "message": f"Convocations générées avec succès pour la session {id_session}",
-            "nombre_enseignants": len(enseignants)
+            "nombre_enseignants": len(jobs),
+            "generation": rapport
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@affectation_bp.route('/documents/progress/<int:id_session>', methods=['GET'])
+def get_documents_progress(id_session):
+    """
+    GET /api/affectations/documents/progress/<id_session>
+    Progression des générations de PDF de la session (en cours ou dernière terminée)
+    """
+    return jsonify({'id_session': id_session, 'generations': get_progress(id_session)}), 200
+
 @affectation_bp.route('/convocations/list/<int:id_session>', methods=['GET'])
 def list_convocations_pdfs(id_session):
     """
@@ -738,6 +662,7 @@ def generate_presences_responsables(id_session):
     
     Ce endpoint génère un PDF pour chaque enseignant dans la table responsable_absent_jour_examen,
     listant les créneaux où il est responsable.
+    Seuls les PDF dont les données ont changé sont régénérés (?force=1 pour tout régénérer).
     """
     try:
         # Créer le dossier presences_responsables pour cette session s'il n'existe pas
@@ -746,146 +671,28 @@ def generate_presences_responsables(id_session):
         
         db = get_db()
 
-        # Récupérer les responsables depuis la table responsable_absent_jour_examen
-        cursor = db.execute("""
-            SELECT DISTINCT code_smartex_ens, nom, prenom
-            FROM responsable_absent_jour_examen
-            WHERE id_session = ?
-        """, (id_session,))
-        responsables = cursor.fetchall()
+        # Responsables et créneaux de responsabilité, en une requête
+        jobs = fetch_presence_jobs(db, id_session, session_pdf_dir)
 
-        if not responsables:
+        if not jobs:
             return jsonify({
                 "message": f"Aucun responsable absent trouvé dans la table pour la session {id_session}"
             }), 404
 
-        for resp in responsables:
-            code = resp["code_smartex_ens"]
-            nom = resp["nom"]
-            prenom = resp["prenom"]
-
-            # Récupérer tous les créneaux où cet enseignant est responsable
-            cursor.execute("""
-                SELECT dateExam, h_debut, h_fin, cod_salle, type_ex
-                FROM creneau 
-                WHERE id_session = ? AND enseignant = ?
-                ORDER BY dateExam, h_debut
-            """, (id_session, code))
-            rows = cursor.fetchall()
-
-            if not rows:
-                # Si aucun créneau trouvé, passer au suivant
-                continue
-
-            # Créer le PDF dans le dossier de la session
-            pdf_path = os.path.join(session_pdf_dir, f"presence_responsable_{nom}_{prenom}_{id_session}.pdf")
-            doc = SimpleDocTemplate(pdf_path, pagesize=A4, 
-                                   leftMargin=50, rightMargin=50,
-                                   topMargin=100, bottomMargin=80)
-            styles = getSampleStyleSheet()
-            elements = []
-            logo_path = "assets/logo.png"
-            
-            # Créer l'image du logo en gardant le ratio
-            from PIL import Image as PILImage
-            img = PILImage.open(logo_path)
-            img_width, img_height = img.size
-            aspect_ratio = img_height / img_width
-            
-            desired_width = 3*cm
-            logo = RLImage(logo_path, width=desired_width, height=desired_width * aspect_ratio)
-            
-            date_approbation = datetime.now().strftime("%d%m-%y")
-            
-            # En-tête du document
-            header_data = [
-                [logo, "GESTION DES EXAMENS ET\n\n DÉLIBÉRATIONS\n", "EXD-FR-08-01"],
-                ["", "Procédure d'exécution des épreuves", f"Date d'approbation\n{date_approbation}"],
-                ["", "Liste des créneaux de présence des responsables", "Page 1/1"]
-            ]
-            
-            header_table = Table(header_data, colWidths=[4*cm, 12*cm, 4*cm])
-            header_table.setStyle(TableStyle([
-                ("ALIGN", (0, 0), (0, -1), "CENTER"),
-                ("ALIGN", (1, 0), (1, -1), "CENTER"),
-                ("ALIGN", (2, 0), (2, -1), "CENTER"),
-                ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-                ("FONTNAME", (1, 0), (1, 2), "Helvetica-Bold"),
-                ("FONTSIZE", (1, 0), (1, 0), 16),
-                ("FONTSIZE", (1, 1), (1, 2), 12),
-                ("FONTSIZE", (2, 0), (2, -1), 10),
-                ("GRID", (0, 0), (-1, -1), 1, colors.black),
-                ("TEXTCOLOR", (1, 0), (1, -1), colors.HexColor("#003366")),
-                ("SPAN", (0, 0), (0, 2)),  # Le logo prend les 3 lignes
-                ("LEFTPADDING", (0, 0), (-1, -1), 8),
-                ("RIGHTPADDING", (0, 0), (-1, -1), 8),
-                ("TOPPADDING", (0, 0), (-1, -1), 6),
-                ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-            ]))
-            elements.append(header_table)
-            elements.append(Spacer(1, 30))
-
-            # Nom du responsable
-            elements.append(Paragraph(
-                f"<b>Notes à</b>", 
-                ParagraphStyle(name="centered", parent=styles["Normal"], alignment=TA_CENTER)
-            ))
-            elements.append(Spacer(1, 5))
-            elements.append(Paragraph(
-                f"<b>Mr/Mme {prenom} {nom}</b>", 
-                ParagraphStyle(name="centered", parent=styles["Heading2"], alignment=TA_CENTER)
-            ))
-            elements.append(Spacer(1, 20))
-            
-            # Texte d'intro
-            intro = ("Cher(e) collègue,<br/>"
-                     "Vous êtes prié(e) d'assurer la responsabilité des examens selon le calendrier ci-joint.")
-            elements.append(Paragraph(intro, styles["Normal"]))
-            elements.append(Spacer(1, 20))
-
-            # Tableau des créneaux de responsabilité
-            data = [["Date", "Heure", "Durée"]]
-            for row in rows:
-                h_debut = row["h_debut"]
-                h_fin = row["h_fin"]
-
-                # Calculer la durée
-                fmt = "%H:%M"
-                try:
-                    h1 = datetime.strptime(h_debut, fmt)
-                    h2 = datetime.strptime(h_fin, fmt)
-                    duration = round((h2 - h1).seconds / 3600, 1)
-                except Exception:
-                    duration = "—"
-
-                data.append([row["dateExam"], h_debut, f"{duration} H"])
-
-            table = Table(data, colWidths=[120, 120, 120])
-            table.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            elements.append(table)
-            elements.append(Spacer(1, 30))
-
-            footer_text = Paragraph("Merci de votre collaboration.", styles["Italic"])
-            elements.append(footer_text)
-            
-            # Construire le PDF avec le footer
-            doc.build(
-                elements, 
-                onFirstPage=lambda c, d: add_footer(c, d, "assets/footer.png"),
-                onLaterPages=lambda c, d: add_footer(c, d, "assets/footer.png")
-            )
+        # Les responsables sans créneau dans la session sont ignorés
+        force = request.args.get('force', '0') == '1'
+        rapport = render_documents('presences_responsables', id_session, jobs, force=force)
+        if rapport['erreurs']:
+            return jsonify({
+                'error': f"{len(rapport['erreurs'])} PDF de présence n'ont pas pu être générés",
+                'generation': rapport
+            }), 500
 
-        cursor.close()
         return jsonify({
             "message": f"PDF de présence des responsables générés avec succès pour la session {id_session}",
-            "nombre_responsables": len(responsables),
-            "dossier": session_pdf_dir
+            "nombre_responsables": len(jobs),
+            "dossier": session_pdf_dir,
+            "generation": rapport
         }), 200
         
     except Exception as e:
@@ -1020,45 +827,35 @@ def download_multiple_presences_responsables(id_session):
                 'error': 'Aucun fichier à télécharger'
             }), 400
         
-        # Créer un fichier ZIP en mémoire
-        zip_buffer = BytesIO()
+        # Vérifier les fichiers avant l'envoi : le statut HTTP part avec le premier octet
+        entries = []
+        missing_files = []
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            added_files = []
-            missing_files = []
+        for filename in filenames:
+            # Sécurité : utiliser basename
+            safe_filename = os.path.basename(filename)
+            filepath = os.path.join(session_pdf_dir, safe_filename)
             
-            for filename in filenames:
-                # Sécurité : utiliser basename
-                safe_filename = os.path.basename(filename)
-                filepath = os.path.join(session_pdf_dir, safe_filename)
-                
-                if os.path.exists(filepath):
-                    # Ajouter le fichier au ZIP
-                    zip_file.write(filepath, safe_filename)
-                    added_files.append(safe_filename)
-                else:
-                    missing_files.append(safe_filename)
+            if os.path.isfile(filepath):
+                entries.append((filepath, safe_filename))
+            else:
+                missing_files.append(safe_filename)
         
-        # Si aucun fichier n'a été ajouté
-        if len(added_files) == 0:
+        # Si aucun fichier n'a été trouvé
+        if len(entries) == 0:
             return jsonify({
                 'error': 'Aucun fichier valide trouvé',
                 'missing_files': missing_files
             }), 404
         
-        # Préparer le buffer pour l'envoi
-        zip_buffer.seek(0)
-        
         # Nom du fichier ZIP
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_filename = f"presences_responsables_session_{id_session}_{timestamp}.zip"
         
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=zip_filename
-        )
+        # Archive envoyée au fil de l'eau (PDF stockés sans recompression)
+        return zip_response(entries, zip_filename, headers={
+            'X-Missing-Files': str(len(missing_files))
+        })
         
     except Exception as e:
         return jsonify({
@@ -1111,102 +908,93 @@ def download_multiple_files():
                 "error": "La liste de fichiers est vide"
             }), 400
         
-        # Créer un fichier ZIP en mémoire
-        zip_buffer = BytesIO()
+        # Vérifier les fichiers avant l'envoi : le statut HTTP part avec le premier octet
+        entries = []
+        missing_files = []
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            added_files = []
-            missing_files = []
+        for file_info in files_to_download:
+            file_type = file_info.get('type')  # "convocation" ou "affectation"
+            file_format = file_info.get('format', 'pdf')  # "pdf" ou "csv" (défaut: pdf)
+            filename = file_info.get('filename')
             
-            for file_info in files_to_download:
-                file_type = file_info.get('type')  # "convocation" ou "affectation"
-                file_format = file_info.get('format', 'pdf')  # "pdf" ou "csv" (défaut: pdf)
-                filename = file_info.get('filename')
-                
-                if not file_type or not filename:
-                    missing_files.append({
-                        "file": file_info,
-                        "error": "Type ou filename manquant"
-                    })
-                    continue
-                
-                # Sécurité : utiliser basename
-                safe_filename = os.path.basename(filename)
-                
-                # Déterminer le chemin selon le type et le format
-                if file_type == "convocation":
-                    if file_format == "pdf":
-                        base_dir = PDF_DIR  # results/convocations
-                        filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
-                        zip_folder = "convocations/pdf"
-                    elif file_format == "csv":
-                        base_dir = os.path.join('results', 'convocation_csv')
-                        filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
-                        zip_folder = "convocations/csv"
-                    else:
-                        missing_files.append({
-                            "file": file_info,
-                            "error": f"Format inconnu: {file_format}"
-                        })
-                        continue
-                        
-                elif file_type == "affectation":
-                    if file_format == "pdf":
-                        base_dir = RESULTS_DIR  # results/affectations
-                        filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
-                        zip_folder = "affectations/pdf"
-                    elif file_format == "csv":
-                        base_dir = os.path.join('results', 'affectation_csv')
-                        filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
-                        zip_folder = "affectations/csv"
-                    else:
-                        missing_files.append({
-                            "file": file_info,
-                            "error": f"Format inconnu: {file_format}"
-                        })
-                        continue
+            if not file_type or not filename:
+                missing_files.append({
+                    "file": file_info,
+                    "error": "Type ou filename manquant"
+                })
+                continue
+            
+            # Sécurité : utiliser basename
+            safe_filename = os.path.basename(filename)
+            
+            # Déterminer le chemin selon le type et le format
+            if file_type == "convocation":
+                if file_format == "pdf":
+                    base_dir = PDF_DIR  # results/convocations
+                    filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
+                    zip_folder = "convocations/pdf"
+                elif file_format == "csv":
+                    base_dir = os.path.join('results', 'convocation_csv')
+                    filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
+                    zip_folder = "convocations/csv"
                 else:
                     missing_files.append({
                         "file": file_info,
-                        "error": f"Type inconnu: {file_type}"
+                        "error": f"Format inconnu: {file_format}"
                     })
                     continue
-                
-                # Vérifier que le fichier existe
-                if not os.path.exists(filepath):
+                    
+            elif file_type == "affectation":
+                if file_format == "pdf":
+                    base_dir = RESULTS_DIR  # results/affectations
+                    filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
+                    zip_folder = "affectations/pdf"
+                elif file_format == "csv":
+                    base_dir = os.path.join('results', 'affectation_csv')
+                    filepath = os.path.join(base_dir, f"session_{session_id}", safe_filename)
+                    zip_folder = "affectations/csv"
+                else:
                     missing_files.append({
                         "file": file_info,
-                        "error": "Fichier non trouvé",
-                        "path": filepath
+                        "error": f"Format inconnu: {file_format}"
                     })
                     continue
-                
-                # Ajouter le fichier au ZIP avec un dossier organisé
-                arcname = os.path.join(zip_folder, safe_filename)
-                zip_file.write(filepath, arcname)
-                added_files.append(safe_filename)
+            else:
+                missing_files.append({
+                    "file": file_info,
+                    "error": f"Type inconnu: {file_type}"
+                })
+                continue
+            
+            # Vérifier que le fichier existe
+            if not os.path.isfile(filepath):
+                missing_files.append({
+                    "file": file_info,
+                    "error": "Fichier non trouvé",
+                    "path": filepath
+                })
+                continue
+            
+            # Ajouter le fichier au ZIP avec un dossier organisé
+            arcname = os.path.join(zip_folder, safe_filename)
+            entries.append((filepath, arcname))
         
-        # Si aucun fichier n'a été ajouté
-        if len(added_files) == 0:
+        # Si aucun fichier n'a été trouvé
+        if len(entries) == 0:
             return jsonify({
                 "success": False,
                 "error": "Aucun fichier trouvé",
                 "missing_files": missing_files
             }), 404
         
-        # Préparer le buffer pour l'envoi
-        zip_buffer.seek(0)
-        
         # Nom du fichier ZIP
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         zip_filename = f"fichiers_session_{session_id}_{timestamp}.zip"
         
-        return send_file(
-            zip_buffer,
-            mimetype='application/zip',
-            as_attachment=True,
-            download_name=zip_filename
-        )
+        # Archive envoyée au fil de l'eau (PDF stockés, CSV compressés)
+        return zip_response(entries, zip_filename, headers={
+            'X-Missing-Files': str(len(missing_files))
+        })
         
     except Exception as e:
         import traceback
@@ -1419,22 +1207,42 @@ def get_session_info(session_id):
     ''', (session_id,)).fetchone()
     return session
 
+# Affectations d'une session par date et séance (PDF d'affectation, export XLSX)
+AFFECTATIONS_PAR_SEANCE_QUERY = '''
+    SELECT 
+        a.date_examen,
+        a.seance,
+        a.jour,
+        e.nom_ens || ' ' || e.prenom_ens as enseignant_nom,
+        c.cod_salle
+    FROM affectation a
+    JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+    LEFT JOIN creneau c ON a.creneau_id = c.creneau_id
+    WHERE a.id_session = ?
+    ORDER BY a.date_examen, a.seance, enseignant_nom
+'''
+
+# Surveillances de chaque enseignant de la session, par grade (export XLSX)
+SURVEILLANCES_PAR_GRADE_QUERY = '''
+    SELECT 
+        e.grade_code_ens,
+        g.quota,
+        e.code_smartex_ens,
+        e.nom_ens,
+        e.prenom_ens,
+        COUNT(a.affectation_id) as nb_surveillances
+    FROM enseignant e
+    LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
+    LEFT JOIN affectation a ON a.code_smartex_ens = e.code_smartex_ens AND a.id_session = ?
+    GROUP BY e.code_smartex_ens
+    HAVING MAX(e.participe_surveillance) = 1 OR COUNT(a.affectation_id) > 0
+    ORDER BY e.grade_code_ens, e.nom_ens, e.prenom_ens
+'''
+
 def get_affectations_by_session_for_pdf(session_id):
     """Récupère toutes les affectations groupées par date et séance"""
     db = get_db()
-    affectations = db.execute('''
-        SELECT 
-            a.date_examen,
-            a.seance,
-            a.jour,
-            e.nom_ens || ' ' || e.prenom_ens as enseignant_nom,
-            c.cod_salle
-        FROM affectation a
-        JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-        LEFT JOIN creneau c ON a.creneau_id = c.creneau_id
-        WHERE a.id_session = ?
-        ORDER BY a.date_examen, a.seance, enseignant_nom
-    ''', (session_id,)).fetchall()
+    affectations = db.execute(AFFECTATIONS_PAR_SEANCE_QUERY, (session_id,)).fetchall()
     
     # Grouper par date et séance
     grouped = {}
@@ -1450,67 +1258,19 @@ def get_affectations_by_session_for_pdf(session_id):
     return grouped
 
 def create_header_table():
-    """Crée l'en-tête du document sous forme de tableau"""
-    logo_path = "assets/logo.png"
-    
-    try:
-        # Créer l'image du logo en gardant le ratio
-        from PIL import Image as PILImage
-        img = PILImage.open(logo_path)
-        img_width, img_height = img.size
-        aspect_ratio = img_height / img_width
-        
-        desired_width = 3*cm
-        logo = RLImage(logo_path, width=desired_width, height=desired_width * aspect_ratio)
-    except:
-        # Si le logo n'existe pas, utiliser un texte
-        logo = Paragraph("<b>LOGO</b>", getSampleStyleSheet()['Normal'])
-    
-    from datetime import datetime
-    date_approbation = datetime.now().strftime("%d%m-%y")
-    
-    header_data = [
-        [logo, "GESTION DES EXAMENS ET\n\nDÉLIBÉRATIONS\n", "EXD-FR-08-01"],
-        ["", "Procédure d'exécution des épreuves", f"Date d'approbation\n{date_approbation}"],
-        ["", "Liste d'affectation des surveillants", "Page 1/1"]
-    ]
-    
-    header_table = Table(header_data, colWidths=[4*cm, 12*cm, 4*cm])
-    header_table.setStyle(TableStyle([
-        ("ALIGN", (0, 0), (0, -1), "CENTER"),
-        ("ALIGN", (1, 0), (1, -1), "CENTER"),
-        ("ALIGN", (2, 0), (2, -1), "CENTER"),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("FONTNAME", (1, 0), (1, 2), "Helvetica-Bold"),
-        ("FONTSIZE", (1, 0), (1, 0), 14),
-        ("FONTSIZE", (1, 1), (1, 2), 11),
-        ("FONTSIZE", (2, 0), (2, -1), 10),
-        ("GRID", (0, 0), (-1, -1), 1, colors.black),
-        ("TEXTCOLOR", (1, 0), (1, -1), colors.HexColor("#003366")),
-        ("SPAN", (0, 0), (0, 2)),  # Le logo prend les 3 lignes
-        ("LEFTPADDING", (0, 0), (-1, -1), 8),
-        ("RIGHTPADDING", (0, 0), (-1, -1), 8),
-        ("TOPPADDING", (0, 0), (-1, -1), 6),
-        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-    ]))
-    
-    return header_table
+    """Crée l'en-tête du document sous forme de tableau (logo et styles partagés)"""
+    return header_table(
+        "Liste d'affectation des surveillants",
+        titre="GESTION DES EXAMENS ET\n\nDÉLIBÉRATIONS\n",
+        font_sizes=(14, 11)
+    )
 
 def create_footer_pdf(canvas, doc):
-    """Crée le pied de page"""
-    canvas.saveState()
-    
-    # Footer avec image si disponible
-    try:
-        footer = RLImage('assets/footer.png', width=18*cm, height=1.5*cm)
-        footer.drawOn(canvas, 1.5*cm, 1*cm)
-    except:
-        # Si pas d'image, utiliser du texte
-        canvas.setFont('Helvetica', 8)
-        canvas.drawString(2*cm, 2*cm, "02 Rue Abou Raihane Bayrouni 2080 Ariana")
-        canvas.drawString(2*cm, 1.5*cm, "Tél : 71706164  Email : ISI@isi.rnu.tn")
-    
-    canvas.restoreState()
+    """Crée le pied de page (image si disponible, sinon adresse en texte)"""
+    footer_callback(fallback_lines=(
+        "02 Rue Abou Raihane Bayrouni 2080 Ariana",
+        "Tél : 71706164  Email : ISI@isi.rnu.tn",
+    ))(canvas, doc)
 
 def generate_affectation_pdf_file(session_id):
     """Génère le PDF d'affectation des surveillants et l'enregistre dans results/affectations/session_{id}"""
@@ -1545,16 +1305,9 @@ def generate_affectation_pdf_file(session_id):
     )
     
     # Styles
-    styles = getSampleStyleSheet()
-    
-    style_info = ParagraphStyle(
-        'Info',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor=colors.black,
-        spaceAfter=6,
-        fontName='Helvetica'
-    )
+    styles = get_styles()
+    style_info = styles['info']
+    style_info_centered = styles['info_centered']
     
     # Liste pour stocker tous les éléments du PDF
     elements = []
@@ -1573,14 +1326,6 @@ def generate_affectation_pdf_file(session_id):
         elements.append(Spacer(1, 0.5*cm))
         
         # Informations de la session
-        style_info_centered = ParagraphStyle(
-        name="InfoCentered",
-        parent=style_info,           # hérite de ton style existant
-        alignment=TA_CENTER,         # centrage
-        fontName="Helvetica-Bold"    # gras
-        )
-
-
         info_text = f"AU : {session_info['AU']} – Semestre : {session_info['Semestre']} – Session : {session_info['type_session']}"
         elements.append(Paragraph(info_text, style_info_centered))
         elements.append(Spacer(1, 0.3*cm))
@@ -1601,37 +1346,12 @@ def generate_affectation_pdf_file(session_id):
             ])
         
         # Créer le tableau
-        table = Table(data, colWidths=[8*cm, 3*cm, 5*cm])
-        table.setStyle(TableStyle([
-            # En-tête
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-            
-            # Corps du tableau
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('ROWHEIGHT', (0, 1), (-1, -1), 0.8*cm),
-            
-            # Grille
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table = Table(data, colWidths=[8*cm, 3*cm, 5*cm], style=LISTE_SURVEILLANTS_TABLE_STYLE)
         
         elements.append(table)
     
     # Construction du PDF avec footer sur toutes les pages
-    def add_page_footer(canvas, doc):
-        create_footer_pdf(canvas, doc)
-    
-    doc.build(elements, onFirstPage=add_page_footer, onLaterPages=add_page_footer)
+    doc.build(elements, onFirstPage=create_footer_pdf, onLaterPages=create_footer_pdf)
     
     return filepath, filename
 
@@ -1856,11 +1576,174 @@ def permuter_affectations():
         db.execute('UPDATE affectation SET code_smartex_ens = ? WHERE rowid = ?', (aff2['code_smartex_ens'], id1))
         db.execute('UPDATE affectation SET code_smartex_ens = ? WHERE rowid = ?', (aff1['code_smartex_ens'], id2))
         db.commit()
+        maj_responsables_absents(aff1['id_session'], [aff1['code_smartex_ens'], aff2['code_smartex_ens']])
         return jsonify({'message': 'Permutation effectuée avec succès.'}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+
+
+@affectation_bp.route('/operations', methods=['POST'])
+def appliquer_operations():
+    """
+    POST /api/affectations/operations - Permutations et déplacements en lot
+    
+    Body: {
+        "operations": [
+            {"type": "permuter", "affectation_id_1": 12, "affectation_id_2": 34},
+            {"type": "deplacer", "affectation_id": 56, "code_smartex_ens": 7}
+        ],
+        "dry_run": false
+    }
+    
+    L'état de la session est chargé une fois (utils/planning_index.py) ;
+    chaque opération est vérifiée sur l'état laissé par les précédentes
+    (chevauchement, participation, responsable dans sa propre salle, quota
+    du grade pour un déplacement). Si une opération est refusée, aucune
+    n'est appliquée ; sinon toutes le sont dans une seule transaction.
+    Avec dry_run, les opérations sont seulement vérifiées.
+    
+    La réponse contient le résumé de la validation complète du planning
+    obtenu (utils/plan_validator.py), y compris en dry_run.
+    """
+    try:
+        data = request.get_json() or {}
+        operations = data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'Liste d\'opérations requise'}), 400
+        
+        ids = set()
+        for op in operations:
+            if not isinstance(op, dict) or op.get('type') not in ('permuter', 'deplacer'):
+                return jsonify({'error': 'Type d\'opération inconnu (attendu : permuter ou deplacer)',
+                                'operation': op}), 400
+            keys = ('affectation_id_1', 'affectation_id_2') if op['type'] == 'permuter' \
+                else ('affectation_id', 'code_smartex_ens')
+            # bool est un int en Python : true/false ne sont pas des identifiants
+            if not all(isinstance(op.get(k), int) and not isinstance(op.get(k), bool) for k in keys):
+                return jsonify({'error': f'Champs requis: {", ".join(keys)}', 'operation': op}), 400
+            ids.update(op[k] for k in keys if k.startswith('affectation_id'))
+        
+        db = get_db()
+        # Verrou d'écriture pris avant la lecture : l'état validé est celui
+        # sur lequel les modifications seront appliquées
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            placeholders = ','.join('?' * len(ids))
+            sessions = db.execute(
+                f'SELECT DISTINCT id_session FROM affectation WHERE rowid IN ({placeholders})', list(ids)
+            ).fetchall()
+            if len(sessions) > 1:
+                db.rollback()
+                return jsonify({'error': 'Les opérations doivent concerner une seule session.'}), 400
+            if not sessions:
+                db.rollback()
+                return jsonify({'error': 'Affectation(s) non trouvée(s).'}), 404
+            id_session = sessions[0]['id_session']
+            
+            index = PlanningIndex(db, id_session)
+            initial = {aff_id: aff['code_smartex_ens'] for aff_id, aff in index.affectations.items()}
+            errors = []
+            for position, op in enumerate(operations):
+                if op['type'] == 'permuter':
+                    refus = index.swap_error(op['affectation_id_1'], op['affectation_id_2'])
+                    if not refus:
+                        index.apply_swap(op['affectation_id_1'], op['affectation_id_2'])
+                else:
+                    refus = index.move_error(op['affectation_id'], op['code_smartex_ens'])
+                    if not refus:
+                        index.apply_move(op['affectation_id'], op['code_smartex_ens'])
+                if refus:
+                    errors.append({'index': position, 'operation': op,
+                                   'error': refus[0], 'status': refus[1]})
+            
+            if errors:
+                db.rollback()
+                status = 409 if all(e['status'] == 409 for e in errors) else 400
+                return jsonify({
+                    'error': f'{len(errors)} opération(s) refusée(s) : aucune modification appliquée.',
+                    'erreurs': errors
+                }), status
+            
+            changes = [(aff['code_smartex_ens'], aff_id)
+                       for aff_id, aff in index.affectations.items()
+                       if aff['code_smartex_ens'] != initial[aff_id]]
+            touched = {code for code, _ in changes} | {initial[aff_id] for _, aff_id in changes}
+            
+            db.executemany('UPDATE affectation SET code_smartex_ens = ? WHERE rowid = ?', changes)
+            # Contraintes du planning complet après les opérations (lu dans la transaction)
+            validation = validation_summary(validate_plan(db, id_session, max_details=0))
+            if data.get('dry_run'):
+                db.rollback()
+            else:
+                # Valide aussi les mises à jour ci-dessus (même transaction)
+                maj_responsables_absents(id_session, touched)
+                db.commit()
+        except Exception:
+            if db.in_transaction:
+                db.rollback()
+            raise
+        
+        return jsonify({
+            'message': 'Opérations vérifiées (aucune modification).' if data.get('dry_run')
+                       else 'Opérations appliquées avec succès.',
+            'id_session': id_session,
+            'operations': len(operations),
+            'affectations_modifiees': len(changes),
+            'enseignants': sorted(touched),
+            'dry_run': bool(data.get('dry_run')),
+            'validation': validation
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@affectation_bp.route('/permuter/candidats/<int:affectation_id>', methods=['GET'])
+def candidats_permutation(affectation_id):
+    """
+    GET /api/affectations/permuter/candidats/<affectation_id>
+    Permutations possibles d'une affectation, classées par impact
+    (vœux non respectés, jours de présence, équité des durées ; voir
+    utils/planning_index.py)
+    
+    Toutes les vérifications de POST /permuter sont faites en mémoire sur
+    l'index de la session : chaque candidat renvoyé peut être permuté.
+    
+    Query:
+        limit: nombre maximum de candidats (défaut 20, 0 = tous)
+    """
+    try:
+        limit = request.args.get('limit', 20, type=int)
+        db = get_db()
+        aff = db.execute(
+            'SELECT id_session FROM affectation WHERE rowid = ?', (affectation_id,)
+        ).fetchone()
+        if not aff:
+            return jsonify({'error': 'Affectation non trouvée.'}), 404
+        
+        index = PlanningIndex(db, aff['id_session'])
+        source = index.affectations.get(affectation_id)
+        if source is None:
+            return jsonify({'error': 'Créneau de l’affectation introuvable.'}), 404
+        if not index.participe(source['code_smartex_ens']):
+            return jsonify({
+                'error': f"L'enseignant {source['code_smartex_ens']} ne participe pas à la surveillance."
+            }), 400
+        
+        candidates = index.swap_candidates(affectation_id)
+        return jsonify({
+            'affectation': {k: source[k] for k in (
+                'affectation_id', 'code_smartex_ens', 'dateExam', 'jour', 'seance',
+                'h_debut', 'h_fin', 'cod_salle'
+            )},
+            'total': len(candidates),
+            'candidats': candidates[:limit] if limit > 0 else candidates
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @affectation_bp.route('/csv/affectations/<int:session_id>', methods=['GET'])
 def generate_affectations_csv(session_id):
     """
@@ -1886,62 +1769,24 @@ def generate_affectations_csv(session_id):
                 "error": f"Session {session_id} non trouvée"
             }), 404
         
-        # Récupérer toutes les affectations de la session
-        query = '''
-            SELECT 
-                a.code_smartex_ens,
-                e.nom_ens,
-                e.prenom_ens,
-                e.grade_code_ens,
-                c.dateExam as date,
-                c.h_debut,
-                c.h_fin,
-                c.cod_salle,
-                c.type_ex,
-                a.position,
-                a.jour,
-                a.seance
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE c.id_session = ?
-            ORDER BY c.dateExam, c.h_debut, c.cod_salle, e.nom_ens
-        '''
-        
-        affectations = db.execute(query, (session_id,)).fetchall()
+        # Récupérer toutes les affectations de la session (une requête)
+        aff_df = load_affectations(db, session_id)
         
-        if not affectations:
+        if aff_df.empty:
             return jsonify({
                 "success": False,
                 "error": f"Aucune affectation trouvée pour la session {session_id}"
             }), 404
         
-        # Convertir en DataFrame
-        aff_df = pd.DataFrame([dict(row) for row in affectations])
-        
         # Créer le dossier pour cette session
         affectation_csv_dir = os.path.join('results', 'affectation_csv', f'session_{session_id}')
-        os.makedirs(affectation_csv_dir, exist_ok=True)
-        
-        files_generated = []
-        
-        # 1. Affectation globale
-        out_global = os.path.join(affectation_csv_dir, f'affectations_global_session_{session_id}.csv')
-        aff_df.to_csv(out_global, index=False, encoding='utf-8')
-        files_generated.append(out_global)
-        print(f"✓ {out_global}")
-        
-        # 2. Fichiers par jour
-        jours_count = 0
-        if 'jour' in aff_df.columns:
-            for jour in sorted(aff_df['jour'].unique()):
-                if pd.notna(jour):
-                    jour_df = aff_df[aff_df['jour'] == jour].copy()
-                    out = os.path.join(affectation_csv_dir, f'affectations_jour_{int(jour)}_session_{session_id}.csv')
-                    jour_df.to_csv(out, index=False, encoding='utf-8')
-                    files_generated.append(out)
-                    jours_count += 1
-                    print(f"✓ {out}")
+        
+        # 1. Affectation globale, 2. Fichiers par jour
+        written = write_csv_files(aff_df, session_id, affectation_csv_dir, parts=('global', 'jours'))
+        files_generated = [path for _, path in written]
+        jours_count = sum(1 for part, _ in written if part == 'jours')
+        for out in files_generated:
+            print(f"✓ {out}")
         
         return jsonify({
             "success": True,
@@ -1987,55 +1832,23 @@ def generate_convocations_csv(session_id):
                 "error": f"Session {session_id} non trouvée"
             }), 404
         
-        # Récupérer toutes les affectations de la session
-        query = '''
-            SELECT 
-                a.code_smartex_ens,
-                e.nom_ens,
-                e.prenom_ens,
-                e.grade_code_ens,
-                c.dateExam as date,
-                c.h_debut,
-                c.h_fin,
-                c.cod_salle,
-                c.type_ex,
-                a.position,
-                a.jour,
-                a.seance
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE c.id_session = ?
-            ORDER BY c.dateExam, c.h_debut, c.cod_salle
-        '''
+        # Récupérer toutes les affectations de la session (une requête)
+        aff_df = load_affectations(db, session_id)
         
-        affectations = db.execute(query, (session_id,)).fetchall()
-        
-        if not affectations:
+        if aff_df.empty:
             return jsonify({
                 "success": False,
                 "error": f"Aucune affectation trouvée pour la session {session_id}"
             }), 404
         
-        # Convertir en DataFrame
-        aff_df = pd.DataFrame([dict(row) for row in affectations])
-        
         # Créer le dossier pour cette session
         convocation_csv_dir = os.path.join('results', 'convocation_csv', f'session_{session_id}')
-        os.makedirs(convocation_csv_dir, exist_ok=True)
-        
-        files_generated = []
-        
-        # Générer une convocation par enseignant
-        convocations_generated = 0
-        for code in aff_df['code_smartex_ens'].unique():
-            ens_df = aff_df[aff_df['code_smartex_ens'] == code].copy()
-            nom = ens_df.iloc[0]['nom_ens']
-            prenom = ens_df.iloc[0]['prenom_ens']
-            out = os.path.join(convocation_csv_dir, f'convocation_{code}_{nom}_{prenom}_session_{session_id}.csv')
-            ens_df.to_csv(out, index=False, encoding='utf-8')
-            files_generated.append(out)
-            convocations_generated += 1
+        
+        # Générer une convocation par enseignant (un seul groupby)
+        written = write_csv_files(aff_df, session_id, convocation_csv_dir, parts=('enseignants',))
+        files_generated = [path for _, path in written]
+        convocations_generated = len(files_generated)
+        for out in files_generated:
             print(f"✓ {out}")
         
         return jsonify({
@@ -2055,3 +1868,170 @@ def generate_convocations_csv(session_id):
             "error": f"Erreur lors de la génération des CSV de convocations: {str(e)}",
             "traceback": traceback.format_exc()
         }), 500
+
+
+@affectation_bp.route('/csv/export/<int:session_id>', methods=['GET'])
+def export_csv(session_id):
+    """
+    GET /api/affectations/csv/export/<session_id>
+    Envoie un CSV d'affectations directement (sans fichier sur le disque)
+    
+    Query:
+        part: global (défaut), jour ou enseignant
+        jour: numéro du jour (part=jour)
+        code: code_smartex_ens de l'enseignant (part=enseignant)
+    
+    Returns:
+        Fichier CSV envoyé en flux
+    """
+    try:
+        part = request.args.get('part', 'global')
+        parts = {'global': 'global', 'jour': 'jours', 'enseignant': 'enseignants'}
+        if part not in parts:
+            return jsonify({
+                "success": False,
+                "error": f"Partie inconnue: {part} (attendu: global, jour ou enseignant)"
+            }), 400
+        
+        key = None
+        if part == 'jour':
+            jour = request.args.get('jour', type=int)
+            if jour is None:
+                return jsonify({
+                    "success": False,
+                    "error": "Paramètre jour (entier) obligatoire pour part=jour"
+                }), 400
+            key = jour
+        elif part == 'enseignant':
+            key = request.args.get('code', '').strip()
+            if not key:
+                return jsonify({
+                    "success": False,
+                    "error": "Paramètre code obligatoire pour part=enseignant"
+                }), 400
+        
+        db = get_db()
+        aff_df = load_affectations(db, session_id)
+        if aff_df.empty:
+            return jsonify({
+                "success": False,
+                "error": f"Aucune affectation trouvée pour la session {session_id}"
+            }), 404
+        
+        # Sélection par clé du groupe (le code peut être lu comme un entier)
+        files = [f for f in csv_files(aff_df, session_id, parts=(parts[part],))
+                 if key is None or str(f[1]) == str(key)]
+        
+        if not files:
+            return jsonify({
+                "success": False,
+                "error": "Aucune affectation pour ce jour ou cet enseignant"
+            }), 404
+        
+        _, _, filename, rows = files[0]
+        frame = aff_df if rows is None else aff_df.take(rows)
+        return Response(iter_csv(frame), mimetype='text/csv', headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        })
+        
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
+@affectation_bp.route('/csv/export/<int:session_id>/zip', methods=['GET'])
+def export_csv_zip(session_id):
+    """
+    GET /api/affectations/csv/export/<session_id>/zip
+    Archive ZIP des CSV d'une session, produits et envoyés au fil de l'eau
+    (aucun fichier écrit sur le disque)
+    
+    Query:
+        parts: parties à inclure, séparées par des virgules
+               (global, jours, enseignants ; toutes par défaut)
+    
+    Returns:
+        Fichier ZIP (affectations/csv/..., convocations/csv/...)
+    """
+    try:
+        parts = [p.strip() for p in request.args.get('parts', ','.join(PARTS)).split(',') if p.strip()]
+        unknown = [p for p in parts if p not in PARTS]
+        if unknown or not parts:
+            return jsonify({
+                "success": False,
+                "error": f"Parties inconnues: {', '.join(unknown)} (attendu: {', '.join(PARTS)})"
+            }), 400
+        
+        db = get_db()
+        aff_df = load_affectations(db, session_id)
+        if aff_df.empty:
+            return jsonify({
+                "success": False,
+                "error": f"Aucune affectation trouvée pour la session {session_id}"
+            }), 404
+        
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        return zip_response(zip_entries(aff_df, session_id, parts=tuple(parts)),
+                            f"csv_session_{session_id}_{timestamp}.zip")
+        
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
+
+
+@affectation_bp.route('/xlsx/<int:session_id>', methods=['GET'])
+def export_planning_xlsx(session_id):
+    """
+    GET /api/affectations/xlsx/<session_id>
+    Planning de la session au format Excel : une feuille par jour
+    (séance, enseignant, salle) et une feuille de synthèse par grade
+    
+    Le classeur est écrit en mode write_only directement depuis les
+    curseurs SQLite (voir utils/xlsx_export.py), dans un fichier temporaire
+    supprimé après l'envoi.
+    
+    Returns:
+        Fichier XLSX
+    """
+    try:
+        session_info = get_session_info(session_id)
+        if not session_info:
+            return jsonify({"success": False, "error": "Session non trouvée", "session_id": session_id}), 404
+        
+        db = get_db()
+        seance_rows = db.execute(AFFECTATIONS_PAR_SEANCE_QUERY, (session_id,))
+        grade_rows = db.execute(SURVEILLANCES_PAR_GRADE_QUERY, (session_id,))
+        
+        output = tempfile.TemporaryFile()
+        try:
+            counts = write_planning_xlsx(output, session_info, seance_rows, grade_rows)
+        except Exception:
+            output.close()
+            raise
+        
+        if not counts['affectations']:
+            output.close()
+            return jsonify({
+                "success": False,
+                "error": f"Aucune affectation trouvée pour la session {session_id}"
+            }), 404
+        
+        output.seek(0)
+        filename = f"planning_session_{session_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return send_file(output, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name=filename)
+        
+    except Exception as e:
+        import traceback
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }), 500
@@ -2,12 +2,18 @@ import sqlite3
 from flask import Blueprint, jsonify, request
 from database.database import get_db
 from utils.time_utils import parse_time
+from utils.list_query import list_response
 
 creneau_bp = Blueprint('creneaux', __name__)
 
 @creneau_bp.route('', methods=['GET'])
 def get_all_creneaux():
-    """GET /api/creneaux - Récupérer tous les créneaux"""
+    """
+    GET /api/creneaux - Récupérer tous les créneaux
+
+    Pagination / projection / flux : limit, after, fields, format
+    (voir utils/list_query.py)
+    """
     try:
         db = get_db()
         # Paramètres de filtrage optionnels
@@ -33,14 +39,12 @@ def get_all_creneaux():
             conditions.append('c.dateExam = ?')
             params.append(date_exam)
         
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
-        
-        query += ' ORDER BY c.dateExam, c.h_debut'
-        
-        cursor = db.execute(query, params)
-        creneaux = [dict(row) for row in cursor.fetchall()]
-        return jsonify(creneaux), 200
+        sort_keys = [
+            ('c.dateExam', 'dateExam'),
+            ('c.h_debut', 'h_debut'),
+            ('c.creneau_id', 'creneau_id'),
+        ]
+        return list_response(db, query, conditions, params, sort_keys)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -420,12 +424,11 @@ def get_session_statistiques(id_session):
         ''', (id_session,))
         stats = dict(cursor.fetchone())
         
-        # Nombre d'affectations
+        # Nombre d'affectations (agrégat maintenu par triggers)
         cursor = db.execute('''
-            SELECT COUNT(*) as total_affectations
-            FROM affectation a
-            JOIN creneau c ON a.creneau_id = c.creneau_id
-            WHERE c.id_session = ?
+            SELECT COALESCE(SUM(nb_surveillants), 0) as total_affectations
+            FROM agg_surveillants_creneau
+            WHERE id_session = ?
         ''', (id_session,))
         stats.update(dict(cursor.fetchone()))
         
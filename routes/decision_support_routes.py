@@ -7,6 +7,7 @@ from flask import Blueprint, request, jsonify
 from database.database import get_db
 import sys
 import os
+import math
 import numpy as np
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -19,6 +20,14 @@ from scripts.decision_support_module import (
 
 decision_support_bp = Blueprint('decision_support', __name__)
 
+# Balayage : grille par défaut et nombre maximum de combinaisons
+SWEEP_DEFAULTS = {
+    'absence_margins': '0:0.5:0.05',
+    'min_differences': '1:6:1',
+    'max_non_souhaits_ratios': '0.1:0.5:0.1',
+}
+MAX_SWEEP_COMBINATIONS = 2000
+
 
 # ===================================================================
 # UTILITY FUNCTIONS
@@ -47,6 +56,43 @@ def convert_numpy_types(obj):
         return obj
 
 
+def parse_grid(value, cast=float, max_values=MAX_SWEEP_COMBINATIONS):
+    """
+    Valeurs d'un paramètre balayé : liste "0.1,0.15,0.2" ou plage
+    "début:fin:pas" (fin incluse)
+
+    La taille d'une plage est calculée avant de la construire : au-delà de
+    max_values valeurs, la grille est refusée sans rien allouer.
+    """
+    value = value.strip()
+    if ':' in value:
+        bounds = [float(v) for v in value.split(':')]
+        if len(bounds) != 3:
+            raise ValueError(f'Plage invalide (début:fin:pas attendu) : {value}')
+        start, stop, step = bounds
+        if not all(math.isfinite(v) for v in bounds):
+            raise ValueError(f'Valeurs non finies interdites : {value}')
+        if step <= 0:
+            raise ValueError(f'Pas invalide : {value}')
+        count = (stop - start) / step + 1
+        if not count <= max_values:
+            raise ValueError(f'Plage trop grande : {count:.0f} valeurs (maximum {max_values})')
+        values = np.round(np.arange(start, stop + step / 2, step), 6).tolist()
+    else:
+        values = [float(v) for v in value.split(',') if v.strip()]
+        if len(values) > max_values:
+            raise ValueError(f'Liste trop grande : {len(values)} valeurs (maximum {max_values})')
+    if not values:
+        raise ValueError(f'Aucune valeur : {value}')
+    if not all(math.isfinite(v) for v in values):
+        raise ValueError(f'Valeurs non finies interdites : {value}')
+    if any(v < 0 for v in values):
+        raise ValueError(f'Valeurs négatives interdites : {value}')
+    if cast is int and any(not v.is_integer() for v in values):
+        raise ValueError(f'Valeurs entières attendues : {value}')
+    return sorted(set(cast(v) for v in values))
+
+
 # ===================================================================
 # GENERATE RECOMMENDATIONS
 # ===================================================================
@@ -168,6 +214,91 @@ def get_recommendations(session_id):
         }), 500
 
 
+# ===================================================================
+# PARAMETER SWEEP
+# ===================================================================
+
+@decision_support_bp.route('/sweep/<int:session_id>', methods=['GET'])
+def sweep_parameters(session_id):
+    """
+    Évaluer toute une grille de paramètres en une requête (données de la
+    session chargées une fois, calcul vectorisé)
+    
+    Query params (liste "a,b,c" ou plage "début:fin:pas") :
+    - absence_margins (défaut: 0:0.5:0.05)
+    - min_differences (défaut: 1:6:1)
+    - max_non_souhaits_ratios (défaut: 0.1:0.5:0.1)
+    - pareto_only: true/false (défaut: false) - Ne renvoyer que le front de Pareto
+    
+    Response:
+    {
+        "success": true,
+        "data": {
+            "session_id": 1,
+            "surveillances_base": 622,
+            "grades": {"MA": {"nb_enseignants": 57, "level": 2}, ...},
+            "combinations": 330,
+            "table": [{"absence_margin": 0.15, "min_difference": 3, ...,
+                       "quotas_by_grade": {...}, "pareto": false}, ...],
+            "pareto": [...]
+        }
+    }
+    """
+    db = get_db()
+    
+    try:
+        cursor = db.execute(
+            "SELECT * FROM session WHERE id_session = ?",
+            (session_id,)
+        )
+        if not cursor.fetchone():
+            return jsonify({
+                'success': False,
+                'error': f'Session {session_id} not found'
+            }), 404
+        
+        try:
+            grid = {
+                name: parse_grid(request.args.get(name, default), int if name == 'min_differences' else float)
+                for name, default in SWEEP_DEFAULTS.items()
+            }
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        combinations = int(np.prod([len(values) for values in grid.values()]))
+        if combinations > MAX_SWEEP_COMBINATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'Grille trop grande : {combinations} combinaisons '
+                         f'(maximum {MAX_SWEEP_COMBINATIONS})'
+            }), 400
+        
+        dsm = DecisionSupportModule(session_id)
+        result = dsm.sweep_parameters(
+            grid['absence_margins'],
+            grid['min_differences'],
+            grid['max_non_souhaits_ratios']
+        )
+        result['combinations'] = combinations
+        if request.args.get('pareto_only', 'false').lower() == 'true':
+            result['table'] = result['pareto']
+        
+        return jsonify({
+            'success': True,
+            'data': convert_numpy_types(result)
+        })
+    
+    except Exception as e:
+        import traceback
+        print(f"ERREUR: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'type': type(e).__name__
+        }), 500
+
+
 # ===================================================================
 # COMPARE WITH CURRENT
 # ===================================================================
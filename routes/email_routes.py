@@ -6,8 +6,13 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
 from email.utils import formataddr
-import json
 import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from utils.smtp_pool import get_smtp_pool
+from utils.email_outbox import (OutboxDispatcher, batch_status, document_hash, enqueue_batch,
+                                ensure_outbox_table, supersede_stale)
+from utils.document_pipeline import fetch_convocation_jobs, job_hash, load_manifest, stream_documents
 # Création du blueprint
 email_bp = Blueprint("email_bp", __name__)
 
@@ -136,6 +141,37 @@ def extract_code_smartex_from_filename(filename):
     except Exception:
         return None
 
+def build_email_with_pdf(to_email, to_name, subject, body, pdf_path, pdf_filename, email_config, pdf_data=None):
+    """
+    Construit un email avec un PDF en pièce jointe
+    
+    Args:
+        pdf_data: contenu du PDF déjà en mémoire (pdf_path n'est alors pas lu)
+    
+    Returns:
+        MIMEMultipart ou None si le PDF n'existe pas
+    """
+    if pdf_data is None and (not pdf_path or not os.path.exists(pdf_path)):
+        return None
+    
+    # Créer le message
+    msg = MIMEMultipart()
+    msg['From'] = formataddr((email_config['FROM_NAME'], email_config['FROM_EMAIL']))
+    msg['To'] = formataddr((to_name, to_email))
+    msg['Subject'] = subject
+    
+    # Ajouter le corps du message
+    msg.attach(MIMEText(body, 'html'))
+    
+    # Ajouter la pièce jointe PDF
+    if pdf_data is None:
+        with open(pdf_path, 'rb') as f:
+            pdf_data = f.read()
+    pdf = MIMEApplication(pdf_data, _subtype='pdf')
+    pdf.add_header('Content-Disposition', 'attachment', filename=pdf_filename)
+    msg.attach(pdf)
+    return msg
+
 def send_email_with_pdf(to_email, to_name, subject, body, pdf_path, pdf_filename, email_config):
     """
     Envoie un email avec un PDF en pièce jointe
@@ -153,29 +189,12 @@ def send_email_with_pdf(to_email, to_name, subject, body, pdf_path, pdf_filename
         tuple: (success: bool, message: str)
     """
     try:
-        # Créer le message
-        msg = MIMEMultipart()
-        msg['From'] = formataddr((email_config['FROM_NAME'], email_config['FROM_EMAIL']))
-        msg['To'] = formataddr((to_name, to_email))
-        msg['Subject'] = subject
-        
-        # Ajouter le corps du message
-        msg.attach(MIMEText(body, 'html'))
-        
-        # Ajouter la pièce jointe PDF
-        if pdf_path and os.path.exists(pdf_path):
-            with open(pdf_path, 'rb') as f:
-                pdf = MIMEApplication(f.read(), _subtype='pdf')
-                pdf.add_header('Content-Disposition', 'attachment', filename=pdf_filename)
-                msg.attach(pdf)
-        else:
+        msg = build_email_with_pdf(to_email, to_name, subject, body, pdf_path, pdf_filename, email_config)
+        if msg is None:
             return False, f"Fichier PDF non trouvé: {pdf_path}"
         
-        # Connexion au serveur SMTP et envoi
-        with smtplib.SMTP(email_config['SMTP_SERVER'], email_config['SMTP_PORT']) as server:
-            server.starttls()
-            server.login(email_config['SMTP_USER'], email_config['SMTP_PASSWORD'])
-            server.send_message(msg)
+        # Connexion SMTP du pool (ouverte et authentifiée une seule fois)
+        get_smtp_pool(email_config).send(msg)
         
         return True, "Email envoyé avec succès"
     
@@ -186,6 +205,65 @@ def send_email_with_pdf(to_email, to_name, subject, body, pdf_path, pdf_filename
     except Exception as e:
         return False, f"Erreur lors de l'envoi: {str(e)}"
 
+def send_emails_with_pdf(emails, email_config):
+    """
+    Envoie plusieurs emails en parallèle sur les connexions du pool SMTP
+    
+    Args:
+        emails: liste de dicts (arguments de send_email_with_pdf sans email_config)
+        email_config: Configuration SMTP
+    
+    Returns:
+        list: (success, message) pour chaque email, dans l'ordre
+    """
+    if not emails:
+        return []
+    pool = get_smtp_pool(email_config)
+    # Un thread par connexion : chaque message est construit juste avant son envoi
+    with ThreadPoolExecutor(max_workers=min(pool.size, len(emails))) as executor:
+        futures = [
+            executor.submit(send_email_with_pdf, email_config=email_config, **email)
+            for email in emails
+        ]
+        return [future.result() for future in futures]
+
+def deliver_outbox_message(message):
+    """
+    Envoyer un message de la table email_outbox (appelé par le répartiteur)
+    
+    Raises:
+        FileNotFoundError si le PDF a disparu, erreur SMTP sinon
+    """
+    email_config = load_email_config()
+    msg = build_email_with_pdf(message['to_email'], message['to_name'], message['subject'],
+                               message['body'], message['pdf_path'], message['pdf_filename'],
+                               email_config, pdf_data=message.get('pdf_data'))
+    if msg is None:
+        raise FileNotFoundError(f"Fichier PDF non trouvé: {message['pdf_path']}")
+    get_smtp_pool(email_config).send(msg)
+
+_dispatcher = OutboxDispatcher(deliver_outbox_message)
+_outbox_checked = False
+
+@email_bp.before_app_request
+def resume_outbox():
+    """Au premier appel après un redémarrage : reprendre les envois restés en file"""
+    global _outbox_checked
+    if _outbox_checked:
+        return
+    _outbox_checked = True
+    try:
+        from database.database import get_db
+        db = get_db()
+        ensure_outbox_table(db)
+        pending = db.execute(
+            "SELECT 1 FROM email_outbox WHERE status IN ('en_attente', 'en_cours') LIMIT 1"
+        ).fetchone()
+        if pending:
+            _dispatcher.start()
+    except Exception as e:
+        print(f"⚠️  Reprise des envois impossible : {e}")
+
 def create_convocation_email_body(enseignant_nom, enseignant_prenom):
     """
     Crée le corps HTML de l'email de convocation
@@ -294,6 +372,7 @@ def send_convocations_by_filenames():
             'errors': [],
             'skipped': []
         }
+        pending = []
         
         # Parcourir tous les fichiers
         for filename in filenames:
@@ -357,33 +436,20 @@ def send_convocations_by_filenames():
                 # Sujet de l'email
                 subject = "Convocation - Surveillance des Examens"
                 
-                # Envoyer l'email
-                success, message = send_email_with_pdf(
-                    to_email=enseignant['email_ens'],
-                    to_name=f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                    subject=subject,
-                    body=email_body,
-                    pdf_path=pdf_path,
-                    pdf_filename=filename,
-                    email_config=email_config
-                )
-                
-                if success:
-                    results['success'].append({
-                        'filename': filename,
-                        'code_smartex_ens': code_smartex_ens,
-                        'enseignant': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                        'email': enseignant['email_ens'],
-                        'message': message
-                    })
-                else:
-                    results['errors'].append({
-                        'filename': filename,
-                        'code_smartex_ens': code_smartex_ens,
-                        'enseignant': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                        'email': enseignant['email_ens'],
-                        'error': message
-                    })
+                # Envoi groupé après le parcours (connexions SMTP partagées)
+                pending.append(({
+                    'filename': filename,
+                    'code_smartex_ens': code_smartex_ens,
+                    'enseignant': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
+                    'email': enseignant['email_ens']
+                }, {
+                    'to_email': enseignant['email_ens'],
+                    'to_name': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
+                    'subject': subject,
+                    'body': email_body,
+                    'pdf_path': pdf_path,
+                    'pdf_filename': filename
+                }))
                 
             except Exception as e:
                 results['errors'].append({
@@ -391,6 +457,14 @@ def send_convocations_by_filenames():
                     'error': f'Erreur lors du traitement: {str(e)}'
                 })
         
+        # Envoyer les emails en parallèle
+        outcomes = send_emails_with_pdf([email for _, email in pending], email_config)
+        for (entry, _), (success, message) in zip(pending, outcomes):
+            if success:
+                results['success'].append({**entry, 'message': message})
+            else:
+                results['errors'].append({**entry, 'error': message})
+        
         return jsonify({
             'message': 'Envoi des convocations terminé',
             'total_files': len(filenames),
@@ -411,25 +485,32 @@ def send_convocations_by_filenames():
 def send_all_convocations_for_session(session_id):
     """
     Envoie toutes les convocations d'une session automatiquement
-    Lit tous les fichiers PDF du dossier results/convocations/{session_id}/
+    Lit tous les fichiers PDF du dossier results/convocations/session_{session_id}/
+    
+    Les emails sont mis en file (table email_outbox) puis envoyés en tâche
+    de fond : la réponse est immédiate (202) et contient un batch_id dont
+    l'avancement se suit sur GET /api/email/outbox/<batch_id>.
+    Relancer l'envoi ne renvoie pas les convocations déjà parties.
     
     Args:
         session_id: ID de la session
     
     Returns:
-        JSON avec le statut des envois
+        JSON avec le lot créé et les fichiers ignorés
     """
     try:
         # Charger la configuration email
         try:
-            email_config = load_email_config()
+            load_email_config()
         except Exception as e:
             return jsonify({
                 'error': f'Erreur de configuration email: {str(e)}'
             }), 500
         
-        # Chemin du dossier des convocations
-        convocations_dir = os.path.join(PDF_DIR, str(session_id))
+        # Chemin du dossier des convocations (ancien emplacement en secours)
+        convocations_dir = os.path.join(PDF_DIR, f"session_{session_id}")
+        if not os.path.exists(convocations_dir):
+            convocations_dir = os.path.join(PDF_DIR, str(session_id))
         
         if not os.path.exists(convocations_dir):
             return jsonify({
@@ -447,10 +528,12 @@ def send_all_convocations_for_session(session_id):
         db = get_db()
         
         results = {
-            'success': [],
             'errors': [],
             'skipped': []
         }
+        pending = []
+        # Empreintes des données des PDF (génération incrémentale)
+        manifest = load_manifest(convocations_dir)
         
         # Parcourir tous les fichiers PDF
         for filename in pdf_files:
@@ -501,32 +584,17 @@ def send_all_convocations_for_session(session_id):
                 
                 subject = "Convocation - Surveillance des Examens"
                 
-                # Envoyer l'email
-                success, message = send_email_with_pdf(
-                    to_email=enseignant['email_ens'],
-                    to_name=f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                    subject=subject,
-                    body=email_body,
-                    pdf_path=pdf_path,
-                    pdf_filename=filename,
-                    email_config=email_config
-                )
-                
-                if success:
-                    results['success'].append({
-                        'filename': filename,
-                        'code_smartex_ens': code_smartex_ens,
-                        'enseignant': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                        'email': enseignant['email_ens']
-                    })
-                else:
-                    results['errors'].append({
-                        'filename': filename,
-                        'code_smartex_ens': code_smartex_ens,
-                        'enseignant': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
-                        'email': enseignant['email_ens'],
-                        'error': message
-                    })
+                # Mise en file après le parcours
+                pending.append({
+                    'code_smartex_ens': code_smartex_ens,
+                    'doc_hash': document_hash(pdf_path, manifest),
+                    'to_email': enseignant['email_ens'],
+                    'to_name': f"{enseignant['prenom_ens']} {enseignant['nom_ens']}",
+                    'subject': subject,
+                    'body': email_body,
+                    'pdf_path': pdf_path,
+                    'pdf_filename': filename
+                })
                 
             except Exception as e:
                 results['errors'].append({
@@ -534,15 +602,24 @@ def send_all_convocations_for_session(session_id):
                     'error': str(e)
                 })
         
+        # Enregistrer le lot (idempotent) puis réveiller le répartiteur
+        batch_id, stats = enqueue_batch(db, session_id, pending)
+        queued = stats['ajoutes'] + stats['repris']
+        if queued:
+            _dispatcher.start()
+        
         return jsonify({
-            'message': 'Envoi des convocations terminé',
+            'message': 'Convocations mises en file d\'envoi' if queued else 'Aucune nouvelle convocation à envoyer',
             'session_id': session_id,
+            'batch_id': batch_id if queued else None,
+            'status_url': f'/api/email/outbox/{batch_id}' if queued else None,
             'total_files': len(pdf_files),
-            'success_count': len(results['success']),
+            'queued_count': queued,
+            'already_sent_count': stats['deja_envoyes'],
             'error_count': len(results['errors']),
             'skipped_count': len(results['skipped']),
             'details': results
-        }), 200
+        }), 202 if queued else 200
     
     except Exception as e:
         import traceback
@@ -551,6 +628,151 @@ def send_all_convocations_for_session(session_id):
             'traceback': traceback.format_exc()
         }), 500
 
+@email_bp.route('/render-and-send/<int:session_id>', methods=['POST'])
+def render_and_send_convocations(session_id):
+    """
+    Génère les convocations d'une session en mémoire et les met directement
+    en file d'envoi (sans écriture puis relecture des PDF sur le disque)
+    
+    Les enseignants viennent de la base (pas des noms de fichiers) ; chaque
+    PDF rendu rejoint la file dès la fin de son paquet, le répartiteur
+    commence donc à envoyer pendant le rendu des suivants. Les convocations
+    déjà envoyées (mêmes données) ne sont pas rendues à nouveau.
+    
+    Body JSON (optionnel):
+        {
+            "save": false  // true : garder aussi une copie dans results/convocations
+        }
+    
+    Returns:
+        JSON avec le lot créé (suivi : GET /api/email/outbox/<batch_id>)
+    """
+    try:
+        # Charger la configuration email
+        try:
+            load_email_config()
+        except Exception as e:
+            return jsonify({
+                'error': f'Erreur de configuration email: {str(e)}'
+            }), 500
+        
+        data = request.get_json(silent=True) or {}
+        save = str(data.get('save', request.args.get('save', 'false'))).lower() == 'true'
+        
+        from database.database import get_db
+        db = get_db()
+        ensure_outbox_table(db)
+        
+        output_dir = os.path.join(PDF_DIR, f"session_{session_id}")
+        jobs = [job for job in fetch_convocation_jobs(db, session_id, output_dir) if job['rows']]
+        if not jobs:
+            return jsonify({
+                'error': f'Aucune affectation trouvée pour la session {session_id}'
+            }), 404
+        
+        emails = {row['code_smartex_ens']: row['email_ens'] for row in db.execute(
+            "SELECT code_smartex_ens, email_ens FROM enseignant"
+        ).fetchall()}
+        already_sent = {(row['code_smartex_ens'], row['doc_hash']) for row in db.execute(
+            "SELECT code_smartex_ens, doc_hash FROM email_outbox WHERE id_session = ? AND status = 'envoyé'",
+            (session_id,)
+        ).fetchall()}
+        
+        skipped = []
+        to_render = []
+        hashes = {}
+        already_sent_count = 0
+        for job in jobs:
+            if not emails.get(job['code']):
+                skipped.append({
+                    'code_smartex_ens': job['code'],
+                    'enseignant': f"{job['prenom']} {job['nom']}",
+                    'reason': 'Email non renseigné'
+                })
+                continue
+            hashes[job['code']] = job_hash('convocations', job)
+            # Une ancienne version encore en file ne part pas pendant le rendu
+            supersede_stale(db, session_id, job['code'], hashes[job['code']])
+            if (job['code'], hashes[job['code']]) in already_sent:
+                already_sent_count += 1
+                continue
+            to_render.append(job)
+        
+        db.commit()
+        
+        batch_id = uuid.uuid4().hex
+        stats = {'ajoutes': 0, 'deja_envoyes': 0, 'repris': 0}
+        
+        def enqueue(job, pdf):
+            filename = os.path.basename(job['path'])
+            _, added = enqueue_batch(db, session_id, [{
+                'code_smartex_ens': job['code'],
+                'doc_hash': hashes[job['code']],
+                'to_email': emails[job['code']],
+                'to_name': f"{job['prenom']} {job['nom']}",
+                'subject': "Convocation - Surveillance des Examens",
+                'body': create_convocation_email_body(job['nom'], job['prenom']),
+                'pdf_path': job['path'] if save else None,
+                'pdf_filename': filename,
+                'pdf_data': pdf
+            }], batch_id=batch_id)
+            for key, value in added.items():
+                stats[key] += value
+            # Envoi pendant le rendu des documents suivants
+            _dispatcher.start()
+        
+        rapport = stream_documents('convocations', session_id, to_render, enqueue, save=save)
+        queued = stats['ajoutes'] + stats['repris']
+        
+        return jsonify({
+            'message': 'Convocations générées et mises en file d\'envoi' if queued else 'Aucune nouvelle convocation à envoyer',
+            'session_id': session_id,
+            'batch_id': batch_id if queued else None,
+            'status_url': f'/api/email/outbox/{batch_id}' if queued else None,
+            'total_enseignants': len(jobs),
+            'queued_count': queued,
+            'already_sent_count': already_sent_count + stats['deja_envoyes'],
+            'error_count': len(rapport['erreurs']),
+            'skipped_count': len(skipped),
+            'saved_to_disk': save,
+            'rendu': {
+                'processus': rapport['processus'],
+                'duree_totale': rapport['duree_totale'],
+                'duree_moyenne_document': rapport['duree_moyenne_document']
+            },
+            'details': {
+                'errors': rapport['erreurs'],
+                'skipped': skipped
+            }
+        }), 202 if queued else 200
+    
+    except Exception as e:
+        import traceback
+        return jsonify({
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }), 500
+
+@email_bp.route('/outbox/<batch_id>', methods=['GET'])
+def get_outbox_batch(batch_id):
+    """
+    GET /api/email/outbox/<batch_id>
+    Avancement d'un lot d'envoi : compteurs par statut et détail par message
+    (essais, prochaine tentative, dernière erreur)
+    
+    Query:
+        messages=false pour n'avoir que les compteurs
+    """
+    from database.database import get_db
+    with_messages = request.args.get('messages', 'true').lower() != 'false'
+    status = batch_status(get_db(), batch_id, with_messages=with_messages)
+    if status is None:
+        return jsonify({'error': 'Lot non trouvé'}), 404
+    if status['status'] != 'terminé':
+        # Lot interrompu (redémarrage) : reprendre l'envoi
+        _dispatcher.start()
+    return jsonify(status), 200
+
 @email_bp.route('/test-email-config', methods=['POST'])
 def test_email_configuration():
     """
@@ -1,6 +1,7 @@
 import sqlite3
 from flask import Blueprint, jsonify, request
 from database.database import get_db
+from utils.list_query import list_response
 
 enseignant_bp = Blueprint('enseignants', __name__)
 
@@ -21,17 +22,25 @@ def normalize_grade(grade):
 
 @enseignant_bp.route('', methods=['GET'])
 def get_all_enseignants():
-    """GET /api/enseignants - Récupérer tous les enseignants"""
+    """
+    GET /api/enseignants - Récupérer tous les enseignants
+
+    Pagination / projection / flux : limit, after, fields, format
+    (voir utils/list_query.py)
+    """
     try:
         db = get_db()
-        cursor = db.execute('''
+        query = '''
             SELECT e.*, g.quota 
             FROM enseignant e
             LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
-            ORDER BY e.nom_ens, e.prenom_ens
-        ''')
-        enseignants = [dict(row) for row in cursor.fetchall()]
-        return jsonify(enseignants), 200
+        '''
+        sort_keys = [
+            ('e.nom_ens', 'nom_ens'),
+            ('e.prenom_ens', 'prenom_ens'),
+            ('e.code_smartex_ens', 'code_smartex_ens'),
+        ]
+        return list_response(db, query, [], [], sort_keys)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -7,6 +7,7 @@ API simplifiée en anglais
 from flask import Blueprint, request, jsonify
 from database.database import get_db, remplir_responsables_absents
 import json
+import math
 import os
 import sys
 import numpy as np
@@ -17,6 +18,15 @@ from scripts.optimize_example import (
     load_data_from_db,
     save_results_to_db
 )
+from utils.statistics_engine import load_session_affectations, comptages
+from utils.plan_validator import validate_plan, MAX_DETAILS
+from utils.absence_simulation import (
+    simulate_reserves,
+    reserves_by_slot,
+    NIVEAU_SERVICE,
+    NB_ESSAIS,
+    MAX_RESERVES
+)
 
 optimize_bp = Blueprint('optimize', __name__)
 
@@ -48,6 +58,49 @@ def convert_numpy_types(obj):
         return obj
 
 
+def parse_number(value, cast, name):
+    """
+    Convertir un paramètre numérique (query string ou corps JSON)
+
+    Returns:
+        int, float ou None si le paramètre est absent
+
+    Raises:
+        ValueError: valeur non numérique, non finie, ou non entière pour int
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'{name} doit être un nombre')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} doit être un nombre')
+    if not math.isfinite(number):
+        raise ValueError(f'{name} doit être un nombre fini')
+    if cast is int:
+        if not number.is_integer():
+            raise ValueError(f'{name} doit être un entier')
+        return int(number)
+    return number
+
+
+def simulation_errors(service_level, absence_rate):
+    """
+    Message d'erreur des paramètres de simulation des absences (None si valides)
+
+    absence_rate est obligatoire dès qu'une simulation est demandée : la base
+    ne contient pas de mesure des absences des surveillants.
+    """
+    if service_level is not None and not 0 < service_level < 1:
+        return 'service_level doit être compris entre 0 et 1'
+    if service_level is not None and absence_rate is None:
+        return 'absence_rate est obligatoire pour simuler les réserves'
+    if absence_rate is not None and not 0 <= absence_rate < 1:
+        return 'absence_rate doit être compris entre 0 et 1'
+    return None
+
+
 # ===================================================================
 # OPTIMIZE
 # ===================================================================
@@ -65,11 +118,17 @@ def run():
         "generate_files": true,     // Générer quota_enseignant.csv (Note: Pour les CSV d'affectations, utilisez /api/affectations/csv/<session_id>)
         "generate_stats": true,     // Générer les statistiques
         "timeout": 120,             // Timeout en secondes (défaut: 120)
-        "fast_mode": false          // Mode rapide - désactive S4, S5, S6 (défaut: false)
+        "fast_mode": false,         // Mode rapide - désactive S4, S5, S6 (défaut: false)
+        "service_level": 0.95,      // Optionnel : réserves par créneau simulées (voir /reserves)
+        "absence_rate": 0.05        // Taux d'absence de la simulation (obligatoire avec service_level)
     }
     
     Note: La génération des CSV d'affectations (global, par jour, convocations) 
     se fait maintenant via GET /api/affectations/csv/<session_id>
+    
+    Note: Avec service_level, les réserves recommandées par la simulation
+    remplacent min(nb_salles, 4). Le total de surveillances change : l'équité
+    stricte par grade (H4) peut alors rendre le problème infaisable.
     """
     db = get_db()
     data = request.get_json()
@@ -87,6 +146,18 @@ def run():
             'error': 'session_id is required'
         }), 400
     
+    try:
+        service_level = parse_number(data.get('service_level'), float, 'service_level')
+        absence_rate = parse_number(data.get('absence_rate'), float, 'absence_rate')
+        error = simulation_errors(service_level, absence_rate)
+    except ValueError as e:
+        error = str(e)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
     try:
         cursor = db.execute(
             "SELECT * FROM session WHERE id_session = ?",
@@ -118,9 +189,20 @@ def run():
             build_voeux_set
         )
         
+        # Réserves par créneau simulées (sinon règle min(nb_salles, 4))
+        reserves = None
+        reserves_simulation = None
+        if service_level is not None:
+            print("\n1b. Simulation des absences...")
+            simulation = simulate_reserves(db, session_id, absence_rate,
+                                           niveau_service=service_level)
+            reserves = reserves_by_slot(simulation)
+            reserves_simulation = {**simulation['parametres'], **simulation['totaux']}
+        
         print("\n2. Construction des structures...")
         salle_responsable = build_salle_responsable_mapping(planning_df)
-        creneaux = build_creneaux_from_salles(salles_df, salle_responsable, salle_par_creneau_df)
+        creneaux = build_creneaux_from_salles(salles_df, salle_responsable, salle_par_creneau_df,
+                                              nb_reserves_dynamique=reserves)
         creneaux = map_creneaux_to_jours_seances(creneaux, mapping_df)
         teachers = build_teachers_dict(enseignants_df, parametres_df, adjusted_quotas)
         voeux_set = build_voeux_set(voeux_df)
@@ -143,7 +225,8 @@ def run():
             voeux_df, parametres_df, mapping_df, salle_par_creneau_df,
             adjusted_quotas,
             timeout_seconds=timeout,
-            fast_mode=fast_mode
+            fast_mode=fast_mode,
+            nb_reserves_dynamique=reserves
         )
         
         saved = 0
@@ -249,6 +332,7 @@ def run():
             'responsable_presences': total_presences if generate_files else 0,
             'quota_calculated': quota_saved,
             'statistics': stats if generate_stats else None,
+            'reserves_simulation': reserves_simulation,
             'infeasibility_diagnostic': infeasibility_diagnostic if result['status'] == 'infeasible' else None
         }
         
@@ -319,55 +403,29 @@ def get_stats(session_id):
     db = get_db()
     
     try:
-        # By grade
-        cursor = db.execute("""
-            SELECT e.grade_code_ens as grade, COUNT(*) as count
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            WHERE a.id_session = ?
-            GROUP BY e.grade_code_ens
-            ORDER BY grade
-        """, (session_id,))
+        # Une seule lecture des affectations, agrégées en mémoire
+        aff_df = load_session_affectations(db, session_id)
         
-        by_grade = {row['grade']: row['count'] for row in cursor.fetchall()}
+        # By grade
+        by_grade = dict(sorted(comptages(aff_df, 'grade_code_ens').items(),
+                               key=lambda kv: (kv[0] is None, kv[0])))
         
         # By teacher
-        cursor = db.execute("""
-            SELECT
-                a.code_smartex_ens,
-                e.nom_ens,
-                e.prenom_ens,
-                e.grade_code_ens,
-                COUNT(*) as count
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            WHERE a.id_session = ?
-            GROUP BY a.code_smartex_ens
-            ORDER BY count DESC
-        """, (session_id,))
-        
-        by_teacher = [dict(row) for row in cursor.fetchall()]
+        by_teacher = []
+        if not aff_df.empty:
+            by_teacher = (
+                aff_df.groupby(['code_smartex_ens', 'nom_ens', 'prenom_ens', 'grade_code_ens'])
+                .size().rename('count').reset_index()
+                .sort_values('count', ascending=False, kind='stable')
+                .to_dict('records')
+            )
         
         # By position
-        cursor = db.execute("""
-            SELECT position, COUNT(*) as count
-            FROM affectation
-            WHERE id_session = ?
-            GROUP BY position
-        """, (session_id,))
-        
-        by_position = {row['position']: row['count'] for row in cursor.fetchall()}
+        by_position = comptages(aff_df, 'position')
         
         # By day
-        cursor = db.execute("""
-            SELECT jour, COUNT(*) as count
-            FROM affectation
-            WHERE id_session = ?
-            GROUP BY jour
-            ORDER BY jour
-        """, (session_id,))
-        
-        by_day = {row['jour']: row['count'] for row in cursor.fetchall()}
+        by_day = dict(sorted(comptages(aff_df, 'jour').items(),
+                             key=lambda kv: (kv[0] is None, kv[0])))
         
         return jsonify({
             'success': True,
@@ -392,38 +450,160 @@ def get_workload(session_id):
     db = get_db()
     
     try:
-        cursor = db.execute("""
-            SELECT
-                a.code_smartex_ens,
-                e.nom_ens,
-                e.prenom_ens,
-                e.email_ens,
-                e.grade_code_ens,
-                g.quota,
-                COUNT(*) as affectations,
-                ROUND(COUNT(*) * 100.0 / g.quota, 2) as percentage
-            FROM affectation a
-            JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-            JOIN grade g ON e.grade_code_ens = g.code_grade
-            WHERE a.id_session = ?
-            GROUP BY a.code_smartex_ens
-            ORDER BY percentage DESC
-        """, (session_id,))
-        
-        workload = [dict(row) for row in cursor.fetchall()]
-        avg = sum(t['percentage'] for t in workload) / len(workload) if workload else 0
+        workload, summary = session_workload(db, session_id)
         
         return jsonify({
             'success': True,
             'data': workload,
-            'summary': {
-                'total_teachers': len(workload),
-                'average_percentage': round(avg, 2)
-            }
+            'summary': summary
         })
     
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 400
\ No newline at end of file
+        }), 400
+
+
+def session_workload(db, session_id):
+    """
+    Charge des enseignants affectés d'une session (affectations vs quota)
+    
+    Returns:
+        tuple: (liste par enseignant, résumé)
+    """
+    cursor = db.execute("""
+        SELECT
+            ace.code_smartex_ens,
+            e.nom_ens,
+            e.prenom_ens,
+            e.email_ens,
+            e.grade_code_ens,
+            g.quota,
+            ace.nb_affectations as affectations,
+            ROUND(ace.nb_affectations * 100.0 / g.quota, 2) as percentage
+        FROM agg_charge_enseignant ace
+        JOIN enseignant e ON ace.code_smartex_ens = e.code_smartex_ens
+        JOIN grade g ON e.grade_code_ens = g.code_grade
+        WHERE ace.id_session = ?
+        ORDER BY percentage DESC
+    """, (session_id,))
+    
+    workload = [dict(row) for row in cursor.fetchall()]
+    avg = sum(t['percentage'] for t in workload) / len(workload) if workload else 0
+    
+    return workload, {
+        'total_teachers': len(workload),
+        'average_percentage': round(avg, 2)
+    }
+
+
+# ===================================================================
+# VALIDATION
+# ===================================================================
+
+@optimize_bp.route('/validate/<int:session_id>', methods=['GET'])
+def validate(session_id):
+    """
+    Validate the current plan of a session against all optimizer constraints
+
+    Query params:
+        nb_reserves: réserves par créneau (défaut : min(nb_salles, 4))
+        details: nombre maximum de violations détaillées par règle (défaut : 100)
+    """
+    db = get_db()
+
+    try:
+        nb_reserves = request.args.get('nb_reserves', type=int)
+        max_details = request.args.get('details', MAX_DETAILS, type=int)
+        if (nb_reserves is not None and nb_reserves < 0) or max_details < 0:
+            return jsonify({
+                'success': False,
+                'error': 'nb_reserves et details doivent être positifs'
+            }), 400
+
+        result = validate_plan(db, session_id, nb_reserves=nb_reserves, max_details=max_details)
+        if not result['affectations']:
+            return jsonify({
+                'success': False,
+                'error': f'Aucune affectation pour la session {session_id}'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+
+@optimize_bp.route('/reserves/<int:session_id>', methods=['GET'])
+def size_reserves(session_id):
+    """
+    Size reserves per slot with a Monte Carlo simulation of absences
+
+    Query params:
+        service_level: probabilité de couverture visée par créneau (défaut : 0.95)
+        trials: nombre de tirages (défaut : 20000, maximum : 200000)
+        max_reserves: réserves maximum envisagées par créneau (défaut : 10)
+        absence_rate: taux d'absence des surveillants (obligatoire)
+        seed: graine du générateur (résultats reproductibles)
+    """
+    db = get_db()
+
+    try:
+        # Paramètre présent mais illisible : 400 (pas de retour silencieux au défaut)
+        try:
+            service_level = parse_number(request.args.get('service_level'), float, 'service_level')
+            trials = parse_number(request.args.get('trials'), int, 'trials')
+            max_reserves = parse_number(request.args.get('max_reserves'), int, 'max_reserves')
+            absence_rate = parse_number(request.args.get('absence_rate'), float, 'absence_rate')
+            seed = parse_number(request.args.get('seed'), int, 'seed')
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        service_level = NIVEAU_SERVICE if service_level is None else service_level
+        trials = NB_ESSAIS if trials is None else trials
+        max_reserves = MAX_RESERVES if max_reserves is None else max_reserves
+
+        error = simulation_errors(service_level, absence_rate)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+        if not 0 < trials <= 200000 or not 0 <= max_reserves <= 50:
+            return jsonify({
+                'success': False,
+                'error': 'trials doit être entre 1 et 200000, max_reserves entre 0 et 50'
+            }), 400
+        if seed is not None and seed < 0:
+            return jsonify({
+                'success': False,
+                'error': 'seed doit être positif'
+            }), 400
+
+        result = simulate_reserves(db, session_id, absence_rate, niveau_service=service_level,
+                                   nb_essais=trials, max_reserves=max_reserves, seed=seed)
+        if not result['creneaux']:
+            return jsonify({
+                'success': False,
+                'error': f'Aucun créneau pour la session {session_id}'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': convert_numpy_types(result)
+        })
+
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
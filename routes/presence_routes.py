@@ -1,9 +1,37 @@
 import sqlite3
 from flask import Blueprint, jsonify, request
 from database.database import get_db
+from utils.list_query import list_response
 
 presence_bp = Blueprint('presence', __name__)
 
+def _format_presence(resp):
+    """Mettre en forme une ligne de responsable_absent_jour_examen"""
+    return {
+        'id': resp['id'],
+        'id_session': resp['id_session'],
+        'libelle_session': resp['libelle_session'],
+        'code_smartex_ens': resp['code_smartex_ens'],
+        'nom': resp['nom'],
+        'prenom': resp['prenom'],
+        'grade_code': resp['grade_code'],
+        'participe_surveillance': resp['participe_surveillance'] == 1,
+        'nbre_jours_absents': resp['nbre_jours_absents'],
+        'nbre_creneaux_absents': resp['nbre_creneaux_absents'],
+        'nbre_total_jours_responsable': resp['nbre_total_jours_responsable'],
+        'nbre_total_creneaux_responsable': resp['nbre_total_creneaux_responsable'],
+        'dates_absentes': resp['dates_absentes'].split(',') if resp['dates_absentes'] else [],
+        'taux_presence_jours': round(
+            ((resp['nbre_total_jours_responsable'] - resp['nbre_jours_absents']) / resp['nbre_total_jours_responsable'] * 100)
+            if resp['nbre_total_jours_responsable'] > 0 else 0, 2
+        ),
+        'taux_presence_creneaux': round(
+            ((resp['nbre_total_creneaux_responsable'] - resp['nbre_creneaux_absents']) / resp['nbre_total_creneaux_responsable'] * 100)
+            if resp['nbre_total_creneaux_responsable'] > 0 else 0, 2
+        )
+    }
+
+
 @presence_bp.route('/', methods=['GET'])
 def get_all_presences():
     """
@@ -12,6 +40,8 @@ def get_all_presences():
     Query Parameters:
     - session_id (optionnel): Filtrer par session
     - participe_surveillance (optionnel): Filtrer par participation (0 ou 1)
+    - limit, after, fields, format : pagination / projection / flux
+      (voir utils/list_query.py ; les statistiques portent sur tout le filtre)
     """
     try:
         db = get_db()
@@ -38,64 +68,51 @@ def get_all_presences():
                 r.dates_absentes
             FROM responsable_absent_jour_examen r
             LEFT JOIN session s ON r.id_session = s.id_session
-            WHERE 1=1
         '''
         
+        conditions = []
         params = []
         
         # Appliquer les filtres
         if session_id is not None:
-            query += ' AND r.id_session = ?'
+            conditions.append('r.id_session = ?')
             params.append(session_id)
         
         if participe_surveillance is not None:
-            query += ' AND r.participe_surveillance = ?'
+            conditions.append('r.participe_surveillance = ?')
             params.append(participe_surveillance)
         
-        query += ' ORDER BY r.id_session, r.nom, r.prenom'
-        
-        # Exécuter la requête
-        responsables = db.execute(query, params).fetchall()
+        def envelope(results):
+            # Statistiques globales (sur l'ensemble du filtre, pas seulement la page)
+            where = (' WHERE ' + ' AND '.join(conditions)) if conditions else ''
+            totaux = db.execute(f'''
+                SELECT COUNT(*) AS nb,
+                       COALESCE(SUM(r.nbre_jours_absents), 0) AS jours,
+                       COALESCE(SUM(r.nbre_creneaux_absents), 0) AS creneaux
+                FROM responsable_absent_jour_examen r{where}
+            ''', params).fetchone()
+            return {
+                'count': len(results),
+                'statistiques': {
+                    'total_responsables_absents': totaux['nb'],
+                    'total_jours_absents': totaux['jours'],
+                    'total_creneaux_absents': totaux['creneaux'],
+                },
+                'data': results
+            }
         
-        # Formater les résultats
-        results = []
-        for resp in responsables:
-            results.append({
-                'id': resp['id'],
-                'id_session': resp['id_session'],
-                'libelle_session': resp['libelle_session'],
-                'code_smartex_ens': resp['code_smartex_ens'],
-                'nom': resp['nom'],
-                'prenom': resp['prenom'],
-                'grade_code': resp['grade_code'],
-                'participe_surveillance': resp['participe_surveillance'] == 1,
-                'nbre_jours_absents': resp['nbre_jours_absents'],
-                'nbre_creneaux_absents': resp['nbre_creneaux_absents'],
-                'nbre_total_jours_responsable': resp['nbre_total_jours_responsable'],
-                'nbre_total_creneaux_responsable': resp['nbre_total_creneaux_responsable'],
-                'dates_absentes': resp['dates_absentes'].split(',') if resp['dates_absentes'] else [],
-                'taux_presence_jours': round(
-                    ((resp['nbre_total_jours_responsable'] - resp['nbre_jours_absents']) / resp['nbre_total_jours_responsable'] * 100)
-                    if resp['nbre_total_jours_responsable'] > 0 else 0, 2
-                ),
-                'taux_presence_creneaux': round(
-                    ((resp['nbre_total_creneaux_responsable'] - resp['nbre_creneaux_absents']) / resp['nbre_total_creneaux_responsable'] * 100)
-                    if resp['nbre_total_creneaux_responsable'] > 0 else 0, 2
-                )
-            })
-        
-        # Statistiques globales
-        statistiques = {
-            'total_responsables_absents': len(results),
-            'total_jours_absents': sum(r['nbre_jours_absents'] for r in results),
-            'total_creneaux_absents': sum(r['nbre_creneaux_absents'] for r in results),
-        }
-        
-        return jsonify({
-            'count': len(results),
-            'statistiques': statistiques,
-            'data': results
-        }), 200
+        sort_keys = [
+            ('r.id_session', 'id_session'),
+            ('r.nom', 'nom'),
+            ('r.prenom', 'prenom'),
+            ('r.id', 'id'),
+        ]
+        return list_response(
+            db, query, conditions, params, sort_keys,
+            transform=_format_presence,
+            extra_fields=('taux_presence_jours', 'taux_presence_creneaux'),
+            envelope=envelope
+        )
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,6 +1,14 @@
+import gzip
 import sqlite3
-from flask import Blueprint, jsonify, request
+from datetime import datetime
+from flask import Blueprint, current_app, jsonify, request
+from config import Config
 from database.database import get_db
+from routes.optimize_routes import session_workload
+from routes.statistics_routes import build_session_statistics
+from utils.columnar import encode_table, row_index
+from utils.columnar_export import dataset_entries, resolve_format
+from utils.zip_stream import zip_response
 
 session_bp = Blueprint('sessions', __name__)
 
@@ -308,53 +316,241 @@ def check_session_data(id_session):
         if session is None:
             return jsonify({'error': 'Session non trouvée'}), 404
         
-        # Vérifier s'il y a des enseignants (participants)
-        cursor = db.execute('''
-            SELECT COUNT(*) as count 
-            FROM enseignant 
-            WHERE participe_surveillance = 1
-        ''')
-        enseignants_count = cursor.fetchone()['count']
-        has_enseignants = enseignants_count > 0
-        
-        # Vérifier s'il y a des vœux pour cette session
-        cursor = db.execute('''
-            SELECT COUNT(*) as count 
-            FROM voeu 
-            WHERE id_session = ?
-        ''', (id_session,))
-        voeux_count = cursor.fetchone()['count']
-        has_voeux = voeux_count > 0
-        
-        # Vérifier s'il y a des créneaux pour cette session
-        cursor = db.execute('''
-            SELECT COUNT(*) as count 
-            FROM creneau 
-            WHERE id_session = ?
-        ''', (id_session,))
-        creneaux_count = cursor.fetchone()['count']
-        has_creneaux = creneaux_count > 0
+        return jsonify(_session_data_check(db, session)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def _session_data_check(db, session):
+    """Présence des enseignants, vœux et créneaux nécessaires à une session"""
+    id_session = session['id_session']
+    
+    # Vérifier s'il y a des enseignants (participants)
+    cursor = db.execute('''
+        SELECT COUNT(*) as count 
+        FROM enseignant 
+        WHERE participe_surveillance = 1
+    ''')
+    enseignants_count = cursor.fetchone()['count']
+    has_enseignants = enseignants_count > 0
+    
+    # Vérifier s'il y a des vœux pour cette session
+    cursor = db.execute('''
+        SELECT COUNT(*) as count 
+        FROM voeu 
+        WHERE id_session = ?
+    ''', (id_session,))
+    voeux_count = cursor.fetchone()['count']
+    has_voeux = voeux_count > 0
+    
+    # Vérifier s'il y a des créneaux pour cette session
+    cursor = db.execute('''
+        SELECT COUNT(*) as count 
+        FROM creneau 
+        WHERE id_session = ?
+    ''', (id_session,))
+    creneaux_count = cursor.fetchone()['count']
+    has_creneaux = creneaux_count > 0
+    
+    # Déterminer si toutes les données sont présentes
+    all_data_present = has_enseignants and has_voeux and has_creneaux
+    
+    return {
+        'id_session': id_session,
+        'libelle_session': session['libelle_session'],
+        'has_enseignants': has_enseignants,
+        'has_voeux': has_voeux,
+        'has_creneaux': has_creneaux,
+        'all_data_present': all_data_present,
+        'status': 'yes' if all_data_present else 'no',
+        'details': {
+            'enseignants_count': enseignants_count,
+            'voeux_count': voeux_count,
+            'creneaux_count': creneaux_count
+        }
+    }
+
+
+# ============================================================================
+# BUNDLE (tableau de bord en une requête)
+# ============================================================================
+
+@session_bp.route('/<int:id_session>/bundle', methods=['GET'])
+def get_session_bundle(id_session):
+    """
+    GET /api/sessions/<id>/bundle - Toutes les données du tableau de bord d'une session
+    
+    Regroupe en une seule lecture cohérente (une transaction, donc un seul
+    instantané de la base) :
+    - session et check-data
+    - enseignants, créneaux, vœux et affectations en colonnes
+      (voir utils/columnar.py : l'enseignant n'est transmis qu'une fois,
+      vœux / créneaux / affectations le référencent par son indice)
+    - statistiques (/api/statistics/session/<id>)
+    - charge des enseignants (/api/optimize/workload/<id>)
+    
+    Query Parameters:
+    - gzip (optionnel, défaut 1): compresser la réponse si le client
+      accepte gzip (Accept-Encoding), 0 pour désactiver
+    """
+    db = get_db()
+    started = not db.in_transaction
+    try:
+        if started:
+            # Verrou de lecture tenu jusqu'à la fin : aucune écriture
+            # ne peut s'intercaler entre les requêtes
+            db.execute('BEGIN')
         
-        # Déterminer si toutes les données sont présentes
-        all_data_present = has_enseignants and has_voeux and has_creneaux
+        session = db.execute(
+            'SELECT * FROM session WHERE id_session = ?', (id_session,)
+        ).fetchone()
+        if session is None:
+            return jsonify({'error': 'Session non trouvée'}), 404
         
-        return jsonify({
-            'id_session': id_session,
-            'libelle_session': session['libelle_session'],
-            'has_enseignants': has_enseignants,
-            'has_voeux': has_voeux,
-            'has_creneaux': has_creneaux,
-            'all_data_present': all_data_present,
-            'status': 'yes' if all_data_present else 'no',
-            'details': {
-                'enseignants_count': enseignants_count,
-                'voeux_count': voeux_count,
-                'creneaux_count': creneaux_count
-            }
-        }), 200
+        bundle = _build_session_bundle(db, session)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        if started and db.in_transaction:
+            db.commit()
+    
+    body = current_app.json.dumps(bundle).encode('utf-8')
+    response = current_app.response_class(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if request.args.get('gzip', '1') != '0' and request.accept_encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.content_encoding = 'gzip'
+    return response
 
 
+def _build_session_bundle(db, session):
+    """Assembler le contenu du bundle (lectures seules)"""
+    id_session = session['id_session']
+    
+    enseignants = db.execute('''
+        SELECT e.*, g.quota
+        FROM enseignant e
+        LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
+        ORDER BY e.nom_ens, e.prenom_ens, e.code_smartex_ens
+    ''').fetchall()
+    creneaux = db.execute('''
+        SELECT c.*, COALESCE(agg.nb_surveillants, 0) AS nb_surveillants
+        FROM creneau c
+        LEFT JOIN agg_surveillants_creneau agg ON agg.creneau_id = c.creneau_id
+        WHERE c.id_session = ?
+        ORDER BY c.dateExam, c.h_debut, c.creneau_id
+    ''', (id_session,)).fetchall()
+    voeux = db.execute('''
+        SELECT * FROM voeu
+        WHERE id_session = ?
+        ORDER BY jour, seance, voeu_id
+    ''', (id_session,)).fetchall()
+    affectations = db.execute('''
+        SELECT a.*
+        FROM affectation a
+        JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+        JOIN creneau c ON a.creneau_id = c.creneau_id
+        WHERE a.id_session = ?
+        ORDER BY c.dateExam, c.h_debut, e.nom_ens, a.affectation_id
+    ''', (id_session,)).fetchall()
+    
+    ref_enseignant = ('enseignants', row_index(enseignants, 'code_smartex_ens'))
+    ref_creneau = ('creneaux', row_index(creneaux, 'creneau_id'))
+    
+    workload, workload_summary = session_workload(db, id_session)
+    
+    return {
+        'encoding': 'columnar-v1',
+        'session': dict(session),
+        'check_data': _session_data_check(db, session),
+        'tables': {
+            'enseignants': encode_table(
+                enseignants,
+                ['code_smartex_ens', 'nom_ens', 'prenom_ens', 'email_ens',
+                 'grade_code_ens', 'participe_surveillance', 'quota'],
+                dictionary=['grade_code_ens']
+            ),
+            'creneaux': encode_table(
+                creneaux,
+                ['creneau_id', 'dateExam', 'h_debut', 'h_fin', 'type_ex',
+                 'semestre', 'enseignant', 'cod_salle', 'nb_surveillants'],
+                dictionary=['dateExam', 'h_debut', 'h_fin', 'type_ex', 'semestre', 'cod_salle'],
+                references={'enseignant': ref_enseignant}
+            ),
+            'voeux': encode_table(
+                voeux,
+                ['voeu_id', 'code_smartex_ens', 'jour', 'seance'],
+                dictionary=['seance'],
+                references={'code_smartex_ens': ref_enseignant}
+            ),
+            # Date et horaires : ceux du créneau référencé
+            'affectations': encode_table(
+                affectations,
+                ['affectation_id', 'code_smartex_ens', 'creneau_id', 'jour',
+                 'seance', 'cod_salle', 'position'],
+                dictionary=['seance', 'cod_salle', 'position'],
+                references={'code_smartex_ens': ref_enseignant, 'creneau_id': ref_creneau}
+            ),
+            'workload': encode_table(
+                workload,
+                ['code_smartex_ens', 'affectations', 'percentage'],
+                references={'code_smartex_ens': ref_enseignant}
+            ),
+        },
+        'workload_summary': workload_summary,
+        'statistics': build_session_statistics(db, session),
+    }
+
 
+# ============================================================================
+# EXPORT COLONNAIRE (analyse historique)
+# ============================================================================
 
+@session_bp.route('/export/columnar', methods=['GET'])
+def export_sessions_columnar():
+    """
+    GET /api/sessions/export/columnar - Archive ZIP des tables de plusieurs sessions
+    
+    Une table par fichier (session, affectation, creneau, voeu,
+    quota_enseignant, enseignant), colonnes texte encodées par dictionnaire,
+    plus dataset.json. Voir utils/columnar_export.py (load_table) pour la
+    relecture.
+    
+    Query Parameters:
+    - sessions (optionnel): identifiants séparés par des virgules (défaut : toutes)
+    - format (optionnel, défaut auto): auto, parquet, arrow ou npz
+    """
+    try:
+        fmt = resolve_format(request.args.get('format', 'auto'))
+        sessions = [int(s) for s in request.args.get('sessions', '').split(',') if s.strip()]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    db = get_db()
+    if sessions:
+        placeholders = ', '.join('?' for _ in sessions)
+        found = {row[0] for row in db.execute(
+            f'SELECT id_session FROM session WHERE id_session IN ({placeholders})', sessions
+        ).fetchall()}
+        missing = [s for s in sessions if s not in found]
+        if missing:
+            return jsonify({'error': f"Sessions non trouvées : {', '.join(map(str, missing))}"}), 404
+    else:
+        sessions = [row[0] for row in db.execute(
+            'SELECT id_session FROM session ORDER BY id_session'
+        ).fetchall()]
+        if not sessions:
+            return jsonify({'error': 'Aucune session à exporter'}), 404
+    
+    # Toutes les tables sont lues dans une seule transaction de lecture,
+    # terminée avant l'envoi : un téléchargement lent ne bloque pas les écritures
+    conn = sqlite3.connect(Config.DB_NAME)
+    try:
+        conn.execute('BEGIN')
+        entries = dataset_entries(conn, sessions, fmt, folder='sessions')
+        conn.execute('COMMIT')
+    finally:
+        conn.close()
+    
+    name = f"sessions_{fmt}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    return zip_response(entries, name)
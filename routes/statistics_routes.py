@@ -2,7 +2,14 @@ import sqlite3
 from flask import Blueprint, jsonify, request
 from database.database import get_db
 import pandas as pd
-from collections import defaultdict
+from utils.statistics_engine import (
+    load_session_affectations,
+    voeux_matches,
+    charges_enseignants,
+    charges_par_grade,
+    couverture_salles,
+    dispersion_journaliere
+)
 
 statistics_bp = Blueprint('statistics', __name__)
 
@@ -27,33 +34,44 @@ def get_session_statistics(id_session):
         if session is None:
             return jsonify({'error': 'Session non trouvée'}), 404
         
-        # Vérifier si des affectations existent
-        has_affectations = db.execute(
-            'SELECT COUNT(*) as count FROM affectation WHERE id_session = ?',
-            (id_session,)
-        ).fetchone()['count'] > 0
-        
-        # Statistiques de base
-        base_stats = _get_base_statistics(db, id_session)
-        
-        # Statistiques d'optimisation (seulement si affectations existent)
-        optimization_stats = None
-        if has_affectations:
-            optimization_stats = _get_optimization_statistics(db, id_session)
-        
-        response = {
-            'session': dict(session),
-            'has_affectations': has_affectations,
-            'base_statistics': base_stats,
-            'optimization_statistics': optimization_stats
-        }
-        
-        return jsonify(response), 200
+        return jsonify(build_session_statistics(db, session)), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def build_session_statistics(db, session):
+    """
+    Statistiques complètes d'une session (réponse de GET /session/<id>)
+    
+    Args:
+        db: connexion SQLite
+        session: ligne de la table session
+    """
+    id_session = session['id_session']
+    
+    # Vérifier si des affectations existent
+    has_affectations = db.execute(
+        'SELECT COUNT(*) as count FROM affectation WHERE id_session = ?',
+        (id_session,)
+    ).fetchone()['count'] > 0
+    
+    # Statistiques de base
+    base_stats = _get_base_statistics(db, id_session)
+    
+    # Statistiques d'optimisation (seulement si affectations existent)
+    optimization_stats = None
+    if has_affectations:
+        optimization_stats = _get_optimization_statistics(db, id_session)
+    
+    return {
+        'session': dict(session),
+        'has_affectations': has_affectations,
+        'base_statistics': base_stats,
+        'optimization_statistics': optimization_stats
+    }
+
+
 def _get_base_statistics(db, id_session):
     """Calculer les statistiques de base de la session"""
     
@@ -157,27 +175,10 @@ def _get_optimization_statistics(db, id_session):
     """Calculer les statistiques d'optimisation basées sur les affectations"""
     
     # Charger les affectations
-    affectations = db.execute('''
-        SELECT 
-            a.*,
-            e.nom_ens,
-            e.prenom_ens,
-            e.grade_code_ens,
-            c.dateExam,
-            c.h_debut,
-            c.h_fin,
-            c.cod_salle
-        FROM affectation a
-        JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
-        JOIN creneau c ON a.creneau_id = c.creneau_id
-        WHERE a.id_session = ?
-    ''', (id_session,)).fetchall()
-    
-    if not affectations:
+    aff_df = load_session_affectations(db, id_session)
+    if aff_df.empty:
         return None
     
-    aff_df = pd.DataFrame([dict(row) for row in affectations])
-    
     # 1. Respect des voeux
     voeux_stats = _analyze_voeux_respect(db, id_session, aff_df)
     
@@ -236,37 +237,27 @@ def _analyze_voeux_respect(db, id_session, aff_df):
         }
     
     total_voeux = len(voeux)
-    voeux_respectes = 0
-    voeux_violes_list = []
-    
-    for voeu in voeux:
-        code = voeu['code_smartex_ens']
-        jour = voeu['jour']
-        seance = voeu['seance']
-        
-        # Vérifier si l'enseignant est affecté à ce créneau
-        matching = aff_df[
-            (aff_df['code_smartex_ens'] == code) &
-            (aff_df['jour'] == jour) &
-            (aff_df['seance'] == seance)
-        ]
-        
-        if len(matching) == 0:
-            voeux_respectes += 1
-        else:
-            voeux_violes_list.append({
-                'code_enseignant': int(code),
-                'jour': int(jour),
-                'seance': str(seance),
-                'nb_affectations': int(len(matching))
-            })
+    voeux_df = pd.DataFrame([dict(v) for v in voeux])
+    matches = voeux_matches(aff_df, voeux_df)
+    violes = matches[matches['nb'] > 0]
+    voeux_respectes = total_voeux - len(violes)
+    
+    voeux_violes_list = [
+        {
+            'code_enseignant': int(v.code_smartex_ens),
+            'jour': int(v.jour),
+            'seance': str(v.seance),
+            'nb_affectations': int(v.nb)
+        }
+        for v in violes.head(10).itertuples(index=False)
+    ]
     
     taux = (voeux_respectes / total_voeux * 100) if total_voeux > 0 else 100.0
     
     return {
         'total_voeux': int(total_voeux),
         'voeux_respectes': int(voeux_respectes),
-        'voeux_violes': int(len(voeux_violes_list)),
+        'voeux_violes': int(len(violes)),
         'taux_respect': round(taux, 2),
         'details_violations': voeux_violes_list[:10]  # Limiter à 10 pour l'API
     }
@@ -282,38 +273,28 @@ def _analyze_grade_equity(db, id_session, aff_df):
         WHERE participe_surveillance = 1
     ''').fetchall()
     
-    teachers_by_grade = defaultdict(list)
-    for ens in enseignants:
-        teachers_by_grade[ens['grade_code_ens']].append(ens['code_smartex_ens'])
+    enseignants_df = pd.DataFrame([dict(e) for e in enseignants],
+                                  columns=['code_smartex_ens', 'grade_code_ens'])
+    par_grade = charges_par_grade(charges_enseignants(aff_df, enseignants_df))
     
     equite_par_grade = {}
+    total_grades = len(par_grade)
     grades_equitables = 0
-    total_grades = len(teachers_by_grade)
     
-    for grade, tcodes in teachers_by_grade.items():
-        charges = []
-        for tcode in tcodes:
-            count = len(aff_df[aff_df['code_smartex_ens'] == tcode])
-            charges.append(count)
+    for grade, row in par_grade.to_dict('index').items():
+        ecart = int(row['max'] - row['min'])
+        equitable = (ecart == 0)
+        if equitable:
+            grades_equitables += 1
         
-        if charges:
-            min_charge = int(min(charges))
-            max_charge = int(max(charges))
-            ecart = int(max_charge - min_charge)
-            moyenne = float(sum(charges) / len(charges))
-
-            equitable = (ecart == 0)
-            if equitable:
-                grades_equitables += 1
-            
-            equite_par_grade[grade] = {
-                'nb_enseignants': int(len(tcodes)),
-                'charge_min': min_charge,
-                'charge_max': max_charge,
-                'charge_moyenne': round(moyenne, 2),
-                'ecart': ecart,
-                'equitable': bool(equitable)
-            }
+        equite_par_grade[grade] = {
+            'nb_enseignants': int(row['nb_enseignants']),
+            'charge_min': int(row['min']),
+            'charge_max': int(row['max']),
+            'charge_moyenne': round(float(row['moyenne']), 2),
+            'ecart': ecart,
+            'equitable': bool(equitable)
+        }
     
     taux_equite = (grades_equitables / total_grades * 100) if total_grades > 0 else 100.0
     
@@ -329,41 +310,24 @@ def _analyze_coverage(db, id_session, aff_df):
     """Analyser la couverture des créneaux (minimum 2 surveillants par salle)"""
     
     # Compter les surveillants par créneau et salle
-    couverture = defaultdict(lambda: defaultdict(int))
-    
-    for _, row in aff_df.iterrows():
-        cid = row['creneau_id']
-        salle = row['cod_salle']
-        if pd.notna(salle):
-            couverture[cid][salle] += 1
-    
-    total_salles = 0
-    salles_bien_couvertes = 0  # >= 2 surveillants
-    salles_sous_couvertes = 0  # < 2 surveillants
-    salles_sur_couvertes = 0   # > 2 surveillants
-    
-    details_sous_couvertes = []
-    
-    for cid, salles_dict in couverture.items():
-        for salle, nb_surv in salles_dict.items():
-            total_salles += 1
-            
-            if nb_surv < 2:
-                salles_sous_couvertes += 1
-                # Récupérer info du créneau
-                creneau_info = aff_df[aff_df['creneau_id'] == cid].iloc[0]
-                details_sous_couvertes.append({
-                    'creneau_id': int(cid),
-                    'salle': str(salle),
-                    'date': str(creneau_info['dateExam']),
-                    'heure': str(creneau_info['h_debut']),
-                    'nb_surveillants': int(nb_surv)
-                })
-            elif nb_surv == 2:
-                salles_bien_couvertes += 1
-            else:
-                salles_sur_couvertes += 1
-                salles_bien_couvertes += 1
+    couverture = couverture_salles(aff_df)
+    nb_surv = couverture['nb_surveillants']
+    
+    total_salles = len(couverture)
+    salles_bien_couvertes = int((nb_surv >= 2).sum())  # >= 2 surveillants
+    salles_sous_couvertes = int((nb_surv < 2).sum())   # < 2 surveillants
+    salles_sur_couvertes = int((nb_surv > 2).sum())    # > 2 surveillants
+    
+    details_sous_couvertes = [
+        {
+            'creneau_id': int(row['creneau_id']),
+            'salle': str(row['cod_salle']),
+            'date': str(row['dateExam']),
+            'heure': str(row['h_debut']),
+            'nb_surveillants': int(row['nb_surveillants'])
+        }
+        for row in couverture[nb_surv < 2].head(10).to_dict('records')
+    ]
     
     taux = (salles_bien_couvertes / total_salles * 100) if total_salles > 0 else 100.0
     
@@ -421,26 +385,23 @@ def _analyze_teacher_load(db, id_session, aff_df):
         WHERE participe_surveillance = 1
     ''').fetchall()
     
-    charges = []
-    sans_affectation = 0
-    
-    charge_par_enseignant = []
+    enseignants_df = pd.DataFrame([dict(e) for e in enseignants],
+                                  columns=['code_smartex_ens', 'nom_ens', 'prenom_ens', 'grade_code_ens'])
+    charges_df = charges_enseignants(aff_df, enseignants_df)
+    charges = charges_df['nb_surveillances']
+    sans_affectation = int((charges == 0).sum())
     
-    for ens in enseignants:
-        code = ens['code_smartex_ens']
-        count = len(aff_df[aff_df['code_smartex_ens'] == code])
-        charges.append(count)
-        
-        if count == 0:
-            sans_affectation += 1
-        
-        charge_par_enseignant.append({
-            'code': int(code),
+    top = charges_df.sort_values('nb_surveillances', ascending=False, kind='stable').head(20)
+    charge_par_enseignant = [
+        {
+            'code': int(ens['code_smartex_ens']),
             'nom': str(ens['nom_ens']),
             'prenom': str(ens['prenom_ens']),
             'grade': str(ens['grade_code_ens']),
-            'nb_surveillances': int(count)
-        })
+            'nb_surveillances': int(ens['nb_surveillances'])
+        }
+        for ens in top.to_dict('records')
+    ]
     
     # Statistiques
     total_ens = len(enseignants)
@@ -450,57 +411,22 @@ def _analyze_teacher_load(db, id_session, aff_df):
         'total_enseignants': int(total_ens),
         'total_affectations': int(total_affectations),
         'enseignants_sans_affectation': int(sans_affectation),
-        'charge_min': int(min(charges)) if charges else 0,
-        'charge_max': int(max(charges)) if charges else 0,
-        'charge_moyenne': round(sum(charges) / len(charges), 2) if charges else 0,
-        'repartition': sorted(charge_par_enseignant, key=lambda x: x['nb_surveillances'], reverse=True)[:20]  # Top 20
+        'charge_min': int(charges.min()) if len(charges) else 0,
+        'charge_max': int(charges.max()) if len(charges) else 0,
+        'charge_moyenne': round(float(charges.mean()), 2) if len(charges) else 0,
+        'repartition': charge_par_enseignant  # Top 20
     }
 
 
 def _analyze_dispersion(aff_df):
     """Analyser la dispersion des surveillances dans la journée"""
     
-    profs_multi_seances = 0
-    seances_consecutives = 0
-    seances_espacees = 0
-    
-    for tcode in aff_df['code_smartex_ens'].unique():
-        prof_aff = aff_df[aff_df['code_smartex_ens'] == tcode]
-        
-        for jour in prof_aff['jour'].unique():
-            jour_aff = prof_aff[prof_aff['jour'] == jour]
-            
-            if len(jour_aff) <= 1:
-                continue
-            
-            profs_multi_seances += 1
-            
-            # Extraire les numéros de séances
-            seances = []
-            for _, row in jour_aff.iterrows():
-                seance_str = str(row['seance']).upper()
-                if seance_str.startswith('S'):
-                    try:
-                        seance_num = int(seance_str[1:])
-                        seances.append(seance_num)
-                    except:
-                        pass
-            
-            if len(seances) > 1:
-                seances_sorted = sorted(set(seances))
-                gaps = [seances_sorted[i+1] - seances_sorted[i] 
-                       for i in range(len(seances_sorted)-1)]
-                min_gap = min(gaps)
-                
-                if min_gap == 1:
-                    seances_consecutives += 1
-                else:
-                    seances_espacees += 1
+    dispersion = dispersion_journaliere(aff_df)
     
     return {
-        'enseignants_plusieurs_seances_par_jour': int(profs_multi_seances),
-        'seances_consecutives': int(seances_consecutives),
-        'seances_espacees': int(seances_espacees)
+        'enseignants_plusieurs_seances_par_jour': dispersion['total_multi'],
+        'seances_consecutives': dispersion['consecutives'],
+        'seances_espacees': dispersion['espacees']
     }
 
 
@@ -541,15 +467,21 @@ def _analyze_quotas(db, id_session, aff_df):
     # Statistiques par grade
     stats_par_grade = {}
     
-    for grade in quota_df['grade_code_ens'].unique():
-        grade_data = quota_df[quota_df['grade_code_ens'] == grade]
-        
+    moyennes = quota_df.groupby('grade_code_ens', sort=False).agg(
+        nb_enseignants=('code_smartex_ens', 'size'),
+        quota_moyen=('quota_grade', 'mean'),
+        realise_moyen=('quota_realise', 'mean'),
+        diff_grade_moyen=('diff_quota_grade', 'mean'),
+        diff_majoritaire_moyen=('diff_quota_majoritaire', 'mean')
+    )
+    
+    for grade, row in moyennes.to_dict('index').items():
         stats_par_grade[str(grade)] = {
-            'nb_enseignants': int(len(grade_data)),
-            'quota_moyen': round(float(grade_data['quota_grade'].mean()), 2),
-            'realise_moyen': round(float(grade_data['quota_realise'].mean()), 2),
-            'diff_grade_moyen': round(float(grade_data['diff_quota_grade'].mean()), 2),
-            'diff_majoritaire_moyen': round(float(grade_data['diff_quota_majoritaire'].mean()), 2)
+            'nb_enseignants': int(row['nb_enseignants']),
+            'quota_moyen': round(float(row['quota_moyen']), 2),
+            'realise_moyen': round(float(row['realise_moyen']), 2),
+            'diff_grade_moyen': round(float(row['diff_grade_moyen']), 2),
+            'diff_majoritaire_moyen': round(float(row['diff_majoritaire_moyen']), 2)
         }
     
     # Équilibre global
@@ -617,44 +549,37 @@ def get_all_sessions_statistics():
     try:
         db = get_db()
         
-        sessions = db.execute('SELECT * FROM session ORDER BY id_session').fetchall()
-        
-        sessions_stats = []
+        # Compteurs lus dans les agrégats (une seule requête pour toutes les sessions)
+        sessions = db.execute('''
+            SELECT s.*,
+                   COALESCE(cr.nb_creneaux, 0) as nb_creneaux,
+                   COALESCE(ag.nb_affectations, 0) as nb_affectations
+            FROM session s
+            LEFT JOIN (
+                SELECT id_session, COUNT(*) as nb_creneaux
+                FROM creneau
+                GROUP BY id_session
+            ) cr ON cr.id_session = s.id_session
+            LEFT JOIN (
+                SELECT id_session, SUM(nb_affectations) as nb_affectations
+                FROM agg_charge_enseignant
+                GROUP BY id_session
+            ) ag ON ag.id_session = s.id_session
+            ORDER BY s.id_session
+        ''').fetchall()
         
-        for session in sessions:
-            id_session = session['id_session']
-            
-            # Vérifier si des affectations existent
-            has_affectations = db.execute(
-                'SELECT COUNT(*) as count FROM affectation WHERE id_session = ?',
-                (id_session,)
-            ).fetchone()['count'] > 0
-            
-            # Compter les créneaux
-            nb_creneaux = db.execute(
-                'SELECT COUNT(*) as count FROM creneau WHERE id_session = ?',
-                (id_session,)
-            ).fetchone()['count']
-            
-            # Compter les affectations
-            nb_affectations = 0
-            score = None
-            
-            if has_affectations:
-                nb_affectations = db.execute(
-                    'SELECT COUNT(*) as count FROM affectation WHERE id_session = ?',
-                    (id_session,)
-                ).fetchone()['count']
-            
-            sessions_stats.append({
-                'id_session': id_session,
+        sessions_stats = [
+            {
+                'id_session': session['id_session'],
                 'libelle': session['libelle_session'],
                 'date_debut': session['date_debut'],
                 'date_fin': session['date_fin'],
-                'nb_creneaux': nb_creneaux,
-                'nb_affectations': nb_affectations,
-                'has_affectations': has_affectations
-            })
+                'nb_creneaux': session['nb_creneaux'],
+                'nb_affectations': session['nb_affectations'],
+                'has_affectations': session['nb_affectations'] > 0
+            }
+            for session in sessions
+        ]
         
         return jsonify({
             'total_sessions': len(sessions),
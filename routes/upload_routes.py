@@ -4,12 +4,15 @@ Upload et import des fichiers Excel/CSV vers la base de données
 """
 
 import sqlite3
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
 import pandas as pd
 import os
+import uuid
 from database.database import get_db
 from utils.time_utils import parse_time, determine_seance_from_time
+from utils.import_engine import import_file, map_creneau_columns
+from utils.import_jobs import create_job, run_job, submit_job, get_job, list_jobs
 import logging
 
 upload_bp = Blueprint('upload', __name__)
@@ -29,26 +32,6 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def read_file(filepath):
-    """Lire un fichier Excel ou CSV"""
-    file_ext = os.path.splitext(filepath)[1].lower()
-    
-    try:
-        if file_ext in ['.xlsx', '.xls']:
-            return pd.read_excel(filepath)
-        else:
-            # Essayer différents encodages pour CSV
-            try:
-                return pd.read_csv(filepath, encoding='utf-8')
-            except:
-                try:
-                    return pd.read_csv(filepath, encoding='latin1')
-                except:
-                    return pd.read_csv(filepath, sep=';')
-    except Exception as e:
-        logger.error(f"Erreur lecture fichier {filepath}: {str(e)}")
-        raise
-
 def generate_jour_seance_from_creneaux(session_id):
     """Remplit automatiquement les tables jour_seance et salle_par_creneau"""
     try:
@@ -149,10 +132,14 @@ def upload_file():
         - file: Le fichier (n'importe quel nom)
         - type: "enseignants" | "creneaux" | "voeux"
         - id_session: (optionnel, requis pour creneaux/voeux)
+        - force: "true" pour réimporter un fichier déjà importé (optionnel)
     
     Le fichier sera renommé automatiquement selon le type
     ET importé directement dans la base de données
 
+    Un fichier identique au dernier import du même type (même SHA-256)
+    n'est pas réimporté ; un fichier proche n'applique que ses lignes modifiées.
+
     Remarque: lors de l'import d'un fichier de créneaux, la session (
     `date_debut`/`date_fin`) sera automatiquement mise à jour pour
     couvrir la plage des dates `dateExam` dans le fichier.
@@ -173,6 +160,7 @@ def upload_file():
             return jsonify({'success': False, 'error': 'Type doit être: enseignants, creneaux ou voeux'}), 400
         
         id_session = request.form.get('id_session', type=int)
+        force = request.form.get('force', 'false').lower() == 'true'
         
         # Vérifier id_session pour créneaux/voeux
         if file_type in ['creneaux', 'voeux'] and not id_session:
@@ -199,11 +187,11 @@ def upload_file():
         import_result = None
         try:
             if file_type == 'enseignants':
-                import_result = import_enseignants_internal(filepath)
+                import_result = import_enseignants_internal(filepath, force=force)
             elif file_type == 'creneaux':
-                import_result = import_creneaux_internal(filepath, id_session)
+                import_result = import_creneaux_internal(filepath, id_session, force=force)
             elif file_type == 'voeux':
-                import_result = import_voeux_internal(filepath, id_session)
+                import_result = import_voeux_internal(filepath, id_session, force=force)
         except Exception as e:
             return jsonify({
                 'success': False,
@@ -228,6 +216,148 @@ def upload_file():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+MULTI_FILE_FIELDS = [
+    ('enseignants', 'enseignants_file'),
+    ('creneaux', 'creneaux_file'),
+    ('voeux', 'voeux_file')
+]
+
+
+def _save_multiple_files(id_session, results, suffix=''):
+    """
+    Sauvegarder les fichiers d'un formulaire multi-fichiers
+
+    Les fichiers créneaux/vœux sans id_session sont refusés dans
+    results['import'] sans être sauvegardés. `suffix` permet à des jobs
+    en tâche de fond simultanés de ne pas écraser leurs fichiers.
+
+    Returns:
+        dict: {file_type: {'original', 'filepath'}} des fichiers à importer
+    """
+    files = {}
+    for file_type, field in MULTI_FILE_FIELDS:
+        if field not in request.files:
+            continue
+        file = request.files[field]
+        if file.filename == '' or not allowed_file(file.filename):
+            continue
+        if file_type != 'enseignants' and not id_session:
+            label = 'créneaux' if file_type == 'creneaux' else 'vœux'
+            results['import'][file_type] = {
+                'status': 'erreur',
+                'message': f'id_session requis pour import {label}'
+            }
+            continue
+        try:
+            file_ext = os.path.splitext(file.filename)[1]
+            new_filename = f"{file_type}{suffix}{file_ext}"
+            filepath = os.path.join(UPLOAD_FOLDER, new_filename)
+            file.save(filepath)
+
+            results['upload'][file_type] = {
+                'original': file.filename,
+                'saved_as': new_filename,
+                'status': 'success'
+            }
+            files[file_type] = {'original': file.filename, 'filepath': filepath}
+        except Exception as e:
+            results['upload'][file_type] = {'status': 'error', 'message': str(e)}
+            results['import'][file_type] = {'status': 'erreur', 'message': str(e)}
+    return files
+
+
+def _build_import_stages(files, id_session, force=False):
+    """
+    Étapes d'import dans l'ordre des dépendances :
+    enseignants, puis créneaux et vœux en parallèle
+    """
+    importers = {
+        'enseignants': lambda path: lambda progress: import_enseignants_internal(
+            path, progress=progress, force=force),
+        'creneaux': lambda path: lambda progress: import_creneaux_internal(
+            path, id_session, progress=progress, force=force),
+        'voeux': lambda path: lambda progress: import_voeux_internal(
+            path, id_session, progress=progress, force=force)
+    }
+    stages = []
+    if 'enseignants' in files:
+        stages.append([('enseignants', importers['enseignants'](files['enseignants']['filepath']))])
+    dependants = [(t, importers[t](files[t]['filepath'])) for t in ('creneaux', 'voeux') if t in files]
+    if dependants:
+        stages.append(dependants)
+    return stages
+
+
+def _import_summary(file_type, state):
+    """Résumé d'import d'un fichier, au format historique des réponses"""
+    if state['status'] == 'erreur':
+        return {'status': 'erreur', 'message': state['message']}
+    summary = {
+        'status': 'succès',
+        'inserted': state['inserted'],
+        'errors': state['errors']
+    }
+    if file_type == 'enseignants':
+        summary['updated'] = state['updated']
+    elif file_type == 'creneaux':
+        summary['updated'] = state['updated']
+        summary['jour_seance_generated'] = state.get('jour_seance_generated', False)
+    summary['deja_importe'] = state.get('deja_importe', False)
+    summary['mode'] = state.get('mode', 'complet')
+    return summary
+
+
+def _upload_and_import_files(results, success_message=None):
+    """
+    Corps commun de /upload-multiple et /upload-and-import
+
+    Par défaut l'import est fait dans la requête. Avec background=true
+    (form-data ou query string), un job est lancé en tâche de fond et la
+    réponse 202 contient son identifiant, à suivre via GET /jobs/<job_id>.
+    """
+    id_session = request.form.get('id_session', type=int)
+    background = (request.form.get('background') or request.args.get('background', 'false')).lower() == 'true'
+    force = (request.form.get('force') or request.args.get('force', 'false')).lower() == 'true'
+
+    # Vérifier la session si fournie
+    if id_session:
+        db = get_db()
+        session = db.execute('SELECT * FROM session WHERE id_session = ?', (id_session,)).fetchone()
+        if not session:
+            return jsonify({'success': False, 'error': f'Session {id_session} non trouvée'}), 404
+
+    suffix = f"_{uuid.uuid4().hex[:8]}" if background else ''
+    files = _save_multiple_files(id_session, results, suffix)
+
+    if not results['upload']:
+        return jsonify({'success': False, 'error': 'Aucun fichier valide uploadé'}), 400
+
+    app = current_app._get_current_object()
+    job_id = create_job(id_session, files)
+    stages = _build_import_stages(files, id_session, force)
+
+    if background:
+        submit_job(app, job_id, stages)
+        return jsonify({
+            'success': True,
+            'message': 'Import lancé en tâche de fond',
+            'job_id': job_id,
+            'status_url': f'/api/upload/jobs/{job_id}',
+            'results': results
+        }), 202
+
+    job = run_job(app, job_id, stages)
+    for file_type, state in job['files'].items():
+        results['import'][file_type] = _import_summary(file_type, state)
+
+    return jsonify({
+        'success': True,
+        'message': success_message or f'Upload et import terminés: {len(results["upload"])} fichier(s)',
+        'job_id': job_id,
+        'results': results
+    }), 200
+
+
 @upload_bp.route('/upload-multiple', methods=['POST'])
 def upload_multiple_files():
     """
@@ -239,132 +369,19 @@ def upload_multiple_files():
         - creneaux_file: Fichier des créneaux (optionnel)
         - voeux_file: Fichier des vœux (optionnel)
         - id_session: ID de session (requis pour créneaux/voeux)
+        - background: "true" pour importer en tâche de fond (optionnel)
+        - force: "true" pour réimporter un fichier déjà importé (optionnel)
     
     Les fichiers seront renommés automatiquement
     ET importés directement dans la base de données
+    (enseignants d'abord, puis créneaux et vœux en parallèle)
     """
     try:
-        id_session = request.form.get('id_session', type=int)
-        
         results = {
             'upload': {},
             'import': {}
         }
-        
-        db = get_db()
-        
-        # Vérifier la session si fournie
-        if id_session:
-            session = db.execute('SELECT * FROM session WHERE id_session = ?', (id_session,)).fetchone()
-            if not session:
-                return jsonify({'success': False, 'error': f'Session {id_session} non trouvée'}), 404
-        
-        # ========== ENSEIGNANTS ==========
-        if 'enseignants_file' in request.files:
-            file = request.files['enseignants_file']
-            if file.filename != '' and allowed_file(file.filename):
-                try:
-                    file_ext = os.path.splitext(file.filename)[1]
-                    new_filename = f"enseignants{file_ext}"
-                    filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                    file.save(filepath)
-                    
-                    results['upload']['enseignants'] = {
-                        'original': file.filename,
-                        'saved_as': new_filename,
-                        'status': 'success'
-                    }
-                    
-                    # Import automatique
-                    import_result = import_enseignants_internal(filepath)
-                    results['import']['enseignants'] = {
-                        'status': 'succès',
-                        'inserted': import_result['inserted'],
-                        'updated': import_result['updated'],
-                        'errors': import_result['errors']
-                    }
-                    
-                except Exception as e:
-                    results['upload']['enseignants'] = {'status': 'error', 'message': str(e)}
-                    results['import']['enseignants'] = {'status': 'erreur', 'message': str(e)}
-        
-        # ========== CRÉNEAUX ==========
-        if 'creneaux_file' in request.files:
-            file = request.files['creneaux_file']
-            if file.filename != '' and allowed_file(file.filename):
-                if not id_session:
-                    results['import']['creneaux'] = {
-                        'status': 'erreur',
-                        'message': 'id_session requis pour import créneaux'
-                    }
-                else:
-                    try:
-                        file_ext = os.path.splitext(file.filename)[1]
-                        new_filename = f"creneaux{file_ext}"
-                        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                        file.save(filepath)
-                        
-                        results['upload']['creneaux'] = {
-                            'original': file.filename,
-                            'saved_as': new_filename,
-                            'status': 'success'
-                        }
-                        
-                        # Import automatique
-                        import_result = import_creneaux_internal(filepath, id_session)
-                        results['import']['creneaux'] = {
-                            'status': 'succès',
-                            'inserted': import_result['inserted'],
-                            'errors': import_result['errors'],
-                            'jour_seance_generated': import_result.get('jour_seance_generated', False)
-                        }
-                        
-                    except Exception as e:
-                        results['upload']['creneaux'] = {'status': 'error', 'message': str(e)}
-                        results['import']['creneaux'] = {'status': 'erreur', 'message': str(e)}
-        
-        # ========== VŒUX ==========
-        if 'voeux_file' in request.files:
-            file = request.files['voeux_file']
-            if file.filename != '' and allowed_file(file.filename):
-                if not id_session:
-                    results['import']['voeux'] = {
-                        'status': 'erreur',
-                        'message': 'id_session requis pour import vœux'
-                    }
-                else:
-                    try:
-                        file_ext = os.path.splitext(file.filename)[1]
-                        new_filename = f"voeux{file_ext}"
-                        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                        file.save(filepath)
-                        
-                        results['upload']['voeux'] = {
-                            'original': file.filename,
-                            'saved_as': new_filename,
-                            'status': 'success'
-                        }
-                        
-                        # Import automatique
-                        import_result = import_voeux_internal(filepath, id_session)
-                        results['import']['voeux'] = {
-                            'status': 'succès',
-                            'inserted': import_result['inserted'],
-                            'errors': import_result['errors']
-                        }
-                        
-                    except Exception as e:
-                        results['upload']['voeux'] = {'status': 'error', 'message': str(e)}
-                        results['import']['voeux'] = {'status': 'erreur', 'message': str(e)}
-        
-        if not results['upload']:
-            return jsonify({'success': False, 'error': 'Aucun fichier valide uploadé'}), 400
-        
-        return jsonify({
-            'success': True,
-            'message': f'Upload et import terminés: {len(results["upload"])} fichier(s)',
-            'results': results
-        }), 200
+        return _upload_and_import_files(results)
         
     except Exception as e:
         logger.error(f"Erreur upload multiple: {str(e)}")
@@ -382,12 +399,12 @@ def upload_and_import():
         - creneaux_file: Fichier des créneaux (optionnel)
         - voeux_file: Fichier des vœux (optionnel)
         - id_session: ID de session (requis pour créneaux/voeux)
+        - background: "true" pour importer en tâche de fond (optionnel)
+        - force: "true" pour réimporter un fichier déjà importé (optionnel)
     
     Upload + Renommage + Import automatique en base de données
     """
     try:
-        id_session = request.form.get('id_session', type=int)
-        
         results = {
             'upload': {},
             'import': {
@@ -396,130 +413,36 @@ def upload_and_import():
                 'voeux': {'status': 'non_demandé'}
             }
         }
-        
-        db = get_db()
-        
-        # Vérifier la session si fournie
-        if id_session:
-            session = db.execute('SELECT * FROM session WHERE id_session = ?', (id_session,)).fetchone()
-            if not session:
-                return jsonify({'success': False, 'error': f'Session {id_session} non trouvée'}), 404
-        
-        # ========== ENSEIGNANTS ==========
-        if 'enseignants_file' in request.files:
-            file = request.files['enseignants_file']
-            if file.filename != '' and allowed_file(file.filename):
-                try:
-                    # Upload
-                    file_ext = os.path.splitext(file.filename)[1]
-                    new_filename = f"enseignants{file_ext}"
-                    filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                    file.save(filepath)
-                    
-                    results['upload']['enseignants'] = {
-                        'original': file.filename,
-                        'saved_as': new_filename,
-                        'status': 'success'
-                    }
-                    
-                    # Import automatique
-                    import_result = import_enseignants_internal(filepath)
-                    results['import']['enseignants'] = {
-                        'status': 'succès',
-                        'inserted': import_result['inserted'],
-                        'updated': import_result['updated'],
-                        'errors': import_result['errors']
-                    }
-                    
-                except Exception as e:
-                    results['upload']['enseignants'] = {'status': 'error', 'message': str(e)}
-                    results['import']['enseignants'] = {'status': 'erreur', 'message': str(e)}
-        
-        # ========== CRÉNEAUX ==========
-        if 'creneaux_file' in request.files:
-            file = request.files['creneaux_file']
-            if file.filename != '' and allowed_file(file.filename):
-                if not id_session:
-                    results['import']['creneaux'] = {
-                        'status': 'erreur',
-                        'message': 'id_session requis pour import créneaux'
-                    }
-                else:
-                    try:
-                        # Upload
-                        file_ext = os.path.splitext(file.filename)[1]
-                        new_filename = f"creneaux{file_ext}"
-                        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                        file.save(filepath)
-                        
-                        results['upload']['creneaux'] = {
-                            'original': file.filename,
-                            'saved_as': new_filename,
-                            'status': 'success'
-                        }
-                        
-                        # Import automatique
-                        import_result = import_creneaux_internal(filepath, id_session)
-                        results['import']['creneaux'] = {
-                            'status': 'succès',
-                            'inserted': import_result['inserted'],
-                            'errors': import_result['errors'],
-                            'jour_seance_generated': import_result.get('jour_seance_generated', False)
-                        }
-                        
-                    except Exception as e:
-                        results['upload']['creneaux'] = {'status': 'error', 'message': str(e)}
-                        results['import']['creneaux'] = {'status': 'erreur', 'message': str(e)}
-        
-        # ========== VŒUX ==========
-        if 'voeux_file' in request.files:
-            file = request.files['voeux_file']
-            if file.filename != '' and allowed_file(file.filename):
-                if not id_session:
-                    results['import']['voeux'] = {
-                        'status': 'erreur',
-                        'message': 'id_session requis pour import vœux'
-                    }
-                else:
-                    try:
-                        # Upload
-                        file_ext = os.path.splitext(file.filename)[1]
-                        new_filename = f"voeux{file_ext}"
-                        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-                        file.save(filepath)
-                        
-                        results['upload']['voeux'] = {
-                            'original': file.filename,
-                            'saved_as': new_filename,
-                            'status': 'success'
-                        }
-                        
-                        # Import automatique
-                        import_result = import_voeux_internal(filepath, id_session)
-                        results['import']['voeux'] = {
-                            'status': 'succès',
-                            'inserted': import_result['inserted'],
-                            'errors': import_result['errors']
-                        }
-                        
-                    except Exception as e:
-                        results['upload']['voeux'] = {'status': 'error', 'message': str(e)}
-                        results['import']['voeux'] = {'status': 'erreur', 'message': str(e)}
-        
-        if not results['upload']:
-            return jsonify({'success': False, 'error': 'Aucun fichier valide uploadé'}), 400
-        
-        return jsonify({
-            'success': True,
-            'message': 'Upload et import terminés',
-            'results': results
-        }), 200
+        return _upload_and_import_files(results, 'Upload et import terminés')
         
     except Exception as e:
         logger.error(f"Erreur upload et import: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@upload_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_import_job(job_id):
+    """
+    GET /api/upload/jobs/<job_id>
+    État d'un job d'import : statut global et progression par fichier
+    (lignes traitées, insertions, mises à jour, erreurs)
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job non trouvé'}), 404
+    return jsonify({'success': True, 'job': job}), 200
+
+
+@upload_bp.route('/jobs', methods=['GET'])
+def list_import_jobs():
+    """
+    GET /api/upload/jobs
+    Liste des jobs d'import récents (du plus récent au plus ancien)
+    """
+    jobs = list_jobs()
+    return jsonify({'success': True, 'count': len(jobs), 'jobs': jobs}), 200
+
+
 # ============================================================================
 # IMPORT SEULEMENT (depuis fichiers déjà uploadés)
 # ============================================================================
@@ -529,7 +452,7 @@ def import_enseignants():
     """
     POST /api/upload/import/enseignants
     Importer les enseignants depuis un fichier déjà uploadé
-    Body: {"filepath": "uploads/enseignants.xlsx"}
+    Body: {"filepath": "uploads/enseignants.xlsx", "force": false}
     """
     try:
         data = request.get_json()
@@ -538,14 +461,16 @@ def import_enseignants():
         if not filepath or not os.path.exists(filepath):
             return jsonify({'success': False, 'error': 'Fichier non trouvé'}), 404
         
-        result = import_enseignants_internal(filepath)
+        result = import_enseignants_internal(filepath, force=bool(data.get('force')))
         
         return jsonify({
             'success': True,
             'message': 'Import terminé',
             'inserted': result['inserted'],
             'updated': result['updated'],
-            'errors': result['errors']
+            'errors': result['errors'],
+            'deja_importe': result['deja_importe'],
+            'mode': result['mode']
         }), 200
         
     except Exception as e:
@@ -560,7 +485,7 @@ def import_creneaux():
     Note: l'import des créneaux mettra à jour `date_debut`/`date_fin` de la
     session pour couvrir la plage de dates présentes dans le fichier.
     Importer les créneaux depuis un fichier déjà uploadé
-    Body: {"filepath": "uploads/creneaux.xlsx", "id_session": 1}
+    Body: {"filepath": "uploads/creneaux.xlsx", "id_session": 1, "force": false}
     """
     try:
         data = request.get_json()
@@ -579,14 +504,16 @@ def import_creneaux():
         if not session:
             return jsonify({'success': False, 'error': 'Session non trouvée'}), 404
         
-        result = import_creneaux_internal(filepath, id_session)
+        result = import_creneaux_internal(filepath, id_session, force=bool(data.get('force')))
         
         response = {
             'success': True,
             'message': 'Import terminé',
             'inserted': result['inserted'],
             'errors': result['errors'],
-            'jour_seance_generated': result.get('jour_seance_generated', False)
+            'jour_seance_generated': result.get('jour_seance_generated', False),
+            'deja_importe': result['deja_importe'],
+            'mode': result['mode']
         }
         # Inclure les informations de mise à jour des dates de session si disponibles
         if 'session_dates_updated' in result:
@@ -609,7 +536,7 @@ def import_voeux():
     """
     POST /api/upload/import/voeux
     Importer les vœux depuis un fichier déjà uploadé
-    Body: {"filepath": "uploads/voeux.xlsx", "id_session": 1}
+    Body: {"filepath": "uploads/voeux.xlsx", "id_session": 1, "force": false}
     """
     try:
         data = request.get_json()
@@ -628,13 +555,15 @@ def import_voeux():
         if not session:
             return jsonify({'success': False, 'error': 'Session non trouvée'}), 404
         
-        result = import_voeux_internal(filepath, id_session)
+        result = import_voeux_internal(filepath, id_session, force=bool(data.get('force')))
         
         return jsonify({
             'success': True,
             'message': 'Import terminé',
             'inserted': result['inserted'],
-            'errors': result['errors']
+            'errors': result['errors'],
+            'deja_importe': result['deja_importe'],
+            'mode': result['mode']
         }), 200
         
     except Exception as e:
@@ -677,105 +606,27 @@ def list_upload_files():
 # ============================================================================
 # FONCTIONS INTERNES (pas de routes Flask)
 # ============================================================================
-def import_enseignants_internal(filepath):
-    """Importer les enseignants depuis un fichier"""
-    # Lire le fichier
-    df = read_file(filepath)
-    
-    # Mapper les colonnes
-    col_mapping = {}
-    for col in df.columns:
-        col_lower = col.lower()
-        if 'nom' in col_lower and 'prenom' not in col_lower:
-            col_mapping[col] = 'nom_ens'
-        elif 'prenom' in col_lower or 'prénom' in col_lower:
-            col_mapping[col] = 'prenom_ens'
-        elif 'email' in col_lower or 'mail' in col_lower:
-            col_mapping[col] = 'email_ens'
-        elif 'grade' in col_lower:
-            col_mapping[col] = 'grade_code_ens'
-        elif 'code' in col_lower and ('smartex' in col_lower or 'ens' in col_lower):
-            col_mapping[col] = 'code_smartex_ens'
-        elif 'particip' in col_lower and 'surveill' in col_lower:
-            col_mapping[col] = 'participe_surveillance'
-    
-    df = df.rename(columns=col_mapping)
-    
-    # Vérifier les colonnes requises
-    required = ['nom_ens', 'prenom_ens', 'grade_code_ens', 'code_smartex_ens']
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        raise ValueError(f'Colonnes manquantes: {", ".join(missing)}')
-    
-    # Nettoyer les données
-    df['code_smartex_ens'] = df['code_smartex_ens'].apply(
-        lambda x: int(float(x)) if pd.notna(x) else None
-    )
-    
-    # Normaliser les grades (convertir en majuscules)
-    df['grade_code_ens'] = df['grade_code_ens'].apply(lambda x: str(x).strip().upper() if pd.notna(x) else None)
-    
-    # Mapper VA vers V (fusion des grades Vacataire Assistant avec Vacataire)
-    df['grade_code_ens'] = df['grade_code_ens'].apply(lambda x: 'V' if x == 'VA' else x)
-    
-    # Gérer participe_surveillance
-    if 'participe_surveillance' in df.columns:
-        df['participe_surveillance'] = df['participe_surveillance'].map({
-            'TRUE': 1, 'True': 1, 'true': 1, '1': 1, 1: 1, True: 1,
-            'FALSE': 0, 'False': 0, 'false': 0, '0': 0, 0: 0, False: 0
-        }).fillna(1)
-    else:
-        df['participe_surveillance'] = 1
-    
-    # Insérer dans la base de données
+def _dedup_info(result):
+    """Informations de déduplication renvoyées avec chaque import"""
+    return {
+        'deja_importe': result.get('deja_importe', False),
+        'mode': result.get('mode', 'complet'),
+        'lignes_inchangees': result.get('unchanged_rows', 0)
+    }
+
+def import_enseignants_internal(filepath, progress=None, force=False):
+    """Importer les enseignants depuis un fichier (lecture en flux + UPSERT en masse)"""
     db = get_db()
-    inserted = 0
-    updated = 0
-    errors = []
-    
-    for idx, row in df.iterrows():
-        try:
-            # Vérifier si l'enseignant existe déjà
-            existing = db.execute(
-                'SELECT code_smartex_ens FROM enseignant WHERE code_smartex_ens = ?',
-                (row['code_smartex_ens'],)
-            ).fetchone()
-            
-            if existing:
-                # UPDATE
-                db.execute('''
-                    UPDATE enseignant 
-                    SET nom_ens = ?, prenom_ens = ?, email_ens = ?,
-                        grade_code_ens = ?, participe_surveillance = ?
-                    WHERE code_smartex_ens = ?
-                ''', (row['nom_ens'], row['prenom_ens'], row.get('email_ens'),
-                      row['grade_code_ens'], row['participe_surveillance'],
-                      row['code_smartex_ens']))
-                updated += 1
-            else:
-                # INSERT
-                db.execute('''
-                    INSERT INTO enseignant 
-                    (code_smartex_ens, nom_ens, prenom_ens, email_ens, 
-                     grade_code_ens, participe_surveillance)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (row['code_smartex_ens'], row['nom_ens'], row['prenom_ens'],
-                      row.get('email_ens'), row['grade_code_ens'], 
-                      row['participe_surveillance']))
-                inserted += 1
-                
-        except Exception as e:
-            errors.append(f"Ligne {idx+1}: {str(e)}")
-            continue
-    
+    result = import_file(db, 'enseignants', filepath, progress=progress, force=force)
     db.commit()
     return {
-        'inserted': inserted,
-        'updated': updated,
-        'errors': errors
+        'inserted': result['inserted'],
+        'updated': result['updated'],
+        'errors': result['errors'],
+        **_dedup_info(result)
     }
 
-def import_creneaux_internal(filepath, id_session):
+def import_creneaux_internal(filepath, id_session, progress=None, force=False):
     """Importer les créneaux depuis un fichier
 
     Lors de l'import, la plage de dates de la session (date_debut / date_fin)
@@ -784,68 +635,28 @@ def import_creneaux_internal(filepath, id_session):
     Si la session possède déjà des dates, on conserve la plus petite date_debut
     et la plus grande date_fin afin que la session couvre toutes les dates existantes.
     """
-    # Lire le fichier
-    df = read_file(filepath)
-    
-    # Mapper les colonnes
-    col_mapping = {}
-    for col in df.columns:
-        col_lower = col.lower()
-        if 'date' in col_lower and 'exam' in col_lower:
-            col_mapping[col] = 'dateExam'
-        elif 'debut' in col_lower and 'h' in col_lower:
-            col_mapping[col] = 'h_debut'
-        elif 'fin' in col_lower and 'h' in col_lower:
-            col_mapping[col] = 'h_fin'
-        elif 'type' in col_lower and 'ex' in col_lower:
-            col_mapping[col] = 'type_ex'
-        elif 'semestre' in col_lower:
-            col_mapping[col] = 'semestre'
-        elif 'enseignant' in col_lower or 'responsable' in col_lower:
-            col_mapping[col] = 'enseignant'
-        elif 'salle' in col_lower or 'cod_salle' in col_lower:
-            col_mapping[col] = 'cod_salle'
-    
-    df = df.rename(columns=col_mapping)
-    
-    # Vérifier les colonnes requises
-    required = ['dateExam', 'h_debut', 'h_fin']
-    missing = [col for col in required if col not in df.columns]
-    if missing:
-        raise ValueError(f'Colonnes manquantes: {", ".join(missing)}')
-    
-    # Nettoyer l'enseignant responsable
-    if 'enseignant' in df.columns:
-        df['enseignant'] = df['enseignant'].apply(
-            lambda x: int(float(x)) if pd.notna(x) else None
-        )
-    
-    # Insérer dans la base de données
+    # Dates d'examen rencontrées pendant la lecture en flux, dans l'ordre du
+    # fichier : to_datetime déduit le format (jour/mois) de la première valeur
+    dates_exam = {}
+
+    def collect_dates(chunk):
+        chunk = map_creneau_columns(chunk)
+        if 'dateExam' in chunk.columns:
+            dates_exam.update(dict.fromkeys(chunk['dateExam'].dropna().astype(str).unique()))
+
+    # Lire le fichier par morceaux et insérer dans la base de données (un créneau
+    # déjà présent pour la même date, heure et salle est mis à jour au lieu d'être dupliqué)
     db = get_db()
-    inserted = 0
-    errors = []
-    
-    for idx, row in df.iterrows():
-        try:
-            # Normaliser les heures au format HH:MM
-            h_debut_normalized = parse_time(row['h_debut'])
-            h_fin_normalized = parse_time(row['h_fin'])
-            
-            db.execute('''
-                INSERT INTO creneau 
-                (id_session, dateExam, h_debut, h_fin, type_ex, 
-                 semestre, enseignant, cod_salle)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (id_session, row['dateExam'], h_debut_normalized, h_fin_normalized,
-                  row.get('type_ex'), row.get('semestre'), 
-                  row.get('enseignant'), row.get('cod_salle')))
-            inserted += 1
-            
-        except Exception as e:
-            errors.append(f"Ligne {idx+1}: {str(e)}")
-            continue
-    
+    result = import_file(db, 'creneaux', filepath, id_session=id_session,
+                         progress=progress, on_chunk=collect_dates, force=force)
     db.commit()
+    if result.get('deja_importe'):
+        # Fichier identique au dernier import : rien à recalculer
+        return {**result, **_dedup_info(result)}
+    inserted = result['inserted']
+    updated = result['updated']
+    errors = result['errors']
+    df = pd.DataFrame({'dateExam': list(dates_exam)})
 
     # Mettre à jour les dates de la session (date_debut / date_fin) en se basant sur les créneaux importés
     session_dates_updated = False
@@ -905,116 +716,25 @@ def import_creneaux_internal(filepath, id_session):
     jour_seance_generated = generate_jour_seance_from_creneaux(id_session)
     return {
         'inserted': inserted,
+        'updated': updated,
         'errors': errors,
         'jour_seance_generated': jour_seance_generated,
         'session_dates_updated': session_dates_updated,
         'old_date_debut': old_date_debut,
         'old_date_fin': old_date_fin,
         'new_date_debut': new_date_debut,
-        'new_date_fin': new_date_fin
+        'new_date_fin': new_date_fin,
+        **_dedup_info(result)
     }
 
-def import_voeux_internal(filepath, id_session):
-    """Importer les vœux depuis un fichier"""
-    # Lire le fichier
-    df = read_file(filepath)
-
-    # Mapper les colonnes pour accepter abréviation ou nom/prénom
-    col_mapping = {}
-    for col in df.columns:
-        col_lower = col.lower()
-        # Pour abréviation
-        if 'enseignant' in col_lower and 'uuid' not in col_lower:
-            col_mapping[col] = 'abbr_ens'
-        # Pour nom/prénom même si le nom contient un point
-        elif ('nom' in col_lower and 'prenom' not in col_lower) or ('.nom' in col_lower):
-            col_mapping[col] = 'nom_ens'
-        elif ('prenom' in col_lower or 'prénom' in col_lower) or ('.prenom' in col_lower or '.prénom' in col_lower):
-            col_mapping[col] = 'prenom_ens'
-        elif 'jour' in col_lower:
-            col_mapping[col] = 'jour'
-        elif 'seance' in col_lower or 'séance' in col_lower or 'séances' in col_lower:
-            col_mapping[col] = 'seance'
-    df = df.rename(columns=col_mapping)
-
+def import_voeux_internal(filepath, id_session, progress=None, force=False):
+    """Importer les vœux depuis un fichier (les vœux déjà présents sont ignorés)"""
     db = get_db()
-    enseignants = db.execute('SELECT code_smartex_ens, nom_ens, prenom_ens FROM enseignant').fetchall()
-    abbr_to_code = {}
-    nomprenom_to_code = {}
-    for e in enseignants:
-        if e['prenom_ens'] and e['nom_ens']:
-            abbr = f"{e['prenom_ens'][0]}.{e['nom_ens']}".upper()
-            abbr_to_code[abbr] = e['code_smartex_ens']
-            nomprenom_to_code[(e['nom_ens'].strip().lower(), e['prenom_ens'].strip().lower())] = e['code_smartex_ens']
-
-    jour_map = {
-        'lundi': 1,
-        'mardi': 2,
-        'mercredi': 3,
-        'jeudi': 4,
-        'vendredi': 5,
-        'samedi': 6
-    }
-
-    rows = []
-    for idx, row in df.iterrows():
-        code = None
-        # 1. Essayer abréviation si présente
-        abbr = str(row.get('abbr_ens', '')).strip().upper()
-        if abbr:
-            code = abbr_to_code.get(abbr)
-        # 2. Sinon, essayer nom/prénom si présents
-        if code is None and row.get('nom_ens') and row.get('prenom_ens'):
-            nom = str(row.get('nom_ens', '')).strip().lower()
-            prenom = str(row.get('prenom_ens', '')).strip().lower()
-            code = nomprenom_to_code.get((nom, prenom))
-        # Gérer le jour sous forme de nom ou de chiffre
-        jour_val = row.get('jour', '')
-        jour_num = None
-        if isinstance(jour_val, (int, float)) and not pd.isnull(jour_val):
-            jour_num = int(jour_val)
-        else:
-            jour_str = str(jour_val).strip().lower()
-            if jour_str.isdigit():
-                jour_num = int(jour_str)
-            else:
-                jour_num = jour_map.get(jour_str)
-        seances = row.get('seance', '')
-        if isinstance(seances, str):
-            seance_list = [s.strip() for s in seances.split(',') if s.strip()]
-        elif isinstance(seances, float) or isinstance(seances, int):
-            seance_list = [str(seances)]
-        else:
-            seance_list = []
-        for seance in seance_list:
-            rows.append({
-                'code_smartex_ens': code,
-                'jour': jour_num,
-                'seance': seance
-            })
-
-    rows = [r for r in rows if r['code_smartex_ens'] is not None and r['jour'] is not None and r['seance']]
-
-    inserted = 0
-    errors = []
-    for idx, r in enumerate(rows):
-        try:
-            existing = db.execute('''
-                SELECT voeu_id FROM voeu 
-                WHERE code_smartex_ens = ? AND id_session = ? 
-                  AND jour = ? AND seance = ?
-            ''', (r['code_smartex_ens'], id_session, r['jour'], r['seance'])).fetchone()
-            if not existing:
-                db.execute('''
-                    INSERT INTO voeu (code_smartex_ens, id_session, jour, seance)
-                    VALUES (?, ?, ?, ?)
-                ''', (r['code_smartex_ens'], id_session, r['jour'], r['seance']))
-                inserted += 1
-        except Exception as e:
-            errors.append(f"Ligne {idx+1}: {str(e)}")
-            continue
+    result = import_file(db, 'voeux', filepath, id_session=id_session,
+                         progress=progress, force=force)
     db.commit()
     return {
-        'inserted': inserted,
-        'errors': errors
-    }
\ No newline at end of file
+        'inserted': result['inserted'],
+        'errors': result['errors'],
+        **_dedup_info(result)
+    }
@@ -1,12 +1,18 @@
 import sqlite3
 from flask import Blueprint, jsonify, request
 from database.database import get_db
+from utils.list_query import list_response
 
 voeu_bp = Blueprint('voeux', __name__)
 
 @voeu_bp.route('', methods=['GET'])
 def get_all_voeux():
-    """GET /api/voeux - Récupérer tous les vœux"""
+    """
+    GET /api/voeux - Récupérer tous les vœux
+
+    Pagination / projection / flux : limit, after, fields, format
+    (voir utils/list_query.py)
+    """
     try:
         db = get_db()
         # Paramètres de filtrage optionnels
@@ -32,14 +38,12 @@ def get_all_voeux():
             conditions.append('v.id_session = ?')
             params.append(id_session)
         
-        if conditions:
-            query += ' WHERE ' + ' AND '.join(conditions)
-        
-        query += ' ORDER BY v.jour, v.seance'
-        
-        cursor = db.execute(query, params)
-        voeux = [dict(row) for row in cursor.fetchall()]
-        return jsonify(voeux), 200
+        sort_keys = [
+            ('v.jour', 'jour'),
+            ('v.seance', 'seance'),
+            ('v.voeu_id', 'voeu_id'),
+        ]
+        return list_response(db, query, conditions, params, sort_keys)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
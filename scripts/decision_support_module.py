@@ -13,15 +13,23 @@ Règles de répartition des surveillances :
 - Assistant contractuel (AC), PTC, PES : supérieur à Assistant (AS)
 - Différence minimale configurable (Expert = 3)
 
+Balayage de paramètres (sweep_parameters) : la session est chargée une
+seule fois et toute une grille (absence_margin × min_difference ×
+max_non_souhaits_ratio) est évaluée avec NumPy, avec le front de Pareto
+surveillances totales / écart des quotas / non-souhaits autorisés.
+
 Usage:
     from scripts.decision_support_module import DecisionSupportModule
     
     dsm = DecisionSupportModule(session_id=1)
     recommendations = dsm.generate_recommendations()
     dsm.save_recommendations(recommendations)
+    
+    sweep = dsm.sweep_parameters([0.0, 0.1, 0.15], [2, 3], [0.2, 0.3])
 """
 
 import sqlite3
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from database.database import get_db
@@ -476,6 +484,110 @@ class DecisionSupportModule:
             }
         }
     
+    def sweep_parameters(self, absence_margins: List[float],
+                         min_differences: List[int],
+                         max_non_souhaits_ratios: List[float]) -> Dict:
+        """
+        Évaluer une grille de paramètres en une passe (données chargées une fois)
+        
+        Pour chaque combinaison, les quotas par grade et les voeux maximum
+        autorisés sont ceux que donnerait generate_recommendations avec ces
+        paramètres (mêmes arrondis, même ajustement si la capacité est
+        insuffisante). Les non-souhaits autorisés d'un grade sont en plus
+        plafonnés à max_non_souhaits_ratio × nb_créneaux.
+        
+        Front de Pareto sur :
+        - surveillances_totales : surveillances prévues, marge pour absences
+          comprise (à maximiser : meilleure couverture des absences)
+        - quota_max : charge du grade le plus sollicité (à minimiser)
+        - ecart_quotas : quota max - quota min entre grades (à minimiser)
+        - non_souhaits_min : non-souhaits autorisés du grade le plus
+          contraint (à maximiser)
+        
+        Args:
+            absence_margins: marges pour absences (ex: [0.0, 0.1, 0.15])
+            min_differences: différences minimales entre niveaux
+            max_non_souhaits_ratios: ratios maximum de non-souhaits
+        
+        Returns:
+            Dictionnaire avec grades, table (une ligne par combinaison) et pareto
+        """
+        data = self.load_session_data()
+        enseignants_df = data['enseignants_df']
+        nb_creneaux = len(data['creneaux_df'])
+        surveillances_base = int(data['salles_creneau_df']['nb_surveillants'].sum())
+        
+        grade_counts = enseignants_df['grade_code_ens'].value_counts()
+        grades = sorted(grade_counts.index, key=lambda g: (self.GRADE_HIERARCHY.get(g, 3), g))
+        counts = grade_counts[grades].to_numpy(dtype=np.int64)                      # (g,)
+        levels = np.array([self.GRADE_HIERARCHY.get(g, 3) for g in grades], dtype=np.int64)
+        total_enseignants = counts.sum()
+        weighted_sum = (counts * (levels - 1)).sum()
+        
+        margins = np.asarray(absence_margins, dtype=float)[:, None, None]           # (m,1,1)
+        differences = np.asarray(min_differences, dtype=np.int64)[None, :, None]    # (1,d,1)
+        ratios = np.asarray(max_non_souhaits_ratios, dtype=float)
+        
+        # Mêmes formules que calculate_required_surveillances / calculate_quotas_by_grade
+        totales = np.ceil(surveillances_base * (1 + margins)).astype(np.int64)      # (m,1,1)
+        quota_base = np.maximum(1, np.floor((totales - differences * weighted_sum) / total_enseignants))
+        quotas = quota_base.astype(np.int64) + (levels - 1) * differences           # (m,d,g)
+        capacite = (quotas * counts).sum(axis=2, keepdims=True)
+        
+        # _adjust_quotas_for_capacity si la capacité est insuffisante
+        insuffisant = capacite < totales
+        factor = totales / np.where(insuffisant, capacite, 1)
+        quotas = np.where(insuffisant, np.ceil(quotas * factor).astype(np.int64), quotas)
+        capacite = (quotas * counts).sum(axis=2)                                    # (m,d)
+        
+        # calculate_max_voeux_allowance
+        max_voeux = nb_creneaux - quotas - np.ceil(quotas * 0.5).astype(np.int64)
+        max_voeux = np.minimum(max_voeux, np.maximum(math.floor(nb_creneaux * 0.5),
+                                                     nb_creneaux - quotas - 1))
+        plafonds = np.floor(ratios * nb_creneaux).astype(np.int64)                  # (r,)
+        non_souhaits = np.minimum(max_voeux[:, :, None, :], plafonds[None, None, :, None])
+        
+        # Une ligne par combinaison (m, d, r)
+        shape = non_souhaits.shape[:3]
+        im, id_, ir = (axis.ravel() for axis in np.indices(shape))
+        quotas_rows = quotas[im, id_]
+        table = pd.DataFrame({
+            'absence_margin': margins.ravel()[im],
+            'min_difference': differences.ravel()[id_],
+            'max_non_souhaits_ratio': ratios[ir],
+            'surveillances_totales': totales.ravel()[im],
+            'capacite_totale': capacite[im, id_],
+            'excedent': capacite[im, id_] - totales.ravel()[im],
+            'quota_min': quotas_rows.min(axis=1),
+            'quota_max': quotas_rows.max(axis=1),
+            'ecart_quotas': quotas_rows.max(axis=1) - quotas_rows.min(axis=1),
+            'non_souhaits_min': non_souhaits.reshape(-1, len(grades)).min(axis=1),
+        })
+        table['pareto'] = pareto_mask(
+            table[['quota_max', 'ecart_quotas']].to_numpy(),
+            table[['surveillances_totales', 'non_souhaits_min']].to_numpy()
+        )
+        
+        rows = table.to_dict('records')
+        for row, quota_row, allowance_row in zip(rows, quotas_rows,
+                                                 non_souhaits.reshape(-1, len(grades))):
+            row['quotas_by_grade'] = dict(zip(grades, quota_row.tolist()))
+            row['non_souhaits_by_grade'] = dict(zip(grades, allowance_row.tolist()))
+        
+        print(f"\n🧮 Balayage de {len(rows)} combinaisons de paramètres "
+              f"({int(table['pareto'].sum())} sur le front de Pareto)")
+        
+        return {
+            'session_id': self.session_id,
+            'surveillances_base': surveillances_base,
+            'nb_enseignants': int(total_enseignants),
+            'nb_creneaux': nb_creneaux,
+            'grades': {g: {'nb_enseignants': int(c), 'level': int(l)}
+                       for g, c, l in zip(grades, counts, levels)},
+            'table': rows,
+            'pareto': [row for row in rows if row['pareto']]
+        }
+    
     def save_recommendations(self, recommendations: Dict, 
                             update_grade_table: bool = True,
                             export_csv: bool = True) -> Dict[str, bool]:
@@ -559,6 +671,28 @@ class DecisionSupportModule:
 # FONCTIONS UTILITAIRES
 # =============================================================================
 
+def pareto_mask(minimize: np.ndarray, maximize: np.ndarray) -> np.ndarray:
+    """
+    Points non dominés (front de Pareto)
+    
+    Args:
+        minimize: tableau (n, k) des objectifs à minimiser
+        maximize: tableau (n, k') des objectifs à maximiser
+    
+    Returns:
+        Tableau booléen (n,) : True si aucun autre point n'est au moins aussi
+        bon sur tous les objectifs et meilleur sur l'un d'eux
+    """
+    points = np.hstack([minimize, -maximize]).astype(float)
+    # Comparaison deux à deux sur les points distincts (souvent bien moins nombreux)
+    unique, inverse = np.unique(points, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    at_least_as_good = (unique[:, None, :] <= unique[None, :, :]).all(axis=2)
+    strictly_better = (unique[:, None, :] < unique[None, :, :]).any(axis=2)
+    dominated = (at_least_as_good & strictly_better).any(axis=0)
+    return ~dominated[inverse]
+
+
 def generate_decision_support_report(session_id: int, 
                                      save: bool = True,
                                      export_csv: bool = True) -> Dict:
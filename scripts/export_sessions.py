@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Script d'export colonnaire des sessions (analyse historique)
+
+Usage :
+    python scripts/export_sessions.py [dossier] [sessions] [format]
+
+    dossier   dossier de sortie (défaut : results/export_sessions_<date>)
+    sessions  identifiants séparés par des virgules (défaut : toutes)
+    format    auto, parquet, arrow ou npz (défaut : auto)
+
+Voir utils/columnar_export.py pour le contenu et le chargement des fichiers.
+"""
+
+import sqlite3
+import sys
+import os
+from datetime import datetime
+
+# Ajouter le dossier parent au path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.columnar_export import write_dataset
+
+DB_NAME = 'surveillance.db'
+OUTPUT_FOLDER = 'results'
+
+
+def main():
+    """Point d'entrée principal"""
+    args = sys.argv[1:]
+    directory = args[0] if len(args) > 0 else os.path.join(
+        OUTPUT_FOLDER, f"export_sessions_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    sessions = [int(s) for s in args[1].split(',') if s.strip()] if len(args) > 1 else None
+    fmt = args[2] if len(args) > 2 else 'auto'
+
+    if not os.path.exists(DB_NAME):
+        print(f"\n❌ Base de données '{DB_NAME}' introuvable!")
+        return False
+
+    print("\n" + "="*60)
+    print("EXPORT COLONNAIRE DES SESSIONS")
+    print("="*60)
+
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        info = write_dataset(conn, directory, sessions, fmt)
+    except ValueError as e:
+        print(f"\n❌ {e}")
+        return False
+    finally:
+        conn.close()
+
+    print(f"   Format   : {info['format']}")
+    print(f"   Sessions : {', '.join(str(s) for s in info['sessions'])}")
+    for table, entry in info['tables'].items():
+        size = os.path.getsize(os.path.join(directory, entry['file']))
+        print(f"   {table:18s}: {entry['rows']:7d} lignes, {size / 1024:8.1f} Ko")
+    print(f"\n✅ Export écrit dans {directory}\n")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
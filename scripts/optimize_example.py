@@ -331,7 +331,10 @@ def build_creneaux_from_salles(salles_df, salle_responsable, salle_par_creneau_d
     
     Args:
         nb_reserves_dynamique: Nombre de réserves par créneau (dynamique). 
-                               Si None, calcul automatique basé sur le nombre de salles
+                               Si None, calcul automatique basé sur le nombre de salles.
+                               Peut aussi être un dict {(date, h_debut): nb_reserves}
+                               (voir utils/absence_simulation.py) ; les créneaux absents
+                               du dict gardent le calcul automatique
     """
     print("\n=== ÉTAPE 1 : Construction des créneaux ===")
     
@@ -356,7 +359,10 @@ def build_creneaux_from_salles(salles_df, salle_responsable, salle_par_creneau_d
         nb_salles = nb_salles_map.get(key, len(group))
         
         # CALCUL DYNAMIQUE DES RÉSERVES
-        if nb_reserves_dynamique is None:
+        if isinstance(nb_reserves_dynamique, dict):
+            # Réserves par créneau (simulation des absences)
+            nb_reserves = nb_reserves_dynamique.get(key, min(nb_salles, 4))
+        elif nb_reserves_dynamique is None:
             # Calcul automatique : min(nb_salles, 4) pour éviter trop de réserves
             nb_reserves = min(nb_salles, 4)
         else:
@@ -387,7 +393,10 @@ def build_creneaux_from_salles(salles_df, salle_responsable, salle_par_creneau_d
         }
     
     print(f"✓ {len(creneaux)} créneaux identifiés")
-    print(f"✓ Réserves par créneau : {'dynamique' if nb_reserves_dynamique is None else nb_reserves_dynamique}")
+    if isinstance(nb_reserves_dynamique, dict):
+        print(f"✓ Réserves par créneau : simulées ({sum(c['nb_reserves'] for c in creneaux.values())} au total)")
+    else:
+        print(f"✓ Réserves par créneau : {'dynamique' if nb_reserves_dynamique is None else nb_reserves_dynamique}")
     print(f"✓ Total surveillants requis : {sum(c['nb_surveillants'] for c in creneaux.values())}")
     
     return creneaux
@@ -1038,7 +1047,9 @@ def optimize_surveillance_scheduling(
     print("\n" + "="*60)
     print("DÉMARRAGE DE L'OPTIMISATION OR-TOOLS CP-SAT")
     print("AVEC ÉQUITÉ ABSOLUE PAR GRADE EN CONTRAINTE HARD")
-    if nb_reserves_dynamique is not None:
+    if isinstance(nb_reserves_dynamique, dict):
+        print(f"RÉSERVES DYNAMIQUES : par créneau ({len(nb_reserves_dynamique)} créneaux simulés)")
+    elif nb_reserves_dynamique is not None:
         print(f"RÉSERVES DYNAMIQUES : {nb_reserves_dynamique} par créneau")
     else:
         print("RÉSERVES DYNAMIQUES : Calcul automatique")
@@ -7,8 +7,15 @@ Analyse : voeux, dispersion, responsables, équité, couverture, charges
 """
 
 import pandas as pd
-import numpy as np
-from collections import defaultdict
+
+from utils.statistics_engine import (
+    voeux_matches,
+    charges_enseignants,
+    charges_par_grade,
+    couverture_salles,
+    dispersion_journaliere,
+    responsables_absents
+)
 
 
 def parse_time(time_str):
@@ -39,6 +46,13 @@ class SurveillanceStatistics:
         self.voeux_set = voeux_set
         self.planning_df = planning_df
         self.stats = {}
+        
+        # Enseignants surveillants et leur charge, calculés une seule fois
+        participants = pd.DataFrame(
+            [(tcode, t['grade']) for tcode, t in teachers.items() if t['participe']],
+            columns=['code_smartex_ens', 'grade']
+        )
+        self.charges = charges_enseignants(self.aff, participants)
     
     def compute_all_stats(self):
         """Calculer toutes les statistiques"""
@@ -62,25 +76,10 @@ class SurveillanceStatistics:
         print("\n[1] VOEUX DE NON-SURVEILLANCE")
         
         total_voeux = len(self.voeux_set)
-        voeux_respectes = 0
-        voeux_violes = []
-        
-        for (tcode, jour, seance) in self.voeux_set:
-            matching = self.aff[
-                (self.aff['code_smartex_ens'] == tcode) &
-                (self.aff['jour'] == jour) &
-                (self.aff['seance'] == seance)
-            ]
-            
-            if len(matching) == 0:
-                voeux_respectes += 1
-            else:
-                voeux_violes.append({
-                    'code': tcode,
-                    'jour': jour,
-                    'seance': seance,
-                    'nb': len(matching)
-                })
+        voeux_df = pd.DataFrame(list(self.voeux_set), columns=['code_smartex_ens', 'jour', 'seance'])
+        matches = voeux_matches(self.aff, voeux_df)
+        voeux_violes = matches[matches['nb'] > 0].rename(columns={'code_smartex_ens': 'code'})
+        voeux_respectes = total_voeux - len(voeux_violes)
         
         taux = (voeux_respectes / total_voeux * 100) if total_voeux > 0 else 0
         
@@ -88,9 +87,9 @@ class SurveillanceStatistics:
         print(f"    Respectés : {voeux_respectes} ({taux:.1f}%)")
         print(f"    Violés : {len(voeux_violes)} ({100-taux:.1f}%)")
         
-        if voeux_violes and len(voeux_violes) <= 3:
-            for v in voeux_violes:
-                print(f"      ⚠ Code {v['code']} : jour {v['jour']} {v['seance']}")
+        if len(voeux_violes) and len(voeux_violes) <= 3:
+            for v in voeux_violes.itertuples(index=False):
+                print(f"      ⚠ Code {v.code} : jour {v.jour} {v.seance}")
         
         return {
             'total': total_voeux,
@@ -103,41 +102,10 @@ class SurveillanceStatistics:
         """Analyser la dispersion des surveillances dans la même journée"""
         print("\n[2] DISPERSION DANS LA JOURNÉE")
         
-        profs_with_multiple = 0
-        consecutives = 0
-        espacees = 0
-        
-        for tcode in self.aff['code_smartex_ens'].unique():
-            prof_aff = self.aff[self.aff['code_smartex_ens'] == tcode]
-            
-            for jour in prof_aff['jour'].unique():
-                jour_aff = prof_aff[prof_aff['jour'] == jour]
-                
-                if len(jour_aff) <= 1:
-                    continue
-                
-                profs_with_multiple += 1
-                
-                seances = []
-                for _, row in jour_aff.iterrows():
-                    seance_str = str(row['seance']).upper()
-                    if seance_str.startswith('S'):
-                        try:
-                            seance_num = int(seance_str[1:])
-                            seances.append(seance_num)
-                        except:
-                            pass
-                
-                if len(seances) > 1:
-                    seances_sorted = sorted(set(seances))
-                    gaps = [seances_sorted[i+1] - seances_sorted[i] 
-                           for i in range(len(seances_sorted)-1)]
-                    min_gap = min(gaps)
-                    
-                    if min_gap == 1:
-                        consecutives += 1
-                    else:
-                        espacees += 1
+        dispersion = dispersion_journaliere(self.aff)
+        profs_with_multiple = dispersion['total_multi']
+        consecutives = dispersion['consecutives']
+        espacees = dispersion['espacees']
         
         print(f"    Enseignants avec plusieurs séances/jour : {profs_with_multiple}")
         print(f"      - Séances consécutives : {consecutives}")
@@ -156,40 +124,19 @@ class SurveillanceStatistics:
         # Total d'enseignants avec participe_surveillance=1
         total_enseignants_surveillants = sum(1 for t in self.teachers.values() if t['participe'])
         
-        planning_df_copy = self.planning_df.copy()
-        planning_df_copy['h_debut_parsed'] = planning_df_copy['h_debut'].apply(parse_time)
+        # Responsables (participant aux surveillances) par date d'examen
+        resp_df = pd.DataFrame({
+            'code_smartex_ens': pd.to_numeric(self.planning_df['enseignant'], errors='coerce'),
+            'date': self.planning_df['dateExam']
+        }).dropna()
+        resp_df = resp_df[resp_df['code_smartex_ens'] % 1 == 0]
+        resp_df['code_smartex_ens'] = resp_df['code_smartex_ens'].astype(int)
+        resp_df = resp_df[resp_df['code_smartex_ens'].isin(self.charges['code_smartex_ens'])]
         
-        # Collecter les responsables par date (enseignants uniques)
-        responsables_par_date = defaultdict(set)
-        for _, row in planning_df_copy.iterrows():
-            date = row['dateExam']
-            responsable = row['enseignant']
-            
-            if pd.notna(date) and pd.notna(responsable):
-                try:
-                    responsable = int(responsable)
-                    # Vérifier que le responsable participe aux surveillances
-                    if responsable in self.teachers and self.teachers[responsable]['participe']:
-                        responsables_par_date[date].add(responsable)
-                except (ValueError, TypeError):
-                    continue
-        
-        # Vérifier pour chaque responsable s'il est présent le jour de son examen
-        responsables_absents = set()
-        
-        for date, responsables in responsables_par_date.items():
-            for resp_code in responsables:
-                # Vérifier si le responsable est affecté à une surveillance CE JOUR
-                matching = self.aff[
-                    (self.aff['code_smartex_ens'] == resp_code) &
-                    (self.aff['date'] == date)
-                ]
-                
-                # Si aucune affectation ce jour = absent
-                if len(matching) == 0:
-                    responsables_absents.add(resp_code)
-        
-        nb_responsables_absents = len(responsables_absents)
+        # Absent = aucune affectation CE JOUR
+        absents = responsables_absents(self.aff, resp_df, date_col='date', aff_date_col='date')
+        
+        nb_responsables_absents = len(absents)
         nb_responsables_presents = total_enseignants_surveillants - nb_responsables_absents
         taux = (nb_responsables_presents / total_enseignants_surveillants * 100) if total_enseignants_surveillants > 0 else 0
         
@@ -208,35 +155,24 @@ class SurveillanceStatistics:
         """Analyser l'équité par grade"""
         print("\n[4] ÉQUITÉ PAR GRADE")
         
-        teachers_by_grade = defaultdict(list)
-        for tcode, t in self.teachers.items():
-            if t['participe']:
-                teachers_by_grade[t['grade']].append(tcode)
+        par_grade = charges_par_grade(self.charges, grade_col='grade').sort_index()
         
         equite_parfaite_count = 0
-        total_grades = len(teachers_by_grade)
+        total_grades = len(par_grade)
         
-        for grade in sorted(teachers_by_grade.keys()):
-            tcodes = teachers_by_grade[grade]
+        for grade, row in par_grade.to_dict('index').items():
+            min_charge = int(row['min'])
+            max_charge = int(row['max'])
+            ecart = max_charge - min_charge
             
-            charges = {}
-            for tcode in tcodes:
-                count = len(self.aff[self.aff['code_smartex_ens'] == tcode])
-                charges[tcode] = count
+            if ecart <= 1:
+                equite_parfaite_count += 1
+                status = "✓"
+            else:
+                status = "⚠"
             
-            if charges:
-                min_charge = min(charges.values())
-                max_charge = max(charges.values())
-                ecart = max_charge - min_charge
-                
-                if ecart <= 1:
-                    equite_parfaite_count += 1
-                    status = "✓"
-                else:
-                    status = "⚠"
-                
-                print(f"    {status} Grade {grade:3s} ({len(tcodes):2d} prof) : "
-                      f"min={min_charge} max={max_charge} écart={ecart}")
+            print(f"    {status} Grade {grade:3s} ({int(row['nb_enseignants']):2d} prof) : "
+                  f"min={min_charge} max={max_charge} écart={ecart}")
         
         print(f"    → {equite_parfaite_count}/{total_grades} grades en équité parfaite")
         
@@ -251,25 +187,12 @@ class SurveillanceStatistics:
         print("\n[5] COUVERTURE DES CRENEAUX")
         
         # Regrouper les affectations par créneau et salle
-        couverture_par_salle = defaultdict(lambda: defaultdict(int))
-        
-        for _, aff in self.aff.iterrows():
-            cid = aff.get('creneau_id')
-            salle = aff.get('cod_salle')  # Utiliser 'cod_salle' au lieu de 'salle'
-            if pd.notna(cid) and pd.notna(salle):
-                couverture_par_salle[cid][salle] += 1
-        
-        total_salles = 0
-        salles_bien_couvertes = 0  # >= 2 surveillants
-        salles_sous_couvertes = 0  # < 2 surveillants
-        
-        for cid in couverture_par_salle:
-            for salle, nb_surveillants in couverture_par_salle[cid].items():
-                total_salles += 1
-                if nb_surveillants >= 2:
-                    salles_bien_couvertes += 1
-                else:
-                    salles_sous_couvertes += 1
+        couverture = couverture_salles(self.aff, infos=())
+        nb_surveillants = couverture['nb_surveillants']
+        
+        total_salles = len(couverture)
+        salles_bien_couvertes = int((nb_surveillants >= 2).sum())  # >= 2 surveillants
+        salles_sous_couvertes = int((nb_surveillants < 2).sum())   # < 2 surveillants
         
         taux = (salles_bien_couvertes / total_salles * 100) if total_salles > 0 else 0
         
@@ -288,27 +211,15 @@ class SurveillanceStatistics:
         """Analyser la distribution des charges"""
         print("\n[6] DISTRIBUTION DES CHARGES")
         
-        charges_by_grade = defaultdict(list)
+        par_grade = charges_par_grade(self.charges, grade_col='grade').sort_index()
         
-        for tcode, t in self.teachers.items():
-            if not t['participe']:
-                continue
-            
-            count = len(self.aff[self.aff['code_smartex_ens'] == tcode])
-            charges_by_grade[t['grade']].append(count)
-        
-        profs_zero = 0
-        profs_total = 0
+        for grade, row in par_grade.to_dict('index').items():
+            print(f"    {grade} ({int(row['nb_enseignants']):2d} prof) : "
+                  f"total={int(row['total']):3d} moy={row['moyenne']:4.1f} "
+                  f"min-max={int(row['min'])}-{int(row['max'])}")
         
-        for grade in sorted(charges_by_grade.keys()):
-            charges = charges_by_grade[grade]
-            profs_total += len(charges)
-            profs_zero += sum(1 for c in charges if c == 0)
-            
-            if charges:
-                print(f"    {grade} ({len(charges):2d} prof) : "
-                      f"total={sum(charges):3d} moy={np.mean(charges):4.1f} "
-                      f"min-max={min(charges)}-{max(charges)}")
+        profs_zero = int(par_grade['sans_affectation'].sum())
+        profs_total = int(par_grade['nb_enseignants'].sum())
         
         print(f"    → {profs_zero}/{profs_total} enseignants sans affectation")
         
@@ -0,0 +1,79 @@
+"""
+Fixtures communes : base SQLite temporaire créée par
+database/create_database.py, et petit planning de session
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import create_database as schema
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base vide (schéma complet et grades par défaut), comme get_db()"""
+    path = str(tmp_path / 'surveillance.db')
+    monkeypatch.setattr(schema, 'DB_NAME', path)
+    schema.create_database()
+
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    yield conn
+    conn.close()
+
+
+# Deux créneaux horaires le même jour, deux salles chacun :
+# 2 surveillants par salle + 2 réserves = 6 surveillants par créneau,
+# six enseignants MA surveillant chacun deux fois.
+CRENEAUX = [
+    # creneau_id, dateExam, h_debut, h_fin, cod_salle, responsable
+    (1, '2025-01-06', '08:30', '10:00', 'A', 1),
+    (2, '2025-01-06', '08:30', '10:00', 'B', 2),
+    (3, '2025-01-06', '10:30', '12:00', 'C', None),
+    (4, '2025-01-06', '10:30', '12:00', 'D', None),
+]
+
+AFFECTATIONS = [
+    # affectation_id, code_smartex_ens, creneau_id, seance, position
+    (1, 3, 1, 'S1', 'TITULAIRE'),
+    (2, 4, 1, 'S1', 'TITULAIRE'),
+    (3, 5, 2, 'S1', 'TITULAIRE'),
+    (4, 6, 2, 'S1', 'TITULAIRE'),
+    (5, 2, 1, 'S1', 'RESERVE'),
+    (6, 1, 2, 'S1', 'RESERVE'),
+    (7, 1, 3, 'S2', 'TITULAIRE'),
+    (8, 2, 3, 'S2', 'TITULAIRE'),
+    (9, 3, 4, 'S2', 'TITULAIRE'),
+    (10, 4, 4, 'S2', 'TITULAIRE'),
+    (11, 5, 3, 'S2', 'RESERVE'),
+    (12, 6, 3, 'S2', 'RESERVE'),
+]
+
+
+@pytest.fixture
+def plan_db(db):
+    """Session 1 avec un planning complet qui respecte toutes les contraintes"""
+    db.execute("INSERT INTO session (id_session, libelle_session) VALUES (1, 'Test')")
+    db.executemany("""
+        INSERT INTO enseignant (code_smartex_ens, nom_ens, prenom_ens, grade_code_ens, participe_surveillance)
+        VALUES (?, ?, ?, 'MA', 1)
+    """, [(code, f'Nom{code}', f'Prenom{code}') for code in range(1, 7)])
+    db.executemany("""
+        INSERT INTO creneau (creneau_id, id_session, dateExam, h_debut, h_fin, cod_salle, enseignant)
+        VALUES (?, 1, ?, ?, ?, ?, ?)
+    """, CRENEAUX)
+    creneaux = {c[0]: c for c in CRENEAUX}
+    db.executemany("""
+        INSERT INTO affectation (affectation_id, code_smartex_ens, creneau_id, id_session, jour, seance,
+                                 date_examen, h_debut, h_fin, cod_salle, position)
+        VALUES (?, ?, ?, 1, 1, ?, ?, ?, ?, ?, ?)
+    """, [(aid, code, cid, seance, *creneaux[cid][1:5], position)
+          for aid, code, cid, seance, position in AFFECTATIONS])
+    db.commit()
+    return db
@@ -0,0 +1,40 @@
+import pytest
+
+from utils.absence_simulation import reserves_by_slot, simulate_reserves
+
+
+def test_absence_rate_is_required(plan_db):
+    with pytest.raises(ValueError):
+        simulate_reserves(plan_db, 1, None)
+
+
+def test_no_absence_needs_no_reserve(plan_db):
+    result = simulate_reserves(plan_db, 1, 0.0, nb_essais=500, seed=1)
+
+    assert result['totaux']['creneaux'] == 2
+    assert result['totaux']['reserves_actuelles'] == 4
+    assert result['totaux']['reserves_regle'] == 4
+    assert result['totaux']['reserves_recommandees'] == 0
+    assert result['totaux']['p_penurie_session_recommandee'] == 0.0
+    assert reserves_by_slot(result) == {('2025-01-06', '08:30'): 0, ('2025-01-06', '10:30'): 0}
+
+
+def test_reserves_grow_with_absence_rate(plan_db):
+    faible = simulate_reserves(plan_db, 1, 0.02, nb_essais=4000, seed=7)
+    fort = simulate_reserves(plan_db, 1, 0.3, nb_essais=4000, seed=7)
+
+    assert faible['totaux']['reserves_recommandees'] < fort['totaux']['reserves_recommandees']
+    for row in fort['creneaux']:
+        assert row['objectif_atteint']
+        assert row['p_penurie_recommandee'] <= 1 - 0.95 + 0.01
+    # Avec 2 réserves par créneau, 4 titulaires sur 6 suffisent : au taux de 30 %,
+    # la pénurie est fréquente
+    assert fort['totaux']['p_penurie_session_actuelle'] > 0.1
+
+
+def test_same_seed_gives_same_result(plan_db):
+    first = simulate_reserves(plan_db, 1, 0.1, nb_essais=2000, seed=3)
+    second = simulate_reserves(plan_db, 1, 0.1, nb_essais=2000, seed=3)
+
+    assert first == second
+    assert first['parametres']['seed'] == 3
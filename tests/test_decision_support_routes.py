@@ -0,0 +1,33 @@
+import pytest
+
+from routes.decision_support_routes import parse_grid
+
+
+def test_parse_grid_range_includes_stop():
+    assert parse_grid('0:0.5:0.1') == [0.0, 0.1, 0.2, 0.3, 0.4, 0.5]
+    assert parse_grid('1:6:1', cast=int) == [1, 2, 3, 4, 5, 6]
+
+
+def test_parse_grid_list_is_sorted_and_deduplicated():
+    assert parse_grid('0.3, 0.1,0.3,') == [0.1, 0.3]
+
+
+@pytest.mark.parametrize('value', [
+    '0:1:0',          # pas nul
+    '0:1',            # plage incomplète
+    '0:nan:0.1',
+    'inf',
+    '-0.1,0.2',
+    '',
+    '0:1e9:1',        # refusée avant toute allocation
+])
+def test_parse_grid_rejects_invalid_values(value):
+    with pytest.raises(ValueError):
+        parse_grid(value)
+
+
+def test_parse_grid_limits():
+    with pytest.raises(ValueError):
+        parse_grid('1,2,3', max_values=2)
+    with pytest.raises(ValueError):
+        parse_grid('1.5,2', cast=int)
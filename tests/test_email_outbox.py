@@ -0,0 +1,95 @@
+import smtplib
+import sqlite3
+import time
+
+import pytest
+
+from utils.email_outbox import (LEASE_SECONDS, MAX_ATTEMPTS, _claim, _record, backoff_delay,
+                                batch_status, enqueue_batch, ensure_outbox_table)
+
+
+@pytest.fixture
+def outbox():
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    ensure_outbox_table(db)
+    yield db
+    db.close()
+
+
+def _message(code=1, doc_hash='h1'):
+    return {'code_smartex_ens': code, 'doc_hash': doc_hash, 'to_email': f'ens{code}@example.tn',
+            'to_name': f'Enseignant {code}', 'subject': 'Convocation', 'body': 'Bonjour',
+            'pdf_filename': 'convocation.pdf', 'pdf_data': b'%PDF'}
+
+
+def _row(db, message_id=1):
+    return db.execute("SELECT * FROM email_outbox WHERE id = ?", (message_id,)).fetchone()
+
+
+def test_claim_leases_message_until_expiry(outbox):
+    enqueue_batch(outbox, 1, [_message()])
+
+    claimed = _claim(outbox, 10)
+    assert [m['attempts'] for m in claimed] == [1]
+    row = _row(outbox)
+    assert row['status'] == 'en_cours'
+    assert row['next_attempt_at'] == pytest.approx(time.time() + LEASE_SECONDS, abs=5)
+
+    # Bail en cours : personne d'autre ne le reprend
+    assert _claim(outbox, 10) == []
+
+    # Bail expiré (processus mort pendant l'envoi) : le message redevient disponible
+    outbox.execute("UPDATE email_outbox SET next_attempt_at = 0")
+    assert [m['attempts'] for m in _claim(outbox, 10)] == [2]
+
+
+def test_record_retries_temporary_errors_with_backoff(outbox):
+    enqueue_batch(outbox, 1, [_message()])
+    message = _claim(outbox, 10)[0]
+
+    _record(outbox, message, smtplib.SMTPServerDisconnected('coupure'))
+    row = _row(outbox)
+    assert row['status'] == 'en_attente'
+    assert row['next_attempt_at'] == pytest.approx(time.time() + backoff_delay(1), abs=5)
+    assert row['last_error'] == 'coupure'
+
+    _record(outbox, dict(message, attempts=MAX_ATTEMPTS), smtplib.SMTPServerDisconnected('coupure'))
+    assert _row(outbox)['status'] == 'en_attente'  # déjà remis en file : plus "en_cours"
+    outbox.execute("UPDATE email_outbox SET status = 'en_cours'")
+    _record(outbox, dict(message, attempts=MAX_ATTEMPTS), smtplib.SMTPServerDisconnected('coupure'))
+    assert _row(outbox)['status'] == 'échec'
+
+
+def test_record_fails_permanent_errors_and_clears_sent_pdf(outbox):
+    enqueue_batch(outbox, 1, [_message(1), _message(2)])
+    first, second = _claim(outbox, 10)
+
+    _record(outbox, first, smtplib.SMTPRecipientsRefused({'ens1@example.tn': (550, b'unknown')}))
+    _record(outbox, second, None)
+
+    assert _row(outbox, first['id'])['status'] == 'échec'
+    sent = _row(outbox, second['id'])
+    assert sent['status'] == 'envoyé'
+    assert sent['pdf_data'] is None
+    assert sent['sent_at'] is not None
+
+
+def test_enqueue_is_idempotent_and_supersedes_old_documents(outbox):
+    batch_id, _ = enqueue_batch(outbox, 1, [_message()])
+    _record(outbox, _claim(outbox, 10)[0], None)
+
+    _, stats = enqueue_batch(outbox, 1, [_message()])
+    assert stats == {'ajoutes': 0, 'deja_envoyes': 1, 'repris': 0}
+
+    # Nouveau document pendant l'envoi de l'ancien : l'ancien n'est pas réessayé
+    enqueue_batch(outbox, 1, [_message(2, 'v1')])
+    pending = _claim(outbox, 10)[0]
+    new_batch, stats = enqueue_batch(outbox, 1, [_message(2, 'v2')])
+    assert stats['ajoutes'] == 1
+    _record(outbox, pending, smtplib.SMTPServerDisconnected('coupure'))
+    assert _row(outbox, pending['id'])['status'] == 'remplacé'
+
+    status = batch_status(outbox, new_batch)
+    assert status['counts']['en_attente'] == 1
+    assert status['status'] == 'en_cours'
@@ -0,0 +1,83 @@
+import pandas as pd
+
+from utils.import_engine import bulk_upsert, import_file
+
+ENSEIGNANTS_CSV = """nom_ens,prenom_ens,email_ens,grade_code_ens,code_smartex_ens,participe_surveillance
+Salhi,Salah,s.salhi@example.tn,PR,7,FALSE
+Belhouene,Imen,i.belhouene@example.tn,PTC,100,TRUE
+Ben Ali,Sami,s.benali@example.tn,MA,12,TRUE
+"""
+
+
+def _voeux(seances):
+    return pd.DataFrame({'code_smartex_ens': 1, 'id_session': 1, 'jour': 1, 'seance': seances})
+
+
+def test_bulk_upsert_replays_failed_batch_without_duplicates(db):
+    db.execute("INSERT INTO session (id_session, libelle_session) VALUES (1, 'Test')")
+    db.execute("INSERT INTO enseignant (code_smartex_ens, nom_ens, prenom_ens, grade_code_ens) "
+               "VALUES (1, 'Nom', 'Prenom', 'MA')")
+    # Ancienne base sans index unique : INSERT simple, un doublon ne serait pas détecté
+    db.execute("DROP INDEX ux_voeu_ens_session_jour_seance")
+
+    # La 1re ligne est écrite par executemany avant l'échec de la 2e
+    result = bulk_upsert(db, 'voeux', _voeux(['S1', None, 'S3']), scope_value=1,
+                         use_conflict=False, offset=10)
+    db.commit()
+
+    assert result['inserted'] == 2
+    assert result['errors'] == [result['errors'][0]]
+    assert result['errors'][0].startswith('Ligne 12:')
+    seances = [row[0] for row in db.execute("SELECT seance FROM voeu ORDER BY voeu_id")]
+    assert seances == ['S1', 'S3']
+
+
+def test_bulk_upsert_keeps_caller_transaction(db):
+    db.execute("INSERT INTO session (id_session, libelle_session) VALUES (1, 'Test')")
+    db.execute("INSERT INTO enseignant (code_smartex_ens, nom_ens, prenom_ens, grade_code_ens) "
+               "VALUES (1, 'Nom', 'Prenom', 'MA')")
+    db.commit()
+
+    bulk_upsert(db, 'voeux', _voeux(['S1', 'S2']), scope_value=1)
+    assert db.in_transaction
+    db.rollback()
+    assert db.execute("SELECT COUNT(*) FROM voeu").fetchone()[0] == 0
+
+
+def test_import_file_skips_identical_and_applies_changed_rows(db, tmp_path):
+    path = tmp_path / 'enseignants.csv'
+    path.write_text(ENSEIGNANTS_CSV, encoding='utf-8')
+
+    first = import_file(db, 'enseignants', str(path))
+    db.commit()
+    assert first['mode'] == 'complet'
+    assert first['inserted'] == 3
+
+    again = import_file(db, 'enseignants', str(path))
+    assert again['mode'] == 'identique'
+    assert again['deja_importe'] is True
+
+    path.write_text(ENSEIGNANTS_CSV.replace('Ben Ali,Sami', 'Ben Ali,Samir'), encoding='utf-8')
+    diff = import_file(db, 'enseignants', str(path))
+    db.commit()
+    assert diff['mode'] == 'differentiel'
+    assert diff['unchanged_rows'] == 2
+    assert (diff['inserted'], diff['updated']) == (0, 1)
+    assert db.execute("SELECT prenom_ens FROM enseignant WHERE code_smartex_ens = 12").fetchone()[0] == 'Samir'
+
+
+def test_import_file_reimports_after_manual_table_change(db, tmp_path):
+    path = tmp_path / 'enseignants.csv'
+    path.write_text(ENSEIGNANTS_CSV, encoding='utf-8')
+    import_file(db, 'enseignants', str(path))
+    db.commit()
+
+    # Modification manuelle à nombre de lignes égal : l'historique n'est plus fiable
+    db.execute("UPDATE enseignant SET nom_ens = 'Modifié' WHERE code_smartex_ens = 7")
+    db.commit()
+
+    result = import_file(db, 'enseignants', str(path))
+    db.commit()
+    assert result['mode'] == 'complet'
+    assert result['updated'] == 3
+    assert db.execute("SELECT nom_ens FROM enseignant WHERE code_smartex_ens = 7").fetchone()[0] == 'Salhi'
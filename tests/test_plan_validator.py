@@ -0,0 +1,51 @@
+from utils.plan_validator import HARD_RULES, validate_plan, validation_summary
+
+
+def _violations(result, types=('hard',)):
+    return {rule: r['violations'] for rule, r in result['resume'].items()
+            if r['violations'] and r['type'] in types}
+
+
+def test_complete_plan_is_valid(plan_db):
+    result = validate_plan(plan_db, 1)
+
+    assert result['valide'] is True
+    assert result['affectations'] == 12
+    assert _violations(result, types=('hard', 'soft')) == {'S4': 6}  # 2 surveillances pour un quota de 7
+    assert result['mesures']['S2'] == {'jours_total': 6, 'jours_minimum': 6}
+    assert result['mesures']['S3']['moyennes_par_grade'] == {'MA': 2.0}
+
+
+def test_violations_are_counted_per_rule(plan_db):
+    # Le responsable de la salle A, déjà réserve à 08:30, y surveille à la
+    # place de l'enseignant 3
+    plan_db.execute("UPDATE affectation SET code_smartex_ens = 1 WHERE affectation_id = 1")
+    # Une réserve de moins à 10:30
+    plan_db.execute("DELETE FROM affectation WHERE affectation_id = 12")
+    # Vœu de non-surveillance de l'enseignant 5 le jour 1 en S1
+    plan_db.execute("INSERT INTO voeu (code_smartex_ens, id_session, jour, seance) VALUES (5, 1, 1, 'S1')")
+    plan_db.commit()
+
+    result = validate_plan(plan_db, 1)
+
+    assert result['valide'] is False
+    assert _violations(result) == {'H1': 1, 'H2C': 1, 'H4': 1, 'CONFLIT': 1}
+    assert result['resume']['S1']['violations'] == 1
+    assert result['violations']['H1'] == [
+        {'date': '2025-01-06', 'h_debut': '10:30', 'nb_salles': 2, 'requis': 6, 'affectes': 5}
+    ]
+    assert result['violations']['H4'][0]['min'] == 1
+    assert result['violations']['H4'][0]['max'] == 3
+    assert validation_summary(result)['hard'] == {'H1': 1, 'H2C': 1, 'H4': 1, 'CONFLIT': 1}
+
+
+def test_reserves_and_participation(plan_db):
+    plan_db.execute("UPDATE enseignant SET participe_surveillance = 0 WHERE code_smartex_ens = 6")
+    plan_db.commit()
+
+    result = validate_plan(plan_db, 1, nb_reserves=0)
+
+    # Sans réserve, 4 surveillants attendus par créneau au lieu de 6
+    assert result['resume']['H1']['violations'] == 2
+    assert result['resume']['PARTICIPATION']['violations'] == 2
+    assert set(result['resume']) >= set(HARD_RULES)
@@ -0,0 +1,54 @@
+from utils.planning_index import PlanningIndex
+
+
+def test_swap_candidates_respect_constraints(plan_db):
+    index = PlanningIndex(plan_db, 1)
+
+    # Affectation 1 : enseignant 3, salle A à 08:30 (il surveille aussi la salle D à 10:30).
+    # Exclues : même salle et même créneau (2, 5), responsable de la salle A (6),
+    # chevauchement avec sa surveillance de 10:30 (7 à 12), même enseignant (9).
+    candidates = index.swap_candidates(1)
+
+    assert [c['affectation_id'] for c in candidates] == [3, 4]
+    assert [c['code_smartex_ens'] for c in candidates] == [5, 6]
+    assert candidates[0]['impact'] == {'voeux': 0, 'jours': 0, 'equite_minutes': 0.0, 'score': 0.0}
+
+
+def test_swap_errors(plan_db):
+    index = PlanningIndex(plan_db, 1)
+
+    assert index.swap_error(1, 2)[1] == 400      # même salle, même créneau
+    assert index.swap_error(1, 9)[1] == 400      # même enseignant
+    assert index.swap_error(1, 7)[1] == 409      # chevauchement d'horaire
+    assert index.swap_error(1, 6)[1] == 409      # responsable de la salle A
+    assert index.swap_error(1, 99)[1] == 404
+    assert index.swap_error(1, 3) is None
+
+
+def test_swap_impact_counts_wishes_and_days(plan_db):
+    # Enseignant 7 : une seule surveillance, le 2e jour, malgré son vœu
+    plan_db.execute("""
+        INSERT INTO enseignant (code_smartex_ens, nom_ens, prenom_ens, grade_code_ens, participe_surveillance)
+        VALUES (7, 'Nom7', 'Prenom7', 'MA', 1)
+    """)
+    plan_db.execute("""
+        INSERT INTO creneau (creneau_id, id_session, dateExam, h_debut, h_fin, cod_salle)
+        VALUES (5, 1, '2025-01-07', '08:30', '10:00', 'E')
+    """)
+    plan_db.execute("""
+        INSERT INTO affectation (affectation_id, code_smartex_ens, creneau_id, id_session, jour, seance, position)
+        VALUES (13, 7, 5, 1, 2, 'S1', 'TITULAIRE')
+    """)
+    plan_db.execute("INSERT INTO voeu (code_smartex_ens, id_session, jour, seance) VALUES (7, 1, 2, 'S1')")
+    plan_db.commit()
+    index = PlanningIndex(plan_db, 1)
+
+    # 3 <-> 7 : le vœu de 7 est respecté (-1), 3 vient un jour de plus (+1)
+    assert index.swap_error(1, 13) is None
+    assert index.swap_impact(1, 13) == {'voeux': -1, 'jours': 1, 'equite_minutes': 0.0, 'score': -50.0}
+    assert index.swap_candidates(1)[0]['affectation_id'] == 13
+
+    index.apply_swap(1, 13)
+    assert index.affectations[1]['code_smartex_ens'] == 7
+    assert index.jours[3] == {'2025-01-06': 1, '2025-01-07': 1}
+    assert index.swap_impact(1, 13) == {'voeux': 1, 'jours': -1, 'equite_minutes': 0.0, 'score': 50.0}
@@ -0,0 +1,207 @@
+"""
+utils/absence_simulation.py
+Simulation Monte Carlo des absences pour dimensionner les réserves par créneau
+
+L'optimiseur prévoit min(nb_salles, 4) réserves par créneau horaire
+(scripts/optimize_example.build_creneaux_from_salles), quel que soit le
+risque réel d'absence. Ici, le risque est simulé :
+
+1. Taux d'absence : fourni explicitement (taux_absence). La base ne
+   contient pas encore de mesure des absences des surveillants
+   (responsable_absent_jour_examen décrit la présence des responsables
+   les jours de leurs examens, pas des absences) : aucun taux n'est
+   déduit de l'historique.
+2. Tirage des absences par (enseignant, jour) : un enseignant absent l'est
+   pour toutes ses surveillances de la journée. Les tirages sont faits par
+   blocs de plusieurs milliers d'essais (tableaux NumPy enseignants × essais).
+3. Pour chaque créneau : surveillants nécessaires = 2 × nb_salles ; les
+   surveillants affectés (titulaires puis réserves, complétés par des
+   surveillants « virtuels ») sont comptés dans cet ordre, et la
+   probabilité de pénurie avec r réserves est la part des essais où plus
+   de r des 2 × nb_salles + r premiers sont absents.
+
+Réserves recommandées : le plus petit r dont la probabilité de couverture
+atteint le niveau de service visé. La probabilité de pénurie sur toute la
+session (au moins un créneau à découvert) est donnée pour le planning
+actuel, la règle min(nb_salles, 4) et la recommandation.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.plan_validator import load_plan, slot_rooms
+
+NIVEAU_SERVICE = 0.95
+NB_ESSAIS = 20000
+MAX_RESERVES = 10
+MAX_RESERVES_REGLE = 4
+
+# Taille d'un bloc d'essais (en cellules essais × créneaux × surveillants)
+_BLOC_CELLULES = 4_000_000
+
+
+# ============================================================================
+# SIMULATION
+# ============================================================================
+
+def _slots(plan):
+    """Créneaux horaires : salles, surveillants nécessaires et affectés"""
+    nb_salles = slot_rooms(plan).astype(int)
+    affectes = plan['affectations'].groupby(['dateExam', 'heure']).size()
+    slots = pd.DataFrame({'nb_salles': nb_salles}).join(affectes.rename('affectes'), how='outer')
+    slots = slots.fillna(0).astype(int).rename_axis(['date', 'h_debut']).reset_index()
+    slots['requis'] = 2 * slots['nb_salles']
+    return slots
+
+
+def _members(plan, slots, p0, length):
+    """
+    Surveillants de chaque créneau dans l'ordre de comptage (titulaires puis
+    réserves) : index du couple (enseignant, jour) ou -1 (surveillant virtuel)
+
+    Returns:
+        tuple: (matrice créneaux × length des index, probabilités par couple)
+    """
+    aff = plan['affectations']
+    members = np.full((len(slots), length), -1, dtype=np.int64)
+    if aff.empty:
+        return members, np.zeros(0)
+
+    slot_index = pd.MultiIndex.from_frame(slots[['date', 'h_debut']])
+    aff = aff.assign(
+        slot=slot_index.get_indexer(pd.MultiIndex.from_frame(aff[['dateExam', 'heure']])),
+        reserve=aff['position'].eq('RESERVE'),
+    ).sort_values(['slot', 'reserve', 'affectation_id'], kind='stable')
+    aff = aff[aff['slot'] >= 0]
+    rank = aff.groupby('slot').cumcount().to_numpy()
+
+    pair, pairs = pd.factorize(pd.MultiIndex.from_frame(aff[['code_smartex_ens', 'dateExam']]))
+    probabilities = np.full(len(pairs), p0, dtype=np.float32)
+
+    keep = rank < length
+    members[aff['slot'].to_numpy()[keep], rank[keep]] = pair[keep]
+    return members, probabilities
+
+
+def simulate_reserves(db, id_session, taux_absence, niveau_service=NIVEAU_SERVICE,
+                      nb_essais=NB_ESSAIS, max_reserves=MAX_RESERVES, seed=None):
+    """
+    Estimer la probabilité de pénurie par créneau et recommander les réserves
+
+    Args:
+        niveau_service: probabilité de couverture visée par créneau (ex: 0.95)
+        nb_essais: nombre de tirages Monte Carlo
+        max_reserves: réserves maximum envisagées par créneau
+        taux_absence: taux d'absence des surveillants (obligatoire, voir l'en-tête)
+        seed: graine du générateur (tirée au hasard si None, renvoyée)
+
+    Returns:
+        dict: paramètres, créneaux (réserves actuelles, règle, recommandées
+              et probabilités de pénurie), totaux
+    """
+    if taux_absence is None:
+        raise ValueError("taux_absence est obligatoire (pas de mesure des absences en base)")
+    p0 = float(taux_absence)
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+    plan = load_plan(db, id_session)
+    slots = _slots(plan)
+
+    requis = slots['requis'].to_numpy()
+    affectes = slots['affectes'].to_numpy()
+    regle = np.minimum(slots['nb_salles'].to_numpy(), MAX_RESERVES_REGLE)
+    length = int(max((requis + max_reserves).max(initial=0), affectes.max(initial=0), 1))
+    members, probabilities = _members(plan, slots, p0, length)
+    # Colonne supplémentaire (jamais absente) pour les surveillants virtuels,
+    # remplacée à chaque essai par un tirage au même taux
+    virtual = members < 0
+    nb_virtual = int(virtual.sum())
+    probabilities = np.append(probabilities, np.float32(0))
+    gather = np.where(virtual, len(probabilities) - 1, members)
+
+    nb_slots = len(slots)
+    rows = np.arange(nb_slots)
+    candidates = requis[:, None] + np.arange(max_reserves + 1)            # (créneaux, r)
+    block = max(1, _BLOC_CELLULES // max(nb_slots * length, 1))
+
+    def run(effectifs):
+        """
+        Essais (même graine à chaque passe) : probabilité de pénurie par
+        créneau pour r = 0..max_reserves, puis pour chaque effectif donné
+        (surveillants comptés par créneau) par créneau et sur la session
+        """
+        rng = np.random.default_rng(seed)
+        penuries = np.zeros((nb_slots, max_reserves + 1), dtype=np.int64)
+        par_creneau = np.zeros((len(effectifs), nb_slots), dtype=np.int64)
+        par_session = np.zeros(len(effectifs), dtype=np.int64)
+        done = 0
+        while done < nb_essais:
+            n = min(block, nb_essais - done)
+            done += n
+            absent_pairs = rng.random((len(probabilities), n), dtype=np.float32) < probabilities[:, None]
+            # Tableaux (surveillant, créneau, essai) : le cumul suivant le 1er axe
+            # additionne des lignes contiguës
+            absent = absent_pairs[gather.T]
+            absent[virtual.T] = rng.random((nb_virtual, n), dtype=np.float32) < p0
+            # cumul[k, s] : absents parmi les k premiers surveillants du créneau s
+            # (boucle sur les rangs : np.cumsum sur des booléens est ~8x plus lent)
+            cumul = np.zeros((length + 1, nb_slots, n), dtype=np.int16)
+            for k in range(length):
+                np.add(cumul[k], absent[k], out=cumul[k + 1])
+
+            # r réserves : pénurie si plus de r absents parmi les requis + r premiers
+            absents_r = cumul[candidates, rows[:, None]]                       # (créneaux, r, essais)
+            penuries += (absents_r > np.arange(max_reserves + 1)[:, None]).sum(axis=2)
+
+            for i, effectif in enumerate(effectifs):
+                short = (effectif[:, None] - cumul[effectif, rows]) < requis[:, None]
+                par_creneau[i] += short.sum(axis=1)
+                par_session[i] += int(short.any(axis=0).sum())
+        return penuries / nb_essais, par_creneau / nb_essais, par_session / nb_essais
+
+    # 1re passe : réserves minimales par créneau pour le niveau de service
+    penuries, _, _ = run([])
+    couvert = (1 - penuries) >= niveau_service
+    atteint = couvert.any(axis=1)
+    recommandees = np.where(atteint, couvert.argmax(axis=1), max_reserves)
+
+    # 2e passe (mêmes tirages) : planning actuel, règle et recommandation
+    actuelles = np.maximum(affectes - requis, 0)
+    _, par_creneau, par_session = run([affectes, requis + np.minimum(regle, max_reserves),
+                                       requis + recommandees])
+
+    slots['reserves_actuelles'] = actuelles
+    slots['reserves_regle'] = regle
+    slots['reserves_recommandees'] = recommandees
+    slots['objectif_atteint'] = atteint
+    slots['p_penurie_actuelle'] = par_creneau[0].round(4)
+    slots['p_penurie_regle'] = par_creneau[1].round(4)
+    slots['p_penurie_recommandee'] = par_creneau[2].round(4)
+
+    return {
+        'id_session': id_session,
+        'parametres': {
+            'niveau_service': niveau_service,
+            'nb_essais': nb_essais,
+            'max_reserves': max_reserves,
+            'taux_absence': taux_absence,
+            'seed': seed,
+        },
+        'totaux': {
+            'creneaux': nb_slots,
+            'reserves_actuelles': int(actuelles.sum()),
+            'reserves_regle': int(regle.sum()),
+            'reserves_recommandees': int(recommandees.sum()),
+            'economie_vs_regle': int(regle.sum() - recommandees.sum()),
+            'p_penurie_session_actuelle': round(float(par_session[0]), 4),
+            'p_penurie_session_regle': round(float(par_session[1]), 4),
+            'p_penurie_session_recommandee': round(float(par_session[2]), 4),
+        },
+        'creneaux': slots.to_dict('records'),
+    }
+
+
+def reserves_by_slot(result):
+    """Réserves recommandées {(date, h_debut): n} pour build_creneaux_from_salles"""
+    return {(row['date'], row['h_debut']): int(row['reserves_recommandees'])
+            for row in result['creneaux']}
@@ -0,0 +1,65 @@
+"""
+utils/columnar.py
+Encodage colonnaire compact des tables JSON
+
+Une table est transmise colonne par colonne plutôt que ligne par ligne
+(les noms de colonnes ne sont pas répétés) :
+
+    {
+        "count": 3,
+        "columns": {"creneau_id": [1, 2, 3], "dateExam": [0, 0, 1], ...},
+        "dictionaries": {"dateExam": ["27/10/2025", "28/10/2025"]},
+        "references": {"code_smartex_ens": "enseignants"}
+    }
+
+- dictionaries : la colonne contient des indices dans la liste de valeurs
+  distinctes (dates, heures, salles, séances...)
+- references : la colonne contient des numéros de ligne dans une autre
+  table du même document (null si la valeur n'y figure pas)
+
+Décodage côté client :
+    valeur = dictionaries[col][code]   si col est dans dictionaries
+    ligne  = tables[references[col]]   lue à l'indice donné
+"""
+
+
+def encode_table(rows, columns, dictionary=(), references=None):
+    """
+    Encoder une liste de lignes en colonnes
+
+    Args:
+        rows: lignes (dict ou sqlite3.Row)
+        columns: colonnes à conserver, dans l'ordre
+        dictionary: colonnes à encoder par dictionnaire
+        references: {colonne: (nom de table, {valeur: indice de ligne})}
+
+    Returns:
+        dict: count, columns, dictionaries, references
+    """
+    references = references or {}
+    data = {col: [row[col] for row in rows] for col in columns}
+    dictionaries = {}
+
+    for col in dictionary:
+        values = data[col]
+        codes = {}
+        for value in values:
+            if value not in codes:
+                codes[value] = len(codes)
+        data[col] = [codes[value] for value in values]
+        dictionaries[col] = list(codes)
+
+    for col, (_, index) in references.items():
+        data[col] = [index.get(value) for value in data[col]]
+
+    return {
+        'count': len(rows),
+        'columns': data,
+        'dictionaries': dictionaries,
+        'references': {col: table for col, (table, _) in references.items()},
+    }
+
+
+def row_index(rows, key):
+    """{valeur de key: numéro de ligne} pour les références"""
+    return {row[key]: i for i, row in enumerate(rows)}
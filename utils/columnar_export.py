@@ -0,0 +1,278 @@
+"""
+utils/columnar_export.py
+Export colonnaire des sessions pour l'analyse historique
+
+Les tables utiles à l'analyse pluriannuelle (charge de surveillance,
+dérive des quotas, respect des vœux) sont exportées pour une ou plusieurs
+sessions, une table par fichier :
+
+    session, affectation, creneau, voeu, quota_enseignant, enseignant
+
+Les colonnes texte sont encodées par dictionnaire (codes entiers + liste
+des valeurs distinctes) : dates, horaires, salles, grades, séances...
+
+Formats :
+- parquet : Parquet (pyarrow), colonnes texte en dictionnaire
+- arrow   : Arrow IPC / Feather (pyarrow)
+- npz     : archive NumPy (sans dépendance supplémentaire), colonnes
+            texte en codes + dictionnaire
+- auto    : parquet si pyarrow est installé, npz sinon
+
+Un fichier dataset.json décrit l'export (format, sessions, tables). Le
+chargeur (load_table) ne lit que les colonnes demandées et rend des
+DataFrame pandas (colonnes texte en Categorical).
+"""
+
+import io
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+FORMATS = ('auto', 'parquet', 'arrow', 'npz')
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'npz': '.npz'}
+DATASET_NAME = 'dataset.json'
+NPZ_VERSION = 1
+
+# Tables exportées : requête ({sessions} = liste de ?) et colonne de session
+TABLES = {
+    'session': ('SELECT * FROM session WHERE id_session IN ({sessions}) ORDER BY id_session', 'id_session'),
+    'affectation': ('SELECT * FROM affectation WHERE id_session IN ({sessions}) '
+                    'ORDER BY id_session, affectation_id', 'id_session'),
+    'creneau': ('SELECT * FROM creneau WHERE id_session IN ({sessions}) '
+                'ORDER BY id_session, creneau_id', 'id_session'),
+    'voeu': ('SELECT * FROM voeu WHERE id_session IN ({sessions}) '
+             'ORDER BY id_session, voeu_id', 'id_session'),
+    'quota_enseignant': ('SELECT * FROM quota_enseignant WHERE id_session IN ({sessions}) '
+                         'ORDER BY id_session, code_smartex_ens', 'id_session'),
+    # Référentiel commun à toutes les sessions
+    'enseignant': ('SELECT * FROM enseignant ORDER BY code_smartex_ens', None),
+}
+
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_format(fmt):
+    """Format effectif ('auto' -> parquet ou npz) ; ValueError si indisponible"""
+    fmt = (fmt or 'auto').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Format inconnu : {fmt} (attendu : {', '.join(FORMATS)})")
+    if fmt == 'auto':
+        return 'parquet' if has_pyarrow() else 'npz'
+    if fmt in ('parquet', 'arrow') and not has_pyarrow():
+        raise ValueError(f"Le format {fmt} nécessite pyarrow (pip install pyarrow) ; utilisez npz")
+    return fmt
+
+
+# ============================================================================
+# LECTURE SQLITE
+# ============================================================================
+
+def all_session_ids(db):
+    return [row[0] for row in db.execute('SELECT id_session FROM session ORDER BY id_session').fetchall()]
+
+
+def read_table(db, table, session_ids):
+    """Lignes d'une table pour les sessions demandées, colonnes texte en dictionnaire"""
+    query, _ = TABLES[table]
+    query = query.format(sessions=', '.join('?' for _ in session_ids))
+    params = list(session_ids) if '?' in query else []
+    df = pd.read_sql_query(query, db, params=params)
+    return dictionary_encode(df)
+
+
+def dictionary_encode(df):
+    """Colonnes texte -> Categorical (valeurs non textuelles converties en texte)"""
+    for col in df.columns:
+        if df[col].dtype == object:
+            values = df[col]
+            mask = values.notna()
+            if not values[mask].map(type).eq(str).all():
+                values = values.where(~mask, values.astype(str))
+            df[col] = values.astype('category')
+    return df
+
+
+# ============================================================================
+# ENCODAGE DES FICHIERS
+# ============================================================================
+
+def _npz_bytes(df):
+    arrays = {}
+    columns = []
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f'c{i}_codes'] = series.cat.codes.to_numpy()
+            arrays[f'c{i}_dict'] = series.cat.categories.to_numpy(dtype=str)
+            columns.append({'name': col, 'kind': 'dictionary'})
+        else:
+            arrays[f'c{i}_values'] = series.to_numpy()
+            columns.append({'name': col, 'kind': 'values'})
+    meta = {'version': NPZ_VERSION, 'rows': len(df), 'columns': columns}
+    arrays['meta'] = np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def table_bytes(df, fmt):
+    """Contenu du fichier d'une table dans le format demandé (parquet, arrow, npz)"""
+    if fmt == 'npz':
+        return _npz_bytes(df)
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        df.to_parquet(buffer, index=False)
+    else:
+        df.reset_index(drop=True).to_feather(buffer)
+    return buffer.getvalue()
+
+
+def _dataset_info(fmt, session_ids, tables):
+    return {
+        'format': fmt,
+        'sessions': list(session_ids),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'tables': tables,
+    }
+
+
+def write_dataset(db, directory, session_ids=None, fmt='auto'):
+    """
+    Exporter des sessions dans un dossier (un fichier par table + dataset.json)
+
+    Returns:
+        dict: description de l'export (contenu de dataset.json)
+    """
+    fmt = resolve_format(fmt)
+    session_ids = list(session_ids) if session_ids else all_session_ids(db)
+    os.makedirs(directory, exist_ok=True)
+
+    tables = {}
+    for table in TABLES:
+        df = read_table(db, table, session_ids)
+        filename = table + EXTENSIONS[fmt]
+        with open(os.path.join(directory, filename), 'wb') as f:
+            f.write(table_bytes(df, fmt))
+        tables[table] = {'file': filename, 'rows': len(df), 'columns': list(df.columns)}
+
+    info = _dataset_info(fmt, session_ids, tables)
+    with open(os.path.join(directory, DATASET_NAME), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=1)
+    return info
+
+
+def dataset_entries(db, session_ids, fmt, folder='export'):
+    """
+    Entrées pour utils/zip_stream.iter_zip : toutes les tables sont lues et
+    encodées immédiatement (la lecture SQLite est terminée avant l'envoi de
+    l'archive), dataset.json en dernier
+    """
+    tables = {}
+    entries = []
+    for table in TABLES:
+        df = read_table(db, table, session_ids)
+        filename = table + EXTENSIONS[fmt]
+        tables[table] = {'file': filename, 'rows': len(df), 'columns': list(df.columns)}
+        entries.append((table_bytes(df, fmt), f'{folder}/{filename}'))
+
+    info = _dataset_info(fmt, session_ids, tables)
+    entries.append((json.dumps(info, ensure_ascii=False, indent=1).encode('utf-8'),
+                    f'{folder}/{DATASET_NAME}'))
+    return entries
+
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def load_dataset_info(directory):
+    with open(os.path.join(directory, DATASET_NAME), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _load_npz(path, columns=None):
+    with np.load(path, allow_pickle=False) as archive:
+        meta = json.loads(archive['meta'].tobytes().decode('utf-8'))
+        data = {}
+        for i, column in enumerate(meta['columns']):
+            name = column['name']
+            if columns is not None and name not in columns:
+                continue
+            if column['kind'] == 'dictionary':
+                data[name] = pd.Categorical.from_codes(archive[f'c{i}_codes'],
+                                                       categories=archive[f'c{i}_dict'])
+            else:
+                data[name] = archive[f'c{i}_values']
+    order = [c['name'] for c in meta['columns'] if columns is None or c['name'] in columns]
+    return pd.DataFrame(data, columns=order)
+
+
+def load_table(directory, table, columns=None, sessions=None):
+    """
+    Charger une table d'un export
+
+    Args:
+        columns: colonnes à lire (toutes par défaut) ; seules celles-ci sont décodées
+        sessions: filtrer sur id_session
+
+    Returns:
+        DataFrame
+    """
+    info = load_dataset_info(directory)
+    entry = info['tables'][table]
+    path = os.path.join(directory, entry['file'])
+    _, session_column = TABLES[table]
+
+    wanted = None
+    if columns is not None:
+        wanted = list(columns)
+        if sessions is not None and session_column and session_column not in wanted:
+            wanted.append(session_column)
+
+    if info['format'] == 'npz':
+        df = _load_npz(path, wanted)
+    elif info['format'] == 'parquet':
+        df = pd.read_parquet(path, columns=wanted)
+    else:
+        df = pd.read_feather(path, columns=wanted)
+
+    if sessions is not None and session_column:
+        df = df[df[session_column].isin(list(sessions))].reset_index(drop=True)
+        if columns is not None and session_column not in columns:
+            df = df.drop(columns=session_column)
+    return df
+
+
+def load_adjusted_quotas(directory, id_session):
+    """
+    Quotas ajustés d'une session lus depuis un export (même résultat que
+    scripts/optimize_example.load_adjusted_quotas pour la session donnée)
+
+    Returns:
+        dict: {code_ens: {'grade', 'quota_grade', 'quota_ajuste', 'quota_ajuste_maj',
+                          'diff_quota_grade', 'diff_quota_majoritaire'}}
+    """
+    df = load_table(directory, 'quota_enseignant', sessions=[id_session], columns=[
+        'code_smartex_ens', 'grade_code_ens', 'quota_grade', 'quota_ajuste',
+        'quota_ajuste_maj', 'diff_quota_grade', 'diff_quota_majoritaire'
+    ])
+    return {
+        row.code_smartex_ens: {
+            'grade': row.grade_code_ens,
+            'quota_grade': row.quota_grade,
+            'quota_ajuste': row.quota_ajuste,
+            'quota_ajuste_maj': row.quota_ajuste_maj,
+            'diff_quota_grade': row.diff_quota_grade,
+            'diff_quota_majoritaire': row.diff_quota_majoritaire,
+        }
+        for row in df.itertuples(index=False)
+    }
@@ -0,0 +1,134 @@
+"""
+utils/csv_export.py
+Export CSV des affectations d'une session
+
+Les affectations de la session sont lues une seule fois (une requête, un
+DataFrame) ; chaque découpage est obtenu par un seul groupby :
+
+- global      : affectations_global_session_{id}.csv
+- jours       : affectations_jour_{n}_session_{id}.csv (un par jour)
+- enseignants : convocation_{code}_{nom}_{prenom}_session_{id}.csv
+                (un par enseignant)
+
+Chaque fichier peut être écrit sur le disque (write_csv_files), envoyé
+directement en réponse HTTP (iter_csv) ou ajouté à une archive ZIP en
+flux (zip_entries + utils/zip_stream.py) sans fichier intermédiaire.
+"""
+
+import os
+
+import pandas as pd
+
+PARTS = ('global', 'jours', 'enseignants')
+CSV_CHUNK_ROWS = 5000
+
+# Dossier des fichiers dans les archives (comme /download-multiple)
+ZIP_FOLDERS = {
+    'global': 'affectations/csv',
+    'jours': 'affectations/csv',
+    'enseignants': 'convocations/csv',
+}
+
+AFFECTATIONS_QUERY = '''
+    SELECT
+        a.code_smartex_ens,
+        e.nom_ens,
+        e.prenom_ens,
+        e.grade_code_ens,
+        c.dateExam as date,
+        c.h_debut,
+        c.h_fin,
+        c.cod_salle,
+        c.type_ex,
+        a.position,
+        a.jour,
+        a.seance
+    FROM affectation a
+    JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+    JOIN creneau c ON a.creneau_id = c.creneau_id
+    WHERE c.id_session = ?
+    ORDER BY c.dateExam, c.h_debut, c.cod_salle, e.nom_ens
+'''
+
+
+def load_affectations(db, session_id):
+    """Affectations de la session (DataFrame, vide si aucune)"""
+    return pd.read_sql_query(AFFECTATIONS_QUERY, db, params=(session_id,))
+
+
+# ============================================================================
+# DÉCOUPAGE
+# ============================================================================
+
+def csv_files(df, session_id, parts=PARTS):
+    """
+    Fichiers CSV d'un export, sans les écrire
+
+    Returns:
+        list: (partie, clé du groupe, nom du fichier, indices des lignes dans df)
+              la clé est le numéro du jour (jours), le code de l'enseignant
+              (enseignants) ou None (global)
+    """
+    files = []
+    if 'global' in parts:
+        files.append(('global', None, f'affectations_global_session_{session_id}.csv', None))
+
+    if 'jours' in parts and 'jour' in df.columns:
+        for jour, rows in sorted(df.groupby('jour').indices.items()):
+            files.append(('jours', int(jour),
+                          f'affectations_jour_{int(jour)}_session_{session_id}.csv', rows))
+
+    if 'enseignants' in parts:
+        # Ordre de première apparition, lignes dans l'ordre global
+        grouped = df.groupby('code_smartex_ens', sort=False).indices
+        for code, rows in grouped.items():
+            first = df.iloc[rows[0]]
+            files.append(('enseignants', code,
+                          f"convocation_{code}_{first['nom_ens']}_{first['prenom_ens']}_session_{session_id}.csv",
+                          rows))
+    return files
+
+
+def _frame(df, rows):
+    return df if rows is None else df.take(rows)
+
+
+def iter_csv(frame, chunk_rows=CSV_CHUNK_ROWS):
+    """Contenu CSV (UTF-8) par morceaux de chunk_rows lignes, en-tête compris"""
+    if frame.empty:
+        yield frame.to_csv(index=False).encode('utf-8')
+        return
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        yield chunk.to_csv(index=False, header=start == 0).encode('utf-8')
+
+
+# ============================================================================
+# SORTIES
+# ============================================================================
+
+def write_csv_files(df, session_id, directory, parts=PARTS):
+    """
+    Écrire les fichiers d'un export dans un dossier
+
+    Returns:
+        list: (partie, chemin) des fichiers écrits
+    """
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    for part, _, filename, rows in csv_files(df, session_id, parts):
+        path = os.path.join(directory, filename)
+        _frame(df, rows).to_csv(path, index=False, encoding='utf-8')
+        written.append((part, path))
+    return written
+
+
+def zip_entries(df, session_id, parts=PARTS):
+    """
+    Entrées pour utils/zip_stream.iter_zip : chaque CSV est produit au
+    moment de son ajout à l'archive
+    """
+    return [
+        (lambda rows=rows: iter_csv(_frame(df, rows)), f'{ZIP_FOLDERS[part]}/{filename}')
+        for part, _, filename, rows in csv_files(df, session_id, parts)
+    ]
@@ -0,0 +1,503 @@
+"""
+utils/document_pipeline.py
+Génération parallèle des documents PDF d'une session
+
+1. Une seule requête groupée lit toutes les lignes de la session
+   (fetch_convocation_jobs / fetch_presence_jobs) et les découpe en jobs,
+   un par document.
+2. Les jobs sont répartis par paquets (CHUNK_SIZE au plus) sur un pool de
+   processus : le rendu ReportLab est du calcul pur, limité par le GIL
+   dans un même processus.
+3. La progression de chaque génération est consultable pendant son
+   exécution (get_progress), et le rapport final donne la durée de
+   rendu de chaque document.
+
+stream_documents rend les PDF en mémoire et les remet à l'appelant au fil
+du rendu (envoi direct par email, sans passer par le disque).
+
+Régénération incrémentale : un manifeste par dossier de session garde
+l'empreinte des données de chaque document (job_hash) ; seuls les
+documents dont les données ont changé sont rendus à nouveau, et les PDF
+orphelins (enseignant qui n'a plus d'affectation...) sont supprimés.
+
+Le pool est créé à la première génération et réutilisé ensuite ; ses
+processus démarrent par forkserver (spawn à défaut), jamais par fork du
+processus Flask et de ses threads. Pour peu de documents (ou un seul
+processus disponible), le rendu reste dans le processus courant :
+démarrer des processus coûterait plus que le rendu.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from itertools import groupby
+
+from config import Config
+from utils.pdf_documents import RENDERERS, TEMPLATE_VERSION
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 16
+MIN_PARALLEL_DOCUMENTS = 8
+MANIFEST_NAME = 'manifest.json'
+
+# Préfixe des fichiers produits par type (pour retrouver les orphelins)
+ORPHAN_PREFIXES = {
+    'convocations': 'convocation_',
+    'presences_responsables': 'presence_responsable_',
+}
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+_progress = {}
+_progress_lock = threading.Lock()
+_generation_locks = {}
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def max_workers():
+    """Nombre de processus de rendu (Config.PDF_WORKERS, sinon nombre de cœurs)"""
+    return Config.PDF_WORKERS or os.cpu_count() or 1
+
+
+# ============================================================================
+# LECTURE DES DONNÉES (une requête par génération)
+# ============================================================================
+
+def fetch_convocation_jobs(db, id_session, output_dir):
+    """
+    Jobs de convocation : un par enseignant affecté dans la session
+
+    Returns:
+        list[dict]: code, nom, prenom, rows [(date, h_debut, h_fin)], path
+    """
+    cursor = db.execute("""
+        SELECT a.code_smartex_ens, e.nom_ens, e.prenom_ens,
+               a.date_examen, a.h_debut, a.h_fin
+        FROM affectation a
+        JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+        WHERE a.id_session = ?
+        ORDER BY a.code_smartex_ens, a.date_examen, a.h_debut
+    """, (id_session,))
+
+    jobs = []
+    for (code, nom, prenom), rows in groupby(cursor, key=lambda r: (r[0], r[1], r[2])):
+        jobs.append({
+            'code': code,
+            'nom': nom,
+            'prenom': prenom,
+            'rows': [(r[3], r[4], r[5]) for r in rows],
+            'path': os.path.join(output_dir, f"convocation_{code}_{nom}_{prenom}_{id_session}.pdf"),
+        })
+    return jobs
+
+
+def fetch_presence_jobs(db, id_session, output_dir):
+    """
+    Jobs de présence : un par responsable absent de la session
+
+    Les responsables sans créneau de responsabilité dans la session ont
+    un job sans lignes (aucun document à produire).
+
+    Returns:
+        list[dict]: code, nom, prenom, rows [(dateExam, h_debut, h_fin)], path
+    """
+    cursor = db.execute("""
+        SELECT r.code_smartex_ens, r.nom, r.prenom,
+               c.dateExam, c.h_debut, c.h_fin
+        FROM (
+            SELECT DISTINCT code_smartex_ens, nom, prenom
+            FROM responsable_absent_jour_examen
+            WHERE id_session = ?
+        ) r
+        LEFT JOIN creneau c
+            ON c.id_session = ? AND c.enseignant = r.code_smartex_ens
+        ORDER BY r.code_smartex_ens, r.nom, r.prenom, c.dateExam, c.h_debut
+    """, (id_session, id_session))
+
+    jobs = []
+    for (code, nom, prenom), rows in groupby(cursor, key=lambda r: (r[0], r[1], r[2])):
+        jobs.append({
+            'code': code,
+            'nom': nom,
+            'prenom': prenom,
+            'rows': [(r[3], r[4], r[5]) for r in rows if r[3] is not None],
+            'path': os.path.join(output_dir, f"presence_responsable_{nom}_{prenom}_{id_session}.pdf"),
+        })
+    return jobs
+
+
+# ============================================================================
+# RENDU
+# ============================================================================
+
+def _render_chunk(kind, jobs, in_memory=False, save=True):
+    """
+    Rendre un paquet de documents (exécuté dans un processus de travail)
+
+    Args:
+        in_memory: renvoyer le contenu du PDF (clé 'pdf') au lieu de
+                   seulement l'écrire ; save indique s'il faut aussi
+                   l'écrire sur le disque
+
+    Returns:
+        list[dict]: fichier, duree, erreur (None si succès)[, pdf]
+    """
+    render = RENDERERS[kind]
+    results = []
+    for job in jobs:
+        start = time.perf_counter()
+        error = None
+        pdf = None
+        try:
+            if in_memory:
+                buffer = io.BytesIO()
+                render(dict(job, path=buffer))
+                pdf = buffer.getvalue()
+                if save:
+                    _write_atomic(job['path'], pdf)
+            else:
+                render(job)
+        except Exception as e:
+            error = str(e)
+        result = {
+            'code': job['code'],
+            'fichier': os.path.basename(job['path']),
+            'duree': round(time.perf_counter() - start, 4),
+            'erreur': error,
+        }
+        if in_memory:
+            result['pdf'] = pdf
+        results.append(result)
+    return results
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _pool_context():
+    """
+    Démarrage des processus sans fork du processus Flask : celui-ci a déjà
+    des threads (répartiteur d'emails, imports, serveur) dont un verrou
+    hérité pourrait bloquer un processus de travail
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _get_pool():
+    """
+    Pool partagé, dimensionné sur max_workers() et non sur le premier
+    appelant (recréé si la configuration change). Les processus ne sont
+    démarrés qu'à la demande.
+    """
+    global _pool, _pool_workers
+    size = max_workers()
+    with _pool_lock:
+        if _pool is not None and _pool_workers != size:
+            # Les rendus déjà soumis à l'ancien pool se terminent normalement
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=_pool_context())
+            _pool_workers = size
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _chunks(jobs, workers):
+    """Paquets assez petits pour équilibrer la charge entre processus"""
+    size = max(1, min(CHUNK_SIZE, math.ceil(len(jobs) / (workers * 4))))
+    return [jobs[i:i + size] for i in range(0, len(jobs), size)]
+
+
+# ============================================================================
+# MANIFESTE (régénération incrémentale)
+# ============================================================================
+
+def job_hash(kind, job):
+    """
+    Empreinte des données d'un document
+
+    Couvre le destinataire, ses lignes (date, h_debut, h_fin) et la version
+    des gabarits. La date d'approbation de l'en-tête n'en fait pas partie :
+    un document inchangé n'est pas régénéré pour elle.
+    """
+    payload = json.dumps([TEMPLATE_VERSION, kind, job['nom'], job['prenom'], job['rows']],
+                         ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def load_manifest(output_dir):
+    """Manifeste du dossier (vide s'il n'existe pas ou est illisible)"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest.get('documents'), dict):
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'documents': {}}
+
+
+def save_manifest(output_dir, manifest):
+    """Écriture atomique du manifeste (fichier temporaire puis renommage)"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _orphans(kind, id_session, output_dir, current):
+    """PDF de ce type et de cette session qui ne correspondent plus à aucun job"""
+    prefix = ORPHAN_PREFIXES[kind]
+    suffix = f"_{id_session}.pdf"
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
+        return []
+    return [name for name in names
+            if name.startswith(prefix) and name.endswith(suffix) and name not in current]
+
+
+def _generation_lock(kind, id_session):
+    """Une seule génération à la fois par type et par session (manifeste partagé)"""
+    with _progress_lock:
+        return _generation_locks.setdefault((kind, id_session), threading.Lock())
+
+
+# ============================================================================
+# GÉNÉRATION
+# ============================================================================
+
+def render_documents(kind, id_session, jobs, force=False):
+    """
+    Rendre les documents d'une session dont les données ont changé
+
+    Un manifeste par dossier (manifest.json) garde l'empreinte des données
+    de chaque document. Ne sont rendus que les documents nouveaux, modifiés
+    ou dont le fichier a disparu ; les PDF qui ne correspondent plus à
+    aucun job sont supprimés.
+
+    Args:
+        kind: 'convocations' ou 'presences_responsables'
+        id_session: session (pour le suivi de progression)
+        jobs: jobs produits par fetch_*_jobs (ceux sans lignes sont ignorés)
+        force: tout régénérer sans consulter le manifeste
+
+    Returns:
+        dict: generes, inchanges, supprimes, erreurs, processus,
+              duree_totale, duree_moyenne_document, documents
+    """
+    jobs = [job for job in jobs if job['rows']]
+    if not jobs:
+        output_dir = None
+    else:
+        output_dir = os.path.dirname(jobs[0]['path'])
+
+    with _generation_lock(kind, id_session):
+        manifest = load_manifest(output_dir) if output_dir else {'documents': {}}
+        known = manifest['documents']
+
+        current = {}
+        to_render = []
+        for job in jobs:
+            name = os.path.basename(job['path'])
+            current[name] = job_hash(kind, job)
+            entry = known.get(name)
+            if (force or entry is None or entry.get('hash') != current[name]
+                    or not os.path.exists(job['path'])):
+                to_render.append(job)
+
+        supprimes = []
+        if output_dir:
+            for name in _orphans(kind, id_session, output_dir, current):
+                try:
+                    os.remove(os.path.join(output_dir, name))
+                    supprimes.append(name)
+                except OSError as e:
+                    logger.warning("Impossible de supprimer %s : %s", name, e)
+
+        rapport = _render_all(kind, id_session, to_render, unchanged=len(jobs) - len(to_render))
+
+        if output_dir:
+            documents = {name: entry for name, entry in known.items() if name in current}
+            for doc in rapport['documents']:
+                if doc['erreur']:
+                    # Réessayé à la prochaine génération
+                    documents.pop(doc['fichier'], None)
+                else:
+                    documents[doc['fichier']] = {
+                        'hash': current[doc['fichier']],
+                        'code': doc['code'],
+                        'generated_at': _now(),
+                    }
+            save_manifest(output_dir, {
+                'type': kind,
+                'id_session': id_session,
+                'template_version': TEMPLATE_VERSION,
+                'documents': documents,
+            })
+
+    rapport['inchanges'] = len(jobs) - len(to_render)
+    rapport['supprimes'] = sorted(supprimes)
+    return rapport
+
+
+def stream_documents(kind, id_session, jobs, on_document, save=False):
+    """
+    Rendre des documents en mémoire et les transmettre au fil du rendu
+
+    Aucun aller-retour par le disque : chaque PDF est remis à
+    on_document(job, pdf) dès la fin de son paquet, pendant que les paquets
+    suivants sont encore en cours de rendu.
+
+    Args:
+        save: écrire aussi une copie sur disque (le manifeste du dossier
+              est alors mis à jour comme pour render_documents)
+
+    Returns:
+        dict: rapport de _render_all (sans le contenu des PDF)
+    """
+    jobs = [job for job in jobs if job['rows']]
+    by_name = {os.path.basename(job['path']): job for job in jobs}
+
+    def on_chunk(results):
+        for result in results:
+            if not result['erreur']:
+                on_document(by_name[result['fichier']], result['pdf'])
+
+    if not save or not jobs:
+        return _render_all(kind, id_session, jobs, in_memory=True, save=False, on_chunk=on_chunk)
+
+    output_dir = os.path.dirname(jobs[0]['path'])
+    os.makedirs(output_dir, exist_ok=True)
+    with _generation_lock(kind, id_session):
+        rapport = _render_all(kind, id_session, jobs, in_memory=True, save=True, on_chunk=on_chunk)
+        manifest = load_manifest(output_dir)
+        for doc in rapport['documents']:
+            if not doc['erreur']:
+                manifest['documents'][doc['fichier']] = {
+                    'hash': job_hash(kind, by_name[doc['fichier']]),
+                    'code': doc['code'],
+                    'generated_at': _now(),
+                }
+        manifest.update(type=kind, id_session=id_session, template_version=TEMPLATE_VERSION)
+        save_manifest(output_dir, manifest)
+    return rapport
+
+
+def _render_all(kind, id_session, jobs, unchanged=0, in_memory=False, save=True, on_chunk=None):
+    """
+    Rendre une liste de jobs (en parallèle si possible) avec suivi de progression
+
+    on_chunk(results) est appelé dans le thread appelant à la fin de chaque
+    paquet (avec le contenu des PDF si in_memory) : l'appelant peut traiter
+    les premiers documents pendant le rendu des suivants.
+    """
+    workers = min(max_workers(), max(1, len(jobs)))
+    parallel = workers > 1 and len(jobs) >= MIN_PARALLEL_DOCUMENTS
+
+    progress = {
+        'type': kind,
+        'id_session': id_session,
+        'status': 'en_cours',
+        'total': len(jobs),
+        'termines': 0,
+        'erreurs': 0,
+        'inchanges': unchanged,
+        'processus': workers if parallel else 1,
+        'started_at': _now(),
+        'finished_at': None,
+    }
+    with _progress_lock:
+        _progress[(kind, id_session)] = progress
+
+    documents = []
+
+    def record(results):
+        with _progress_lock:
+            progress['termines'] += len(results)
+            progress['erreurs'] += sum(1 for r in results if r['erreur'])
+        if on_chunk:
+            on_chunk(results)
+        documents.extend({k: v for k, v in r.items() if k != 'pdf'} for r in results)
+
+    start = time.perf_counter()
+    print(f"📄 Génération de {len(jobs)} document(s) {kind} - session {id_session} "
+          f"({unchanged} inchangé(s), {progress['processus']} processus)")
+
+    chunks = _chunks(jobs, workers)
+    if parallel:
+        pending = dict(enumerate(chunks))
+        try:
+            pool = _get_pool()
+            futures = {pool.submit(_render_chunk, kind, chunk, in_memory, save): i
+                       for i, chunk in pending.items()}
+            for future in as_completed(futures):
+                record(future.result())
+                pending.pop(futures[future])
+        except (BrokenProcessPool, RuntimeError):
+            # Processus de travail tué (ou pool remplacé entre-temps) :
+            # terminer dans le processus courant
+            logger.exception("Pool de rendu PDF interrompu, reprise en série")
+            _reset_pool()
+            for chunk in pending.values():
+                record(_render_chunk(kind, chunk, in_memory, save))
+    else:
+        for chunk in chunks:
+            record(_render_chunk(kind, chunk, in_memory, save))
+
+    elapsed = time.perf_counter() - start
+    erreurs = [d for d in documents if d['erreur']]
+    with _progress_lock:
+        progress['status'] = 'erreur' if erreurs else 'termine'
+        progress['finished_at'] = _now()
+        progress['duree_totale'] = round(elapsed, 3)
+
+    print(f"✅ {len(documents) - len(erreurs)}/{len(jobs)} document(s) en {elapsed:.2f}s")
+    return {
+        'generes': len(documents) - len(erreurs),
+        'erreurs': erreurs,
+        'processus': progress['processus'],
+        'duree_totale': round(elapsed, 3),
+        'duree_moyenne_document': round(
+            sum(d['duree'] for d in documents) / len(documents), 4
+        ) if documents else 0,
+        'documents': sorted(documents, key=lambda d: d['fichier']),
+    }
+
+
+def get_progress(id_session=None):
+    """Progression des générations (en cours ou dernières terminées)"""
+    with _progress_lock:
+        return [
+            dict(p) for p in _progress.values()
+            if id_session is None or p['id_session'] == id_session
+        ]
@@ -0,0 +1,404 @@
+"""
+utils/email_outbox.py
+File d'envoi durable des emails (table email_outbox) et répartiteur
+
+Les envois en masse ne se font plus dans la requête HTTP : les messages
+sont d'abord enregistrés dans email_outbox (un lot = un batch_id), puis
+envoyés par un répartiteur en tâche de fond. Si le processus s'arrête en
+cours de route, la table indique exactement ce qui est parti ; le
+répartiteur reprend les messages restants au redémarrage.
+
+Idempotence : un message est identifié par (session, enseignant, empreinte
+du document). Relancer un envoi ne renvoie pas une convocation déjà
+envoyée ; un document modifié (nouvelle empreinte) est envoyé à nouveau,
+et les messages non envoyés de l'ancienne version sont marqués remplacés.
+
+Statuts : en_attente -> en_cours -> envoyé
+                                 -> en_attente (erreur SMTP, nouvel essai plus tard)
+                                 -> échec (erreur définitive ou trop d'essais)
+           en_attente / en_cours / échec -> remplacé (document modifié avant l'envoi)
+
+Le PDF joint est lu sur le disque (pdf_path) ou, pour les documents rendus
+en mémoire, stocké dans la ligne (pdf_data, vidé une fois le message envoyé).
+
+Un message "en_cours" est réservé jusqu'à next_attempt_at (bail) : si le
+processus meurt pendant l'envoi, il redevient disponible à l'expiration du
+bail, sans qu'un autre processus ne l'envoie en double entre-temps.
+"""
+
+import hashlib
+import logging
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 30          # secondes avant le 2e essai, doublées ensuite
+BACKOFF_MAX = 3600
+LEASE_SECONDS = 600        # réservation d'un message en cours d'envoi
+IDLE_POLL = 30             # réveil périodique du répartiteur sans travail
+
+STATUSES = ['en_attente', 'en_cours', 'envoyé', 'échec', 'remplacé']
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+# ============================================================================
+# TABLE
+# ============================================================================
+
+def ensure_outbox_table(db):
+    """Créer la table email_outbox si elle n'existe pas"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id TEXT NOT NULL,
+            id_session INTEGER NOT NULL,
+            code_smartex_ens INTEGER NOT NULL,
+            doc_hash TEXT NOT NULL,
+            to_email TEXT NOT NULL,
+            to_name TEXT,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            pdf_path TEXT,
+            pdf_filename TEXT,
+            pdf_data BLOB,
+            status TEXT NOT NULL DEFAULT 'en_attente',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at TEXT,
+            UNIQUE (id_session, code_smartex_ens, doc_hash)
+        )
+    """)
+    columns = {row[1] for row in db.execute("PRAGMA table_info(email_outbox)").fetchall()}
+    if 'pdf_data' not in columns:
+        # Tables créées avant l'envoi direct (PDF rendus en mémoire)
+        db.execute("ALTER TABLE email_outbox ADD COLUMN pdf_data BLOB")
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_status
+        ON email_outbox(status, next_attempt_at)
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_email_outbox_batch
+        ON email_outbox(batch_id)
+    """)
+
+
+def document_hash(pdf_path, manifest=None):
+    """
+    Empreinte d'un document joint
+
+    L'empreinte des données du manifeste de génération est préférée : un
+    PDF régénéré à l'identique (date de création différente) garde ainsi
+    la même empreinte. À défaut, SHA-256 du fichier.
+    """
+    if manifest:
+        entry = manifest.get('documents', {}).get(os.path.basename(pdf_path))
+        if entry and entry.get('hash'):
+            return entry['hash']
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ============================================================================
+# FILE D'ENVOI
+# ============================================================================
+
+def enqueue_batch(db, id_session, messages, batch_id=None):
+    """
+    Enregistrer un lot de messages (idempotent)
+
+    Args:
+        messages: liste de dicts code_smartex_ens, doc_hash, to_email,
+                  to_name, subject, body, pdf_path, pdf_filename et
+                  éventuellement pdf_data (PDF en mémoire, prioritaire
+                  sur pdf_path)
+        batch_id: lot existant à compléter (envoi au fil du rendu)
+
+    Un message déjà envoyé n'est pas remis en file. Un message encore en
+    file (lot précédent interrompu) ou en échec rejoint le nouveau lot,
+    avec les coordonnées à jour. Les messages non envoyés du même
+    enseignant pour un autre document sont remplacés (supersede_stale).
+
+    Returns:
+        tuple: (batch_id, {'ajoutes': n, 'deja_envoyes': n, 'repris': n})
+    """
+    ensure_outbox_table(db)
+    batch_id = batch_id or uuid.uuid4().hex
+    stats = {'ajoutes': 0, 'deja_envoyes': 0, 'repris': 0}
+
+    for message in messages:
+        key = (id_session, message['code_smartex_ens'], message['doc_hash'])
+        supersede_stale(db, *key)
+        existing = db.execute("""
+            SELECT id, status FROM email_outbox
+            WHERE id_session = ? AND code_smartex_ens = ? AND doc_hash = ?
+        """, key).fetchone()
+
+        if existing is None:
+            db.execute("""
+                INSERT INTO email_outbox (
+                    batch_id, id_session, code_smartex_ens, doc_hash,
+                    to_email, to_name, subject, body, pdf_path, pdf_filename, pdf_data
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (batch_id, *key, message['to_email'], message.get('to_name'),
+                  message['subject'], message['body'], message.get('pdf_path'),
+                  message.get('pdf_filename'), message.get('pdf_data')))
+            stats['ajoutes'] += 1
+        elif existing['status'] == 'envoyé':
+            stats['deja_envoyes'] += 1
+        else:
+            # Un message en cours d'envoi garde son bail
+            db.execute("""
+                UPDATE email_outbox
+                SET batch_id = ?, to_email = ?, to_name = ?, subject = ?, body = ?,
+                    pdf_path = ?, pdf_filename = ?, pdf_data = ?, last_error = NULL,
+                    attempts = CASE WHEN status IN ('échec', 'remplacé') THEN 0 ELSE attempts END,
+                    next_attempt_at = CASE WHEN status = 'en_cours' THEN next_attempt_at ELSE 0 END,
+                    status = CASE WHEN status IN ('échec', 'remplacé') THEN 'en_attente' ELSE status END
+                WHERE id = ?
+            """, (batch_id, message['to_email'], message.get('to_name'),
+                  message['subject'], message['body'], message.get('pdf_path'),
+                  message.get('pdf_filename'), message.get('pdf_data'), existing['id']))
+            stats['repris'] += 1
+
+    db.commit()
+    return batch_id, stats
+
+
+def supersede_stale(db, id_session, code_smartex_ens, doc_hash):
+    """
+    Marquer remplacés les messages non envoyés d'un enseignant pour un autre
+    document que doc_hash (lot interrompu puis données modifiées) : seul le
+    document à jour part, l'enseignant n'est pas convoqué deux fois
+
+    Un message en cours d'envoi ne peut plus être retenu : s'il échoue, il
+    n'est pas réessayé (voir _record).
+
+    Returns:
+        int: messages remplacés
+    """
+    ensure_outbox_table(db)
+    cursor = db.execute("""
+        UPDATE email_outbox
+        SET status = 'remplacé', pdf_data = NULL, last_error = NULL
+        WHERE id_session = ? AND code_smartex_ens = ? AND doc_hash != ?
+          AND status IN ('en_attente', 'en_cours', 'échec')
+    """, (id_session, code_smartex_ens, doc_hash))
+    return cursor.rowcount
+
+
+def batch_status(db, batch_id, with_messages=True):
+    """
+    État d'un lot : compteurs par statut et détail des messages
+
+    Returns:
+        dict ou None si le lot est inconnu
+    """
+    ensure_outbox_table(db)
+    rows = db.execute("""
+        SELECT id, id_session, code_smartex_ens, to_email, to_name, pdf_filename,
+               status, attempts, next_attempt_at, last_error, created_at, sent_at
+        FROM email_outbox
+        WHERE batch_id = ?
+        ORDER BY id
+    """, (batch_id,)).fetchall()
+    if not rows:
+        return None
+
+    counts = {status: 0 for status in STATUSES}
+    for row in rows:
+        counts[row['status']] = counts.get(row['status'], 0) + 1
+    termine = counts['en_attente'] == 0 and counts['en_cours'] == 0
+
+    status = {
+        'batch_id': batch_id,
+        'id_session': rows[0]['id_session'],
+        'status': 'terminé' if termine else 'en_cours',
+        'total': len(rows),
+        'counts': counts,
+    }
+    if with_messages:
+        now = time.time()
+        status['messages'] = [{
+            'id': row['id'],
+            'code_smartex_ens': row['code_smartex_ens'],
+            'email': row['to_email'],
+            'enseignant': row['to_name'],
+            'filename': row['pdf_filename'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'next_attempt_in': (max(0, round(row['next_attempt_at'] - now))
+                                if row['status'] == 'en_attente' else None),
+            'last_error': row['last_error'],
+            'sent_at': row['sent_at'],
+        } for row in rows]
+    return status
+
+
+# ============================================================================
+# RÉPARTITEUR
+# ============================================================================
+
+def _claim(db, limit):
+    """Réserver les prochains messages à envoyer (atomique entre processus)"""
+    now = time.time()
+    rows = db.execute("""
+        UPDATE email_outbox
+        SET status = 'en_cours', attempts = attempts + 1, next_attempt_at = ?
+        WHERE id IN (
+            SELECT id FROM email_outbox
+            WHERE status IN ('en_attente', 'en_cours') AND next_attempt_at <= ?
+            ORDER BY next_attempt_at, id
+            LIMIT ?
+        )
+        RETURNING id, to_email, to_name, subject, body, pdf_path, pdf_filename, pdf_data, attempts
+    """, (now + LEASE_SECONDS, now, limit)).fetchall()
+    db.commit()
+    return [dict(row) for row in rows]
+
+
+def _next_due(db):
+    """Délai (secondes) avant le prochain message à envoyer, None si la file est vide"""
+    row = db.execute("""
+        SELECT MIN(next_attempt_at) FROM email_outbox
+        WHERE status IN ('en_attente', 'en_cours')
+    """).fetchone()
+    if row[0] is None:
+        return None
+    return max(0.0, row[0] - time.time())
+
+
+def is_retryable(error):
+    """
+    Une erreur d'envoi justifie-t-elle un nouvel essai ?
+
+    Les erreurs SMTP temporaires (4xx, connexion, authentification) sont
+    réessayées ; un destinataire refusé (5xx) ou un PDF absent ne le sont pas.
+    """
+    if isinstance(error, FileNotFoundError):
+        return False
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code < 500
+    return isinstance(error, (smtplib.SMTPException, OSError))
+
+
+def backoff_delay(attempts):
+    """Délai exponentiel avant l'essai suivant (attempts = essais déjà faits)"""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** max(0, attempts - 1))
+
+
+def _record(db, message, error):
+    """Enregistrer le résultat d'un envoi"""
+    if error is None:
+        db.execute("""
+            UPDATE email_outbox
+            SET status = 'envoyé', sent_at = ?, last_error = NULL, pdf_data = NULL
+            WHERE id = ?
+        """, (_now(), message['id']))
+    elif is_retryable(error) and message['attempts'] < MAX_ATTEMPTS:
+        # Un message remplacé pendant l'envoi n'est pas remis en file
+        db.execute("""
+            UPDATE email_outbox
+            SET status = 'en_attente', next_attempt_at = ?, last_error = ?
+            WHERE id = ? AND status = 'en_cours'
+        """, (time.time() + backoff_delay(message['attempts']), str(error), message['id']))
+    else:
+        db.execute("""
+            UPDATE email_outbox
+            SET status = 'échec', last_error = ?
+            WHERE id = ? AND status = 'en_cours'
+        """, (str(error), message['id']))
+    db.commit()
+
+
+class OutboxDispatcher:
+    """
+    Thread d'envoi : réserve des messages dans email_outbox et les confie
+    à un pool de threads (une connexion SMTP par thread)
+
+    Args:
+        deliver: fonction(message) qui envoie un message (dict de la table)
+                 et lève une exception en cas d'échec
+        workers: envois simultanés
+    """
+
+    def __init__(self, deliver, workers=None, db_name=None):
+        self.deliver = deliver
+        self.workers = max(1, workers or Config.SMTP_POOL_SIZE)
+        self.db_name = db_name or Config.DB_NAME
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Démarrer le thread s'il ne tourne pas déjà"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-outbox', daemon=True)
+                self._thread.start()
+        self.wake()
+
+    def wake(self):
+        """Signaler de nouveaux messages"""
+        self._wake.set()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_name, timeout=30)
+        db.row_factory = sqlite3.Row
+        ensure_outbox_table(db)
+        db.commit()
+        return db
+
+    def _deliver(self, message):
+        try:
+            self.deliver(message)
+            return None
+        except Exception as e:
+            return e
+
+    def _run(self):
+        db = self._connect()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='email-outbox')
+        try:
+            while True:
+                self._wake.clear()
+                messages = _claim(db, self.workers * 2)
+                if not messages:
+                    delay = _next_due(db)
+                    self._wake.wait(IDLE_POLL if delay is None else min(IDLE_POLL, delay))
+                    continue
+
+                futures = {executor.submit(self._deliver, message): message for message in messages}
+                # Résultat enregistré dès la fin de chaque envoi
+                for future in as_completed(futures):
+                    message = futures[future]
+                    error = future.result()
+                    if error is not None:
+                        logger.warning("Email %s vers %s : %s", message['id'], message['to_email'], error)
+                    _record(db, message, error)
+        except Exception as e:
+            logger.error(f"Répartiteur email arrêté : {str(e)}")
+        finally:
+            executor.shutdown(wait=False)
+            db.close()
@@ -0,0 +1,117 @@
+"""
+utils/file_reader.py
+Lecture en flux (par morceaux) des fichiers Excel/CSV importés
+
+Le fichier n'est jamais chargé entièrement en mémoire :
+- CSV  : encodage et séparateur détectés sur le premier bloc,
+         puis lecture par pd.read_csv(chunksize=...)
+- XLSX : openpyxl en mode read_only, lignes regroupées par paquets
+- XLS  : xlrd ne sait pas lire en flux, le fichier est lu puis découpé
+
+Chaque morceau est un DataFrame dont l'index continue celui du morceau
+précédent (0, 1, 2, ...), ce qui garde des numéros de ligne cohérents
+dans les messages d'erreur.
+"""
+
+import csv
+import os
+import codecs
+import pandas as pd
+
+DEFAULT_CHUNKSIZE = 5000
+SNIFF_BLOCK_SIZE = 64 * 1024
+CANDIDATE_ENCODINGS = ['utf-8-sig', 'cp1252', 'latin1']
+CANDIDATE_DELIMITERS = ',;\t|'
+
+
+def sniff_csv_format(filepath, block_size=SNIFF_BLOCK_SIZE):
+    """
+    Détecter l'encodage et le séparateur d'un CSV à partir du premier bloc
+
+    Returns:
+        tuple: (encoding, delimiter)
+    """
+    with open(filepath, 'rb') as f:
+        block = f.read(block_size)
+
+    encoding = 'latin1'
+    text = ''
+    for candidate in CANDIDATE_ENCODINGS:
+        # Décodeur incrémental : un caractère multi-octets coupé en fin de
+        # bloc ne doit pas faire rejeter l'UTF-8
+        decoder = codecs.getincrementaldecoder(candidate)()
+        try:
+            text = decoder.decode(block, final=False)
+            encoding = candidate
+            break
+        except UnicodeDecodeError:
+            continue
+
+    # Ne garder que des lignes complètes pour le sniffer
+    sample = text.rsplit('\n', 1)[0] if '\n' in text else text
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=CANDIDATE_DELIMITERS).delimiter
+    except csv.Error:
+        header = sample.split('\n', 1)[0]
+        delimiter = max(CANDIDATE_DELIMITERS, key=header.count)
+        if header.count(delimiter) == 0:
+            delimiter = ','
+
+    return encoding, delimiter
+
+
+def _iter_csv_chunks(filepath, chunksize):
+    encoding, delimiter = sniff_csv_format(filepath)
+    reader = pd.read_csv(filepath, encoding=encoding, sep=delimiter,
+                         chunksize=chunksize, dtype=str, keep_default_na=True)
+    for chunk in reader:
+        yield chunk
+
+
+def _iter_xlsx_chunks(filepath, chunksize):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f'Unnamed: {i}' for i, c in enumerate(header)]
+
+        start = 0
+        batch = []
+        for values in rows:
+            if values is None or all(v is None for v in values):
+                continue
+            batch.append(values[:len(columns)])
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns, index=range(start, start + len(batch)))
+    finally:
+        wb.close()
+
+
+def _iter_xls_chunks(filepath, chunksize):
+    df = pd.read_excel(filepath)
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def iter_file_chunks(filepath, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Itérer sur un fichier Excel/CSV par morceaux de `chunksize` lignes
+
+    Yields:
+        DataFrame: colonnes du fichier, index continu d'un morceau à l'autre
+    """
+    file_ext = os.path.splitext(filepath)[1].lower()
+    if file_ext == '.xlsx':
+        return _iter_xlsx_chunks(filepath, chunksize)
+    if file_ext == '.xls':
+        return _iter_xls_chunks(filepath, chunksize)
+    return _iter_csv_chunks(filepath, chunksize)
@@ -0,0 +1,230 @@
+"""
+utils/http_cache.py
+GET conditionnels (ETag / Last-Modified) pour les routes de lecture
+
+Chaque session a un numéro de version de ses données, incrémenté après
+toute requête d'écriture qui la concerne (POST/PUT/PATCH/DELETE sous /api,
+ainsi que les GET qui génèrent des fichiers), dès qu'elle a atteint sa vue :
+même en erreur, elle a pu écrire une partie des données ou des fichiers. Une écriture dont
+la session n'est pas identifiable (ou qui touche des données communes :
+enseignants, grades, imports) incrémente la version globale, qui invalide
+toutes les sessions.
+
+Les réponses JSON des routes de lecture portent un ETag dérivé de ces
+versions. Une requête `If-None-Match` / `If-Modified-Since` encore valide
+reçoit un 304 dès before_request, sans exécuter la vue ni interroger SQLite.
+
+Les versions vivent en mémoire du processus, préfixées par un identifiant
+de démarrage : un redémarrage invalide tous les ETags. Les écritures faites
+hors requête (jobs en tâche de fond) appellent bump_data_version().
+
+Limite : les versions ne sont pas partagées entre processus. Avec plusieurs
+workers (gunicorn -w N...), une écriture traitée par l'un n'invalide pas
+les ETags des autres, qui peuvent répondre 304 sur des données périmées :
+servir l'application avec un seul processus (threads possibles), ou
+désactiver ce module.
+"""
+
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app, g, request
+
+# Routes de lecture concernées
+CONDITIONAL_PREFIXES = (
+    '/api/statistics',
+    '/api/affectations',
+    '/api/optimize/stats',
+    '/api/optimize/workload',
+    '/api/optimize/validate',
+    '/api/optimize/reserves',
+    '/api/presence',
+    '/api/storage',
+)
+
+# Routes de lecture hors de ces préfixes
+CONDITIONAL_ENDPOINTS = {
+    'sessions.get_session_bundle',
+}
+
+# Routes sous ces préfixes dont la réponse ne dépend pas des données versionnées
+UNCACHED_ENDPOINTS = {
+    'affectations.get_documents_progress',
+}
+
+# GET qui écrivent des fichiers : traités comme des écritures
+GENERATING_ENDPOINTS = {
+    'affectations.generate_convocations',
+    'affectations.generate_presences_responsables',
+    'affectations.generate_affectation_pdf',
+    'affectations.generate_affectations_csv',
+    'affectations.generate_convocations_csv',
+}
+
+# Écritures sur des données communes à toutes les sessions
+GLOBAL_PREFIXES = ('/api/upload', '/api/enseignants', '/api/grades')
+
+SESSION_KEYS = ('id_session', 'session_id')
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+_lock = threading.Lock()
+_epoch = uuid.uuid4().hex[:8]
+_started = int(time.time())
+_clock = 0
+_global = {'version': 0, 'modified': 0}
+_sessions = {}
+_total = {'version': 0, 'modified': 0}
+
+
+# ============================================================================
+# VERSIONS
+# ============================================================================
+
+def _tick():
+    """Horloge à la seconde, strictement croissante d'une écriture à l'autre"""
+    global _clock
+    _clock = max(int(time.time()), _clock + 1)
+    return _clock
+
+
+def bump_data_version(id_session=None):
+    """
+    Signaler une modification des données
+
+    Args:
+        id_session: session modifiée (None = données communes à toutes)
+    """
+    with _lock:
+        now = _tick()
+        if id_session is None:
+            _global['version'] += 1
+            _global['modified'] = now
+        else:
+            entry = _sessions.setdefault(int(id_session), {'version': 0, 'modified': 0})
+            entry['version'] += 1
+            entry['modified'] = now
+        _total['version'] += 1
+        _total['modified'] = now
+
+
+def current_version(id_session=None):
+    """
+    ETag et date de dernière modification des données d'une session
+
+    Sans session, la version couvre toutes les sessions.
+
+    Returns:
+        tuple: (etag, last_modified datetime UTC)
+    """
+    with _lock:
+        if id_session is None:
+            tag = f"{_epoch}-all-{_total['version']}"
+            modified = _total['modified']
+        else:
+            entry = _sessions.get(int(id_session), {'version': 0, 'modified': 0})
+            tag = f"{_epoch}-s{int(id_session)}-{_global['version']}.{entry['version']}"
+            modified = max(_global['modified'], entry['modified'])
+    # Avant toute écriture : date de démarrage du processus
+    modified = modified or _started
+    return tag, datetime.fromtimestamp(modified, tz=timezone.utc)
+
+
+# ============================================================================
+# HOOKS FLASK
+# ============================================================================
+
+def _request_session_id(include_body=False):
+    """Session visée par la requête (URL, query string, puis corps)"""
+    sources = [request.view_args or {}, request.args]
+    if include_body:
+        sources.append(request.get_json(silent=True) or {})
+        sources.append(request.form)
+    for source in sources:
+        if not hasattr(source, 'get'):
+            continue
+        for key in SESSION_KEYS:
+            value = source.get(key)
+            if value not in (None, ''):
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    continue
+    return None
+
+
+def _is_write():
+    return request.method in WRITE_METHODS or request.endpoint in GENERATING_ENDPOINTS
+
+
+def _is_conditional():
+    return (request.method == 'GET'
+            and request.endpoint not in GENERATING_ENDPOINTS
+            and request.endpoint not in UNCACHED_ENDPOINTS
+            and (request.path.startswith(CONDITIONAL_PREFIXES)
+                 or request.endpoint in CONDITIONAL_ENDPOINTS))
+
+
+def _before_request():
+    if not _is_conditional():
+        return None
+
+    etag, last_modified = current_version(_request_session_id())
+    g.http_cache_version = (etag, last_modified)
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since:
+        not_modified = last_modified.replace(microsecond=0) <= request.if_modified_since
+    else:
+        not_modified = False
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    return None
+
+
+def _after_request(response):
+    if not request.path.startswith('/api'):
+        return response
+
+    if _is_write():
+        # Version incrémentée dans _teardown_request
+        return response
+
+    version = g.get('http_cache_version')
+    if version and response.status_code == 200 and response.mimetype == 'application/json':
+        # Version lue AVANT la vue : une écriture concurrente ne peut que
+        # provoquer une revalidation de plus, jamais un 304 périmé
+        etag, last_modified = version
+        response.set_etag(etag, weak=True)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+    return response
+
+
+def _teardown_request(exc=None):
+    """
+    Incrémenter la version après toute écriture ayant atteint sa vue
+    (endpoint résolu), y compris en erreur ou sur exception non gérée :
+    elle a pu modifier des données ou écrire des fichiers avant d'échouer,
+    et une revalidation de trop ne coûte rien
+    """
+    if not request.path.startswith('/api') or request.endpoint is None or not _is_write():
+        return
+    if request.path.startswith(GLOBAL_PREFIXES):
+        bump_data_version()
+    else:
+        bump_data_version(_request_session_id(include_body=True))
+
+
+def init_http_cache(app):
+    """Activer les GET conditionnels sur l'application"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
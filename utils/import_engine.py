@@ -0,0 +1,677 @@
+"""
+utils/import_engine.py
+Moteur d'import en masse (enseignants, créneaux, vœux)
+
+Chaque import suit le même chemin :
+1. Renommage des colonnes du fichier vers les colonnes de la base
+2. Normalisation vectorisée du DataFrame (pandas, sans iterrows)
+3. Écriture par `INSERT ... ON CONFLICT DO UPDATE` via executemany,
+   dans une seule transaction, sur des index UNIQUE dédiés
+
+Les lignes invalides ne bloquent jamais l'import : elles sont écartées
+et remontées dans la liste `errors` ("Ligne N: message").
+
+`import_file` enchaîne lecture en flux (utils/file_reader.py) et écriture :
+chaque morceau lu est normalisé et écrit avant la lecture du suivant.
+Un historique des imports (SHA-256 du fichier, empreinte de chaque ligne)
+permet d'ignorer un fichier déjà importé ou de n'appliquer que ses lignes
+modifiées.
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+import numpy as np
+import pandas as pd
+
+from utils.time_utils import parse_time
+from utils.file_reader import iter_file_chunks, DEFAULT_CHUNKSIZE
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# DÉFINITION DES IMPORTS
+# ============================================================================
+
+# Index UNIQUE servant de cible aux clauses ON CONFLICT
+UNIQUE_INDEXES = [
+    ("ux_creneau_session_salle", "creneau", ("id_session", "dateExam", "h_debut", "cod_salle")),
+    ("ux_voeu_ens_session_jour_seance", "voeu", ("code_smartex_ens", "id_session", "jour", "seance")),
+]
+
+IMPORT_SPECS = {
+    'enseignants': {
+        'table': 'enseignant',
+        'columns': ['code_smartex_ens', 'nom_ens', 'prenom_ens', 'email_ens',
+                    'grade_code_ens', 'participe_surveillance'],
+        'conflict': ['code_smartex_ens'],
+        'update': ['nom_ens', 'prenom_ens', 'email_ens',
+                   'grade_code_ens', 'participe_surveillance'],
+        'scope': None
+    },
+    'creneaux': {
+        'table': 'creneau',
+        'columns': ['id_session', 'dateExam', 'h_debut', 'h_fin', 'type_ex',
+                    'semestre', 'enseignant', 'cod_salle'],
+        'conflict': ['id_session', 'dateExam', 'h_debut', 'cod_salle'],
+        'update': ['h_fin', 'type_ex', 'semestre', 'enseignant'],
+        'scope': 'id_session'
+    },
+    'voeux': {
+        'table': 'voeu',
+        'columns': ['code_smartex_ens', 'id_session', 'jour', 'seance'],
+        'conflict': ['code_smartex_ens', 'id_session', 'jour', 'seance'],
+        'update': [],
+        'scope': 'id_session'
+    }
+}
+
+JOUR_MAP = {
+    'lundi': 1,
+    'mardi': 2,
+    'mercredi': 3,
+    'jeudi': 4,
+    'vendredi': 5,
+    'samedi': 6
+}
+
+PARTICIPE_MAP = {
+    'TRUE': 1, 'True': 1, 'true': 1, '1': 1, 1: 1, True: 1,
+    'FALSE': 0, 'False': 0, 'false': 0, '0': 0, 0: 0, False: 0
+}
+
+
+def ensure_import_indexes(db):
+    """
+    Créer les index UNIQUE nécessaires aux UPSERT s'ils n'existent pas.
+
+    Les doublons hérités des anciens imports de vœux sont supprimés
+    (on garde le plus petit voeu_id). Pour les créneaux, les doublons
+    peuvent être référencés par des affectations : on ne les touche pas
+    et l'index n'est simplement pas créé.
+
+    Returns:
+        set: noms des tables disposant de leur index de conflit
+    """
+    available = set()
+    for index_name, table, columns in UNIQUE_INDEXES:
+        cols = ', '.join(columns)
+        try:
+            db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table}({cols})")
+            available.add(table)
+        except sqlite3.IntegrityError:
+            if table != 'voeu':
+                logger.warning(f"Index {index_name} non créé : doublons existants dans {table}")
+                continue
+            db.execute(f"""
+                DELETE FROM voeu
+                WHERE voeu_id NOT IN (
+                    SELECT MIN(voeu_id) FROM voeu GROUP BY {cols}
+                )
+            """)
+            db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table}({cols})")
+            available.add(table)
+    return available
+
+
+# ============================================================================
+# MAPPING DES COLONNES
+# ============================================================================
+
+def map_enseignant_columns(df):
+    """Renommer les colonnes d'un fichier enseignants"""
+    col_mapping = {}
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if 'nom' in col_lower and 'prenom' not in col_lower:
+            col_mapping[col] = 'nom_ens'
+        elif 'prenom' in col_lower or 'prénom' in col_lower:
+            col_mapping[col] = 'prenom_ens'
+        elif 'email' in col_lower or 'mail' in col_lower:
+            col_mapping[col] = 'email_ens'
+        elif 'grade' in col_lower:
+            col_mapping[col] = 'grade_code_ens'
+        elif 'code' in col_lower and ('smartex' in col_lower or 'ens' in col_lower):
+            col_mapping[col] = 'code_smartex_ens'
+        elif 'particip' in col_lower and 'surveill' in col_lower:
+            col_mapping[col] = 'participe_surveillance'
+    return df.rename(columns=col_mapping)
+
+
+def map_creneau_columns(df):
+    """Renommer les colonnes d'un fichier de créneaux (Répartition salles)"""
+    col_mapping = {}
+    for col in df.columns:
+        col_lower = str(col).lower()
+        if 'date' in col_lower and 'exam' in col_lower:
+            col_mapping[col] = 'dateExam'
+        elif 'debut' in col_lower and 'h' in col_lower:
+            col_mapping[col] = 'h_debut'
+        elif 'fin' in col_lower and 'h' in col_lower:
+            col_mapping[col] = 'h_fin'
+        elif 'type' in col_lower and 'ex' in col_lower:
+            col_mapping[col] = 'type_ex'
+        elif 'semestre' in col_lower:
+            col_mapping[col] = 'semestre'
+        elif 'enseignant' in col_lower or 'responsable' in col_lower:
+            col_mapping[col] = 'enseignant'
+        elif 'salle' in col_lower or 'cod_salle' in col_lower:
+            col_mapping[col] = 'cod_salle'
+    return df.rename(columns=col_mapping)
+
+
+def map_voeu_columns(df):
+    """Renommer les colonnes d'un fichier de vœux (abréviation ou nom/prénom)"""
+    col_mapping = {}
+    for col in df.columns:
+        col_lower = str(col).lower()
+        # Pour abréviation
+        if 'enseignant' in col_lower and 'uuid' not in col_lower:
+            col_mapping[col] = 'abbr_ens'
+        # Pour nom/prénom même si le nom contient un point
+        elif ('nom' in col_lower and 'prenom' not in col_lower) or ('.nom' in col_lower):
+            col_mapping[col] = 'nom_ens'
+        elif ('prenom' in col_lower or 'prénom' in col_lower) or ('.prenom' in col_lower or '.prénom' in col_lower):
+            col_mapping[col] = 'prenom_ens'
+        elif 'jour' in col_lower:
+            col_mapping[col] = 'jour'
+        elif 'seance' in col_lower or 'séance' in col_lower or 'séances' in col_lower:
+            col_mapping[col] = 'seance'
+    return df.rename(columns=col_mapping)
+
+
+COLUMN_MAPPERS = {
+    'enseignants': map_enseignant_columns,
+    'creneaux': map_creneau_columns,
+    'voeux': map_voeu_columns
+}
+
+REQUIRED_COLUMNS = {
+    'enseignants': ['nom_ens', 'prenom_ens', 'grade_code_ens', 'code_smartex_ens'],
+    'creneaux': ['dateExam', 'h_debut', 'h_fin'],
+    'voeux': []
+}
+
+
+def check_required_columns(df, kind):
+    """Lever ValueError si une colonne obligatoire manque après mapping"""
+    missing = [col for col in REQUIRED_COLUMNS[kind] if col not in df.columns]
+    if missing:
+        raise ValueError(f'Colonnes manquantes: {", ".join(missing)}')
+
+
+# ============================================================================
+# NORMALISATION VECTORISÉE
+# ============================================================================
+
+def _to_int(series):
+    """Convertir une colonne en entiers nullables ("001", "7.0" -> 1, 7)"""
+    return pd.to_numeric(series, errors='coerce').round().astype('Int64')
+
+
+def _clean_text(series):
+    """Chaîne nettoyée, None pour les valeurs vides"""
+    cleaned = series.astype('string').str.strip()
+    return cleaned.mask(cleaned == '')
+
+
+def _map_unique(series, func):
+    """Appliquer une fonction scalaire une seule fois par valeur distincte"""
+    uniques = series.dropna().unique()
+    mapping = {value: func(value) for value in uniques}
+    return series.map(mapping)
+
+
+def _reject(df, mask, message, errors, offset):
+    """Écarter les lignes `mask` en enregistrant une erreur pour chacune"""
+    if mask.any():
+        errors.extend(f"Ligne {offset + idx + 1}: {message}" for idx in df.index[mask])
+    return df[~mask]
+
+
+def normalize_enseignants(df, db, offset=0):
+    """
+    Normaliser un DataFrame d'enseignants (colonnes déjà mappées)
+
+    Returns:
+        (DataFrame prêt à écrire, liste d'erreurs)
+    """
+    errors = []
+    out = pd.DataFrame(index=df.index)
+    out['code_smartex_ens'] = _to_int(df['code_smartex_ens'])
+    out['nom_ens'] = _clean_text(df['nom_ens'])
+    out['prenom_ens'] = _clean_text(df['prenom_ens'])
+    out['email_ens'] = _clean_text(df['email_ens']) if 'email_ens' in df.columns else None
+
+    # Normaliser les grades (majuscules) et mapper VA vers V
+    grades = _clean_text(df['grade_code_ens']).str.upper()
+    out['grade_code_ens'] = grades.replace('VA', 'V')
+
+    if 'participe_surveillance' in df.columns:
+        out['participe_surveillance'] = df['participe_surveillance'].map(PARTICIPE_MAP).fillna(1).astype(int)
+    else:
+        out['participe_surveillance'] = 1
+
+    known_grades = {row[0] for row in db.execute('SELECT code_grade FROM grade').fetchall()}
+
+    out = _reject(out, out['code_smartex_ens'].isna(), 'code_smartex_ens invalide', errors, offset)
+    out = _reject(out, out['nom_ens'].isna() | out['prenom_ens'].isna(), 'nom ou prénom manquant', errors, offset)
+    out = _reject(out, ~out['grade_code_ens'].isin(known_grades), 'grade inconnu', errors, offset)
+
+    return out, errors
+
+
+def normalize_creneaux(df, id_session, db, offset=0):
+    """
+    Normaliser un DataFrame de créneaux (colonnes déjà mappées)
+
+    Les heures sont normalisées au format HH:MM (parse_time appliqué
+    une seule fois par valeur distincte).
+    """
+    errors = []
+    out = pd.DataFrame(index=df.index)
+    out['id_session'] = id_session
+    out['dateExam'] = _clean_text(df['dateExam'])
+    out['h_debut'] = _map_unique(df['h_debut'], parse_time)
+    out['h_fin'] = _map_unique(df['h_fin'], parse_time)
+    for col in ('type_ex', 'semestre', 'cod_salle'):
+        out[col] = _clean_text(df[col]) if col in df.columns else None
+
+    if 'enseignant' in df.columns:
+        out['enseignant'] = _to_int(df['enseignant'])
+        known = {row[0] for row in db.execute('SELECT code_smartex_ens FROM enseignant').fetchall()}
+        unknown = out['enseignant'].notna() & ~out['enseignant'].isin(known)
+        out = _reject(out, unknown, 'enseignant responsable inconnu', errors, offset)
+    else:
+        out['enseignant'] = None
+
+    out = _reject(out, out['dateExam'].isna(), 'dateExam manquante', errors, offset)
+    out = _reject(out, out['h_debut'].isna() | out['h_fin'].isna(), 'heure invalide', errors, offset)
+
+    return out, errors
+
+
+def normalize_voeux(df, id_session, db, offset=0):
+    """
+    Normaliser un DataFrame de vœux (colonnes déjà mappées)
+
+    L'enseignant est identifié par son abréviation "P.NOM" ou, à défaut,
+    par le couple nom/prénom. La colonne séance ("S1,S2,S3") est éclatée
+    en une ligne par séance.
+    """
+    errors = []
+    enseignants = pd.read_sql_query(
+        'SELECT code_smartex_ens, nom_ens, prenom_ens FROM enseignant '
+        'WHERE nom_ens IS NOT NULL AND prenom_ens IS NOT NULL', db
+    )
+    enseignants = enseignants[(enseignants['nom_ens'] != '') & (enseignants['prenom_ens'] != '')]
+    abbr_keys = (enseignants['prenom_ens'].str[0] + '.' + enseignants['nom_ens']).str.upper()
+    abbr_to_code = dict(zip(abbr_keys, enseignants['code_smartex_ens']))
+    nomprenom_keys = enseignants['nom_ens'].str.strip().str.lower() + '\x1f' + enseignants['prenom_ens'].str.strip().str.lower()
+    nomprenom_to_code = dict(zip(nomprenom_keys, enseignants['code_smartex_ens']))
+
+    # 1. Abréviation, 2. sinon nom/prénom
+    code = pd.Series(pd.NA, index=df.index, dtype='Int64')
+    if 'abbr_ens' in df.columns:
+        code = _clean_text(df['abbr_ens']).str.upper().map(abbr_to_code).astype('Int64')
+    if 'nom_ens' in df.columns and 'prenom_ens' in df.columns:
+        keys = _clean_text(df['nom_ens']).str.lower() + '\x1f' + _clean_text(df['prenom_ens']).str.lower()
+        code = code.fillna(keys.map(nomprenom_to_code).astype('Int64'))
+
+    # Jour sous forme de nom ou de chiffre
+    if 'jour' in df.columns:
+        jour_num = pd.to_numeric(df['jour'], errors='coerce')
+        jour_num = jour_num.fillna(_clean_text(df['jour']).str.lower().map(JOUR_MAP)).round().astype('Int64')
+    else:
+        jour_num = pd.Series(pd.NA, index=df.index, dtype='Int64')
+
+    out = pd.DataFrame({'code_smartex_ens': code, 'jour': jour_num}, index=df.index)
+    out = _reject(out, out['code_smartex_ens'].isna(), 'enseignant introuvable', errors, offset)
+    out = _reject(out, out['jour'].isna(), 'jour invalide', errors, offset)
+
+    # Une ligne par séance
+    if 'seance' in df.columns:
+        seances = _clean_text(df['seance'].loc[out.index]).str.split(',')
+    else:
+        seances = pd.Series([[]] * len(out), index=out.index)
+    out = out.assign(seance=seances).explode('seance')
+    out['seance'] = _clean_text(out['seance'])
+    out = out[out['seance'].notna()]
+    out['id_session'] = id_session
+
+    return out, errors
+
+
+NORMALIZERS = {
+    'enseignants': lambda df, db, id_session, offset: normalize_enseignants(df, db, offset),
+    'creneaux': lambda df, db, id_session, offset: normalize_creneaux(df, id_session, db, offset),
+    'voeux': lambda df, db, id_session, offset: normalize_voeux(df, id_session, db, offset)
+}
+
+
+# ============================================================================
+# ÉCRITURE EN MASSE
+# ============================================================================
+
+def build_upsert_sql(spec, use_conflict=True):
+    """Construire la requête INSERT ... ON CONFLICT d'un import"""
+    columns = spec['columns']
+    sql = f"INSERT INTO {spec['table']} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    if not use_conflict:
+        return sql
+    conflict = ', '.join(spec['conflict'])
+    if spec['update']:
+        updates = ', '.join(f"{col} = excluded.{col}" for col in spec['update'])
+        return f"{sql} ON CONFLICT({conflict}) DO UPDATE SET {updates}"
+    return f"{sql} ON CONFLICT({conflict}) DO NOTHING"
+
+
+def _to_records(df, columns):
+    """Convertir un DataFrame en tuples Python natifs (NaN/NA -> None)"""
+    values = df[columns].astype(object).where(df[columns].notna(), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+def _count_rows(db, spec, scope_value):
+    if spec['scope'] is None:
+        return db.execute(f"SELECT COUNT(*) FROM {spec['table']}").fetchone()[0]
+    return db.execute(
+        f"SELECT COUNT(*) FROM {spec['table']} WHERE {spec['scope']} = ?", (scope_value,)
+    ).fetchone()[0]
+
+
+def bulk_upsert(db, kind, df, scope_value=None, use_conflict=True, offset=0):
+    """
+    Écrire un DataFrame normalisé avec executemany (sans commit)
+
+    Les doublons internes au fichier sont réduits (dernière occurrence
+    conservée). Le lot est écrit dans un SAVEPOINT : si executemany échoue
+    sur une ligne, les lignes déjà écrites sont annulées (ROLLBACK TO) puis
+    le lot est rejoué ligne par ligne, seules les lignes fautives étant
+    écartées. Sans index unique (INSERT simple), rien n'est donc écrit deux fois.
+
+    Returns:
+        dict: {'inserted', 'updated', 'ignored', 'errors'}
+    """
+    spec = IMPORT_SPECS[kind]
+    errors = []
+    if df.empty:
+        return {'inserted': 0, 'updated': 0, 'ignored': 0, 'errors': errors}
+
+    if use_conflict:
+        df = df.drop_duplicates(subset=spec['conflict'], keep='last')
+    records = _to_records(df, spec['columns'])
+    sql = build_upsert_sql(spec, use_conflict)
+
+    before = _count_rows(db, spec, scope_value)
+    written = len(records)
+    # Transaction de l'appelant ouverte d'abord : le SAVEPOINT est imbriqué
+    # et son RELEASE ne valide rien
+    if not db.in_transaction:
+        db.execute("BEGIN")
+    db.execute("SAVEPOINT bulk_upsert")
+    try:
+        db.executemany(sql, records)
+    except sqlite3.Error:
+        db.execute("ROLLBACK TO SAVEPOINT bulk_upsert")
+        written = 0
+        for idx, record in zip(df.index, records):
+            try:
+                db.execute(sql, record)
+                written += 1
+            except sqlite3.Error as e:
+                errors.append(f"Ligne {offset + idx + 1}: {str(e)}")
+    db.execute("RELEASE SAVEPOINT bulk_upsert")
+    inserted = _count_rows(db, spec, scope_value) - before
+
+    return {
+        'inserted': inserted,
+        'updated': written - inserted if spec['update'] else 0,
+        'ignored': written - inserted if not spec['update'] else 0,
+        'errors': errors
+    }
+
+
+def import_dataframe(db, kind, df, id_session=None, offset=0, indexes=None):
+    """
+    Normaliser puis écrire un DataFrame brut (colonnes du fichier)
+
+    Ne fait pas de commit : l'appelant contrôle la transaction, ce qui
+    permet d'écrire plusieurs morceaux d'un même fichier avant de valider.
+
+    Args:
+        db: connexion SQLite
+        kind: 'enseignants' | 'creneaux' | 'voeux'
+        df: DataFrame tel que lu depuis le fichier
+        id_session: session cible (créneaux/vœux)
+        offset: numéro de la première ligne de df dans le fichier
+        indexes: résultat de ensure_import_indexes (recalculé si None)
+
+    Returns:
+        dict: {'inserted', 'updated', 'ignored', 'errors'}
+    """
+    df = COLUMN_MAPPERS[kind](df)
+    check_required_columns(df, kind)
+
+    if indexes is None:
+        indexes = ensure_import_indexes(db)
+    use_conflict = kind == 'enseignants' or IMPORT_SPECS[kind]['table'] in indexes
+
+    clean_df, errors = NORMALIZERS[kind](df, db, id_session, offset)
+    result = bulk_upsert(db, kind, clean_df, scope_value=id_session,
+                         use_conflict=use_conflict, offset=offset)
+    result['errors'] = errors + result['errors']
+    return result
+
+
+# ============================================================================
+# HISTORIQUE DES IMPORTS (déduplication par contenu)
+# ============================================================================
+
+def file_sha256(filepath, block_size=1 << 20):
+    """Empreinte SHA-256 d'un fichier, calculée par blocs"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ensure_import_history_tables(db):
+    """Créer les tables d'historique des imports si elles n'existent pas"""
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS import_fichier (
+            id_import INTEGER PRIMARY KEY AUTOINCREMENT,
+            id_session INTEGER,
+            type_import TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            nom_fichier TEXT,
+            nb_lignes INTEGER NOT NULL,
+            nb_lignes_table INTEGER NOT NULL,
+            checksum_table TEXT,
+            resume TEXT,
+            date_import TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    columns = {row[1] for row in db.execute("PRAGMA table_info(import_fichier)").fetchall()}
+    if 'checksum_table' not in columns:
+        # Historique créé avant l'empreinte du contenu de la table
+        db.execute("ALTER TABLE import_fichier ADD COLUMN checksum_table TEXT")
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_import_fichier_type_session
+        ON import_fichier(type_import, id_session)
+    """)
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS import_fichier_ligne (
+            id_import INTEGER NOT NULL,
+            row_hash INTEGER NOT NULL,
+            FOREIGN KEY (id_import) REFERENCES import_fichier(id_import) ON DELETE CASCADE
+        )
+    """)
+    db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_import_fichier_ligne_import
+        ON import_fichier_ligne(id_import)
+    """)
+
+
+def _last_import(db, kind, id_session):
+    """Dernier import du même type pour la même session (ou None)"""
+    return db.execute("""
+        SELECT id_import, sha256, nb_lignes_table, checksum_table, resume
+        FROM import_fichier
+        WHERE type_import = ? AND id_session IS ?
+        ORDER BY id_import DESC
+        LIMIT 1
+    """, (kind, id_session)).fetchone()
+
+
+def _table_checksum(db, spec, scope_value):
+    """
+    Empreinte du contenu de la table cible (colonnes importées, lignes de la
+    session) : somme des empreintes de lignes, indépendante de l'ordre.
+    Toute modification manuelle (ajout, suppression, édition) la change.
+    """
+    query = f"SELECT {', '.join(spec['columns'])} FROM {spec['table']}"
+    params = ()
+    if spec['scope'] is not None:
+        query += f" WHERE {spec['scope']} = ?"
+        params = (scope_value,)
+    df = pd.read_sql_query(query, db, params=params)
+    if df.empty:
+        return '0:0'
+    total = pd.util.hash_pandas_object(df, index=False).to_numpy().sum(dtype=np.uint64)
+    return f"{len(df)}:{int(total)}"
+
+
+def _row_hashes(chunk):
+    """Empreinte 64 bits de chaque ligne (vectorisée, indépendante de l'index)"""
+    return pd.util.hash_pandas_object(chunk, index=False).to_numpy().view(np.int64)
+
+
+def _error_rows(errors):
+    """Index des lignes en erreur à partir des messages "Ligne N: ..." """
+    rows = set()
+    for message in errors:
+        try:
+            rows.add(int(message.split(':', 1)[0].split()[1]) - 1)
+        except (IndexError, ValueError):
+            continue
+    return list(rows)
+
+
+def _record_import(db, kind, id_session, sha256, filepath, stats, hashes):
+    """Enregistrer l'import et ne garder que les empreintes de lignes du dernier"""
+    spec = IMPORT_SPECS[kind]
+    resume = {k: v for k, v in stats.items() if k != 'rows'}
+    cursor = db.execute("""
+        INSERT INTO import_fichier
+            (id_session, type_import, sha256, nom_fichier, nb_lignes, nb_lignes_table,
+             checksum_table, resume)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (id_session, kind, sha256, os.path.basename(filepath), stats['rows'],
+          _count_rows(db, spec, id_session), _table_checksum(db, spec, id_session),
+          json.dumps(resume, ensure_ascii=False)))
+    id_import = cursor.lastrowid
+    db.execute("""
+        DELETE FROM import_fichier_ligne
+        WHERE id_import IN (
+            SELECT id_import FROM import_fichier
+            WHERE type_import = ? AND id_session IS ? AND id_import <> ?
+        )
+    """, (kind, id_session, id_import))
+    db.executemany("INSERT INTO import_fichier_ligne (id_import, row_hash) VALUES (?, ?)",
+                   ((id_import, int(h)) for h in hashes))
+    return id_import
+
+
+def import_file(db, kind, filepath, id_session=None, chunksize=DEFAULT_CHUNKSIZE,
+                progress=None, on_chunk=None, force=False):
+    """
+    Importer un fichier par morceaux, dans une seule transaction
+
+    Chaque morceau est écrit dès qu'il est lu : la mémoire reste bornée
+    par `chunksize` quelle que soit la taille du fichier. Le commit est
+    laissé à l'appelant.
+
+    Déduplication (sauf force=True), par rapport au dernier import du même
+    type pour la même session :
+    - fichier identique (même SHA-256) : rien n'est relu ni écrit, le
+      résumé de l'import précédent est renvoyé ('mode': 'identique')
+    - fichier proche : seules les lignes dont l'empreinte est nouvelle
+      sont appliquées ('mode': 'differentiel')
+    Si le contenu de la table cible a changé depuis cet import (ajout,
+    suppression ou modification manuelle, même à nombre de lignes égal),
+    le fichier est réimporté entièrement.
+
+    Args:
+        db: connexion SQLite
+        kind: 'enseignants' | 'creneaux' | 'voeux'
+        filepath: chemin du fichier CSV/XLSX/XLS
+        id_session: session cible (créneaux/vœux)
+        chunksize: nombre de lignes par morceau
+        progress: callback(rows_done, stats) appelé après chaque morceau
+        on_chunk: callback(chunk) recevant chaque morceau brut lu
+        force: ignorer l'historique et tout réimporter
+
+    Returns:
+        dict: {'inserted', 'updated', 'ignored', 'errors', 'rows',
+               'mode', 'unchanged_rows', 'sha256'}
+    """
+    indexes = ensure_import_indexes(db)
+    ensure_import_history_tables(db)
+
+    sha256 = file_sha256(filepath)
+    previous = None if force else _last_import(db, kind, id_session)
+    if previous is not None and previous['checksum_table'] != _table_checksum(db, IMPORT_SPECS[kind], id_session):
+        previous = None
+
+    previous_stats = json.loads(previous['resume']) if previous is not None and previous['resume'] else {}
+    if previous is not None and previous['sha256'] == sha256 and not previous_stats.get('errors'):
+        stats = previous_stats
+        stats.update({'mode': 'identique', 'sha256': sha256, 'deja_importe': True})
+        logger.info(f"Import {kind} ({os.path.basename(filepath)}): fichier identique au précédent, ignoré")
+        return stats
+
+    previous_hashes = np.empty(0, dtype=np.int64)
+    if previous is not None:
+        previous_hashes = np.fromiter(
+            (row[0] for row in db.execute(
+                "SELECT row_hash FROM import_fichier_ligne WHERE id_import = ?", (previous['id_import'],))),
+            dtype=np.int64
+        )
+
+    stats = {'inserted': 0, 'updated': 0, 'ignored': 0, 'errors': [], 'rows': 0,
+             'unchanged_rows': 0, 'mode': 'differentiel' if previous_hashes.size else 'complet',
+             'sha256': sha256}
+    all_hashes = []
+
+    for chunk in iter_file_chunks(filepath, chunksize=chunksize):
+        if on_chunk is not None:
+            on_chunk(chunk)
+        hashes = _row_hashes(chunk)
+        all_hashes.append(hashes)
+        changed = chunk[~np.isin(hashes, previous_hashes)] if previous_hashes.size else chunk
+
+        stats['rows'] += len(chunk)
+        stats['unchanged_rows'] += len(chunk) - len(changed)
+        if not changed.empty:
+            result = import_dataframe(db, kind, changed, id_session=id_session, indexes=indexes)
+            for key in ('inserted', 'updated', 'ignored'):
+                stats[key] += result[key]
+            stats['errors'].extend(result['errors'])
+            # Les lignes en erreur ne sont pas mémorisées : elles seront
+            # retentées au prochain import (ex. enseignant ajouté entre-temps)
+            failed = chunk.index.isin(_error_rows(result['errors']))
+            if failed.any():
+                all_hashes[-1] = hashes[~failed]
+
+        logger.info(f"Import {kind} ({os.path.basename(filepath)}): {stats['rows']} lignes traitées")
+        if progress is not None:
+            progress(stats['rows'], stats)
+
+    hashes = np.concatenate(all_hashes) if all_hashes else np.empty(0, dtype=np.int64)
+    _record_import(db, kind, id_session, sha256, filepath, stats, hashes)
+    return stats
@@ -0,0 +1,212 @@
+"""
+utils/import_jobs.py
+Exécution des imports de fichiers en tâche de fond
+
+Un job regroupe les fichiers d'un même upload. Ils sont importés par
+étapes successives, dans l'ordre des dépendances :
+    1. enseignants
+    2. créneaux et vœux (en parallèle : ils ne dépendent que des enseignants)
+
+Plusieurs jobs (par exemple les vœux de sessions différentes) tournent
+en parallèle dans le pool. Les imports d'enseignants et ceux qui en
+dépendent s'excluent, quel que soit le job (verrou lecteurs-rédacteur) :
+les créneaux et vœux tournent ensemble, un import d'enseignants attend
+qu'ils soient tous terminés, et aucun ne démarre pendant qu'il tourne.
+
+L'état des jobs est gardé en mémoire (process Flask) : suffisant pour
+suivre la progression depuis le frontend, pas pour survivre à un redémarrage.
+"""
+
+import copy
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from utils.http_cache import bump_data_version
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+MAX_JOBS_KEPT = 50
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='import-job')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class _SharedExclusiveLock:
+    """
+    Verrou lecteurs-rédacteur : plusieurs détenteurs partagés (imports
+    dépendants) ou un seul exclusif (import d'enseignants). Un exclusif en
+    attente bloque les nouveaux partagés, pour ne pas être retardé sans fin.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def shared(self):
+        with self._cond:
+            self._cond.wait_for(lambda: not self._exclusive and not self._waiting)
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._shared -= 1
+                self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._cond:
+            self._waiting += 1
+            self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+            self._waiting -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._exclusive = False
+                self._cond.notify_all()
+
+
+_enseignants_lock = _SharedExclusiveLock()
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def create_job(id_session, files):
+    """
+    Enregistrer un nouveau job
+
+    Args:
+        id_session: session ciblée (None si seulement des enseignants)
+        files: {file_type: {'original': ..., 'filepath': ...}}
+
+    Returns:
+        str: identifiant du job
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'id_session': id_session,
+        'status': 'en_attente',
+        'created_at': _now(),
+        'started_at': None,
+        'finished_at': None,
+        'files': {
+            file_type: {
+                'original': info.get('original'),
+                'filepath': info.get('filepath'),
+                'status': 'en_attente',
+                'rows_processed': 0,
+                'inserted': 0,
+                'updated': 0,
+                'errors': [],
+                'message': None
+            }
+            for file_type, info in files.items()
+        }
+    }
+    with _jobs_lock:
+        _jobs[job_id] = job
+        # Oublier les plus anciens jobs terminés
+        finished = [j for j in _jobs.values() if j['finished_at']]
+        for old in sorted(finished, key=lambda j: j['finished_at'])[:max(0, len(_jobs) - MAX_JOBS_KEPT)]:
+            _jobs.pop(old['job_id'], None)
+    return job_id
+
+
+def get_job(job_id):
+    """Copie de l'état d'un job (None si inconnu)"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return copy.deepcopy(job) if job else None
+
+
+def list_jobs():
+    """Copie de l'état de tous les jobs, du plus récent au plus ancien"""
+    with _jobs_lock:
+        jobs = copy.deepcopy(list(_jobs.values()))
+    return sorted(jobs, key=lambda j: j['created_at'], reverse=True)
+
+
+def _update_file(job_id, file_type, **fields):
+    with _jobs_lock:
+        _jobs[job_id]['files'][file_type].update(fields)
+
+
+def _run_task(app, job_id, file_type, func):
+    """Importer un fichier dans son propre contexte applicatif (connexion dédiée)"""
+    def progress(rows_done, stats):
+        _update_file(job_id, file_type, rows_processed=rows_done,
+                     inserted=stats['inserted'], updated=stats['updated'])
+
+    _update_file(job_id, file_type, status='en_cours')
+    try:
+        with app.app_context():
+            if file_type == 'enseignants':
+                with _enseignants_lock.exclusive():
+                    result = func(progress)
+            else:
+                # Pas d'import d'enseignants pendant tout l'import dépendant
+                with _enseignants_lock.shared():
+                    result = func(progress)
+        # Écriture hors requête : invalider les ETags (enseignants = toutes sessions)
+        bump_data_version(None if file_type == 'enseignants' else _jobs[job_id]['id_session'])
+        extra = {k: v for k, v in result.items() if k not in ('inserted', 'updated', 'errors')}
+        _update_file(job_id, file_type, status='succès',
+                     inserted=result.get('inserted', 0),
+                     updated=result.get('updated', 0),
+                     errors=result.get('errors', []), **extra)
+        return True
+    except Exception as e:
+        logger.error(f"Job {job_id} - erreur import {file_type}: {str(e)}")
+        _update_file(job_id, file_type, status='erreur', message=str(e))
+        return False
+
+
+def run_job(app, job_id, stages):
+    """
+    Exécuter un job étape par étape (bloquant)
+
+    Args:
+        app: application Flask (pour ouvrir un contexte dans les threads)
+        job_id: identifiant retourné par create_job
+        stages: liste d'étapes, chaque étape étant une liste de
+                (file_type, func) où func(progress) retourne le résultat d'import
+    """
+    with _jobs_lock:
+        _jobs[job_id]['status'] = 'en_cours'
+        _jobs[job_id]['started_at'] = _now()
+
+    ok = True
+    for stage in stages:
+        if len(stage) == 1:
+            file_type, func = stage[0]
+            ok = _run_task(app, job_id, file_type, func) and ok
+        else:
+            futures = [_executor.submit(_run_task, app, job_id, file_type, func)
+                       for file_type, func in stage]
+            ok = all([f.result() for f in futures]) and ok
+
+    with _jobs_lock:
+        _jobs[job_id]['status'] = 'terminé' if ok else 'erreur'
+        _jobs[job_id]['finished_at'] = _now()
+    return get_job(job_id)
+
+
+def submit_job(app, job_id, stages):
+    """Lancer un job en tâche de fond et rendre la main immédiatement"""
+    threading.Thread(target=run_job, args=(app, job_id, stages),
+                     name=f'import-job-{job_id[:8]}', daemon=True).start()
+    return job_id
@@ -0,0 +1,236 @@
+"""
+utils/list_query.py
+Pagination par curseur (keyset), projection de champs et réponses en flux
+pour les routes de liste
+
+Paramètres de requête communs :
+    limit   nombre maximal de lignes renvoyées (1..MAX_LIMIT)
+    after   curseur opaque renvoyé par la page précédente (X-Next-Cursor)
+    fields  liste de colonnes à renvoyer, séparées par des virgules
+    format  json (défaut), stream (tableau JSON émis au fil du curseur)
+            ou ndjson (une ligne JSON par enregistrement)
+
+La pagination s'appuie sur les clés de tri de la route complétées par un
+identifiant unique : `WHERE (k1, k2, id) > (?, ?, ?)` reste un parcours
+d'index quelle que soit la page, contrairement à OFFSET. Les clés de tri
+doivent être NOT NULL.
+
+Sans aucun de ces paramètres, la réponse est identique à l'ancienne
+(tableau JSON complet). Le curseur de la page suivante est transmis dans
+les en-têtes X-Next-Cursor et Link (rel="next") : le corps garde sa forme.
+"""
+
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import Response, current_app, jsonify, request, stream_with_context
+
+MAX_LIMIT = 5000
+FETCH_SIZE = 500
+FORMATS = {
+    'json': 'application/json',
+    'stream': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class ListParamsError(ValueError):
+    """Paramètre de liste invalide (réponse 400)"""
+
+
+# ============================================================================
+# PARAMÈTRES
+# ============================================================================
+
+def encode_cursor(values):
+    """Curseur opaque à partir des valeurs des clés de tri"""
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, nb_keys):
+    """Valeurs des clés de tri contenues dans un curseur"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, binascii.Error, UnicodeError):
+        raise ListParamsError('Curseur "after" invalide')
+    if not isinstance(values, list) or len(values) != nb_keys:
+        raise ListParamsError('Curseur "after" invalide')
+    return values
+
+
+def parse_list_params(nb_keys):
+    """
+    Lire limit / after / fields / format dans la query string
+
+    Returns:
+        dict: limit (int ou None), after (list ou None),
+              fields (list ou None), format (str)
+    """
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ListParamsError('Le paramètre "limit" doit être un entier')
+        if not 1 <= limit <= MAX_LIMIT:
+            raise ListParamsError(f'Le paramètre "limit" doit être compris entre 1 et {MAX_LIMIT}')
+
+    after = request.args.get('after')
+    if after:
+        after = decode_cursor(after, nb_keys)
+    else:
+        after = None
+
+    fields = request.args.get('fields')
+    if fields:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    else:
+        fields = None
+
+    fmt = request.args.get('format', 'json').lower()
+    if fmt not in FORMATS:
+        raise ListParamsError(f'Format inconnu : {fmt} (attendu : {", ".join(FORMATS)})')
+
+    return {'limit': limit, 'after': after, 'fields': fields, 'format': fmt}
+
+
+# ============================================================================
+# RÉPONSE
+# ============================================================================
+
+def _next_link(cursor_token):
+    args = request.args.to_dict()
+    args['after'] = cursor_token
+    return f'<{request.base_url}?{urlencode(args)}>; rel="next"'
+
+
+def _sort_values(cursor, row, sort_keys):
+    """
+    Valeurs des clés de tri d'une ligne brute
+
+    Quand plusieurs colonnes portent le même nom (a.* puis c.h_debut...),
+    la dernière est retenue : les colonnes jointes sont listées après *.
+    """
+    names = [d[0] for d in cursor.description]
+    values = []
+    for _, name in sort_keys:
+        index = len(names) - 1 - names[::-1].index(name)
+        values.append(row[index])
+    return values
+
+
+def list_response(db, query, conditions, params, sort_keys,
+                  transform=None, extra_fields=(), envelope=None):
+    """
+    Exécuter une requête de liste et construire la réponse
+
+    Args:
+        db: connexion SQLite
+        query: SELECT ... FROM ... JOIN ... (sans WHERE ni ORDER BY)
+        conditions: liste de conditions SQL (combinées par AND)
+        params: paramètres des conditions
+        sort_keys: liste de (expression SQL, nom de la colonne sélectionnée),
+                   la dernière clé devant être unique
+        transform: fonction ligne (dict) -> dict appliquée avant projection
+        extra_fields: colonnes ajoutées par transform (pour fields=)
+        envelope: fonction liste -> dict pour le format json
+                  (ex. ajouter des statistiques autour des lignes)
+
+    Returns:
+        Response Flask (400 si un paramètre est invalide)
+    """
+    try:
+        options = parse_list_params(len(sort_keys))
+    except ListParamsError as e:
+        return jsonify({'error': str(e)}), 400
+
+    conditions = list(conditions)
+    params = list(params)
+    if options['after'] is not None:
+        columns = ', '.join(expr for expr, _ in sort_keys)
+        marks = ', '.join('?' for _ in sort_keys)
+        conditions.append(f'({columns}) > ({marks})')
+        params.extend(options['after'])
+
+    sql = query
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(expr for expr, _ in sort_keys)
+    if options['limit'] is not None:
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        sql += ' LIMIT ?'
+        params.append(options['limit'] + 1)
+
+    cursor = db.execute(sql, params)
+
+    fields = options['fields']
+    if fields:
+        known = [d[0] for d in cursor.description] + list(extra_fields)
+        unknown = [f for f in fields if f not in known]
+        if unknown:
+            cursor.close()
+            return jsonify({
+                'error': f'Champs inconnus : {", ".join(unknown)}',
+                'champs_disponibles': list(dict.fromkeys(known))
+            }), 400
+
+    def convert(row):
+        item = dict(row)
+        if transform:
+            item = transform(item)
+        return item
+
+    def project(item):
+        if not fields:
+            return item
+        return {f: item.get(f) for f in fields}
+
+    fmt = options['format']
+    headers = {}
+
+    if fmt != 'json' and options['limit'] is None:
+        # Flux continu : mémoire bornée à FETCH_SIZE lignes
+        dumps = current_app.json.dumps
+
+        def generate():
+            if fmt == 'stream':
+                yield '['
+            separator = ''
+            while True:
+                rows = cursor.fetchmany(FETCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    if fmt == 'ndjson':
+                        yield dumps(project(convert(row))) + '\n'
+                    else:
+                        yield separator + dumps(project(convert(row)))
+                        separator = ','
+            if fmt == 'stream':
+                yield ']'
+
+        return Response(stream_with_context(generate()), mimetype=FORMATS[fmt])
+
+    # Page bornée par limit (ou format json sans pagination) : lecture complète
+    rows = cursor.fetchall()
+    if options['limit'] is not None and len(rows) > options['limit']:
+        rows = rows[:options['limit']]
+        token = encode_cursor(_sort_values(cursor, rows[-1], sort_keys))
+        headers['X-Next-Cursor'] = token
+        headers['Link'] = _next_link(token)
+    items = [project(convert(row)) for row in rows]
+
+    if fmt == 'json':
+        body = envelope(items) if envelope else items
+        return jsonify(body), 200, headers
+
+    dumps = current_app.json.dumps
+    if fmt == 'ndjson':
+        payload = ''.join(dumps(item) + '\n' for item in items)
+    else:
+        payload = dumps(items)
+    return Response(payload, mimetype=FORMATS[fmt], headers=headers)
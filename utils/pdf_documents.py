@@ -0,0 +1,303 @@
+"""
+utils/pdf_documents.py
+Gabarits ReportLab et rendu des documents PDF individuels
+(convocations, présences responsables)
+
+Les parties statiques des documents sont préparées une seule fois par
+processus puis réutilisées : feuille de styles, images décodées (logo,
+pied de page), styles de tableaux, fonction de pied de page. Les
+flowables (tableaux, images, paragraphes) sont construits pour chaque
+document : ReportLab les modifie pendant la mise en page et le dessin.
+
+Les fonctions de rendu ne touchent pas à la base : elles reçoivent toutes
+leurs données dans un "job" (dict sérialisable) et peuvent donc être
+exécutées dans un processus de travail (voir utils/document_pipeline.py).
+
+Job :
+    {
+        'code': code_smartex_ens,
+        'nom': ..., 'prenom': ...,
+        'rows': [(date, h_debut, h_fin), ...],   # triées
+        'path': chemin du PDF à écrire
+    }
+"""
+
+import threading
+from datetime import datetime
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+LOGO_PATH = "assets/logo.png"
+FOOTER_PATH = "assets/footer.png"
+
+# À incrémenter à chaque modification de la mise en page : invalide les
+# manifestes de génération incrémentale (utils/document_pipeline.py)
+TEMPLATE_VERSION = 1
+
+# Images embarquées en flux binaire : l'encodage ASCII85 (en Python pur sans
+# l'extension rl_accel) représentait l'essentiel du temps de rendu
+rl_config.useA85 = 0
+
+
+# ============================================================================
+# GABARITS (préparés une fois par processus)
+# ============================================================================
+
+_templates = {}
+_templates_lock = threading.RLock()
+
+
+def _template(key, build):
+    """Objet statique construit à la première demande, puis réutilisé"""
+    if key not in _templates:
+        with _templates_lock:
+            if key not in _templates:
+                _templates[key] = build()
+    return _templates[key]
+
+
+def get_styles():
+    """Styles de paragraphe des documents"""
+    def build():
+        styles = getSampleStyleSheet()
+        info = ParagraphStyle(
+            'Info',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor=colors.black,
+            spaceAfter=6,
+            fontName='Helvetica'
+        )
+        return {
+            'normal': styles['Normal'],
+            'italic': styles['Italic'],
+            'centered': ParagraphStyle(name="centered", parent=styles["Normal"], alignment=TA_CENTER),
+            'centered_h2': ParagraphStyle(name="centered", parent=styles["Heading2"], alignment=TA_CENTER),
+            'info': info,
+            'info_centered': ParagraphStyle(
+                name="InfoCentered",
+                parent=info,
+                alignment=TA_CENTER,
+                fontName="Helvetica-Bold"
+            ),
+        }
+    return _template('styles', build)
+
+
+def get_image(path):
+    """Image décodée une fois (None si le fichier est absent ou illisible)"""
+    def build():
+        try:
+            reader = ImageReader(path)
+            reader.getRGBData()
+            return reader
+        except Exception:
+            return None
+    return _template(('image', path), build)
+
+
+class CachedImage(Flowable):
+    """Image dessinée depuis un ImageReader partagé (pas de relecture du fichier)"""
+
+    def __init__(self, reader, width, height):
+        super().__init__()
+        self.reader = reader
+        self.drawWidth = width
+        self.drawHeight = height
+
+    def wrap(self, availWidth, availHeight):
+        return self.drawWidth, self.drawHeight
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.drawWidth, self.drawHeight, mask='auto')
+
+
+def _header_style(font_sizes):
+    """Style de l'en-tête (commandes immuables, partagées entre documents)"""
+    def build():
+        return TableStyle([
+            ("ALIGN", (0, 0), (0, -1), "CENTER"),
+            ("ALIGN", (1, 0), (1, -1), "CENTER"),
+            ("ALIGN", (2, 0), (2, -1), "CENTER"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("FONTNAME", (1, 0), (1, 2), "Helvetica-Bold"),
+            ("FONTSIZE", (1, 0), (1, 0), font_sizes[0]),
+            ("FONTSIZE", (1, 1), (1, 2), font_sizes[1]),
+            ("FONTSIZE", (2, 0), (2, -1), 10),
+            ("GRID", (0, 0), (-1, -1), 1, colors.black),
+            ("TEXTCOLOR", (1, 0), (1, -1), colors.HexColor("#003366")),
+            ("SPAN", (0, 0), (0, 2)),  # Le logo prend les 3 lignes
+            ("LEFTPADDING", (0, 0), (-1, -1), 8),
+            ("RIGHTPADDING", (0, 0), (-1, -1), 8),
+            ("TOPPADDING", (0, 0), (-1, -1), 6),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+        ])
+    return _template(('header_style', font_sizes), build)
+
+
+def header_table(titre_liste, titre="GESTION DES EXAMENS ET\n\n DÉLIBÉRATIONS\n", font_sizes=(16, 12)):
+    """
+    En-tête EXD-FR-08-01 (logo, titres, date d'approbation)
+
+    Seules les données immuables sont partagées (image décodée, styles) :
+    le tableau et ses flowables sont propres à chaque document, la mise en
+    page et le dessin modifiant ces instances (un rendu par thread).
+    """
+    date_approbation = datetime.now().strftime("%d%m-%y")
+
+    reader = get_image(LOGO_PATH)
+    if reader is not None:
+        # Garder le ratio du logo
+        img_width, img_height = reader.getSize()
+        desired_width = 3*cm
+        logo = CachedImage(reader, desired_width, desired_width * img_height / img_width)
+    else:
+        # Si le logo n'existe pas, utiliser un texte
+        logo = Paragraph("<b>LOGO</b>", get_styles()['normal'])
+
+    header_data = [
+        [logo, titre, "EXD-FR-08-01"],
+        ["", "Procédure d'exécution des épreuves", f"Date d'approbation\n{date_approbation}"],
+        ["", titre_liste, "Page 1/1"]
+    ]
+
+    table = Table(header_data, colWidths=[4*cm, 12*cm, 4*cm])
+    table.setStyle(_header_style(tuple(font_sizes)))
+    return table
+
+
+def footer_callback(fallback_lines=()):
+    """
+    Fonction onPage dessinant l'image de pied de page
+
+    Args:
+        fallback_lines: texte dessiné si l'image est absente
+    """
+    def build():
+        reader = get_image(FOOTER_PATH)
+
+        def draw_footer(canvas, doc):
+            canvas.saveState()
+            if reader is not None:
+                # Positionner l'image en bas de la page
+                canvas.drawImage(reader, 1.5*cm, 1*cm, 18*cm, 1.5*cm, mask='auto')
+            else:
+                canvas.setFont('Helvetica', 8)
+                for i, line in enumerate(fallback_lines):
+                    canvas.drawString(2*cm, (2 - 0.5 * i)*cm, line)
+            canvas.restoreState()
+        return draw_footer
+    return _template(('footer', tuple(fallback_lines)), build)
+
+
+CRENEAUX_TABLE_STYLE = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+    ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+])
+
+LISTE_SURVEILLANTS_TABLE_STYLE = TableStyle([
+    # En-tête
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+
+    # Corps du tableau
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('ROWHEIGHT', (0, 1), (-1, -1), 0.8*cm),
+
+    # Grille
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+# ============================================================================
+# RENDU
+# ============================================================================
+
+def _duration(h_debut, h_fin):
+    """Durée en heures entre deux horaires HH:MM ("—" si illisible)"""
+    fmt = "%H:%M"
+    try:
+        h1 = datetime.strptime(h_debut, fmt)
+        h2 = datetime.strptime(h_fin, fmt)
+        return round((h2 - h1).seconds / 3600, 1)
+    except Exception:
+        return "—"
+
+
+def _render_letter(job, titre_liste, intro):
+    """Document commun aux convocations et présences : en-tête, destinataire, tableau"""
+    doc = SimpleDocTemplate(job['path'], pagesize=A4,
+                            leftMargin=50, rightMargin=50,
+                            topMargin=100, bottomMargin=80)
+    styles = get_styles()
+
+    elements = [header_table(titre_liste), Spacer(1, 30)]
+
+    # --- Nom du destinataire ---
+    elements.append(Paragraph("<b>Notes à</b>", styles['centered']))
+    elements.append(Spacer(1, 5))
+    elements.append(Paragraph(f"<b>Mr/Mme {job['prenom']} {job['nom']}</b>", styles['centered_h2']))
+    elements.append(Spacer(1, 20))
+    # --- Texte d'intro ---
+    elements.append(Paragraph(intro, styles['normal']))
+    elements.append(Spacer(1, 20))
+
+    # --- Tableau ---
+    data = [["Date", "Heure", "Durée"]]
+    for date, h_debut, h_fin in job['rows']:
+        data.append([date, h_debut, f"{_duration(h_debut, h_fin)} H"])
+
+    elements.append(Table(data, colWidths=[120, 120, 120], style=CRENEAUX_TABLE_STYLE))
+    elements.append(Spacer(1, 30))
+
+    elements.append(Paragraph("Merci de votre collaboration.", styles['italic']))
+
+    # Construire le PDF avec le footer
+    footer = footer_callback()
+    doc.build(elements, onFirstPage=footer, onLaterPages=footer)
+
+
+def render_convocation(job):
+    """Convocation d'un enseignant : ses surveillances de la session"""
+    _render_letter(
+        job,
+        "Liste d'affectation des surveillants",
+        "Cher(e) collègue,<br/>"
+        "Vous êtes prié(e) d'assurer la surveillance et (ou) la responsabilité des examens selon le calendrier ci-joint."
+    )
+
+
+def render_presence(job):
+    """Feuille de présence d'un responsable : ses créneaux de responsabilité"""
+    _render_letter(
+        job,
+        "Liste des créneaux de présence des responsables",
+        "Cher(e) collègue,<br/>"
+        "Vous êtes prié(e) d'assurer la responsabilité des examens selon le calendrier ci-joint."
+    )
+
+
+RENDERERS = {
+    'convocations': render_convocation,
+    'presences_responsables': render_presence,
+}
@@ -0,0 +1,352 @@
+"""
+utils/plan_validator.py
+Validation vectorisée d'un planning de surveillance (table affectation)
+
+Vérifie, sur l'état courant des affectations d'une session, les
+contraintes de l'optimiseur (scripts/optimize_example.py) en quelques
+passes groupby / map, sans boucle Python sur les affectations :
+
+HARD (le planning est invalide si l'une n'est pas respectée)
+- H1            : couverture des créneaux (2 surveillants par salle +
+                  réserves : min(nb_salles, 4) par défaut, comme l'optimiseur)
+- H2C           : un responsable ne surveille pas sa propre salle
+- H3A           : quota maximum du grade
+- H4            : équité absolue par grade (même nombre de surveillances)
+- H5            : au moins une surveillance par enseignant participant
+- CONFLIT       : pas de chevauchement d'horaire pour un enseignant
+- PARTICIPATION : seuls les enseignants participants surveillent
+
+SOFT (mesures, avec le détail des écarts quand il y en a)
+- S1 : vœux de non-surveillance non respectés
+- S2 : jours de présence au-delà du minimum possible
+- S3 : écarts de charge moyenne entre grades
+- S4 : écarts individuels au quota du grade
+- S5 : charge pondérée par les quotas ajustés de la session précédente
+- S6 : responsables absents du créneau de leur salle
+
+Utilisé par GET /api/optimize/validate/<id> et par les routes de
+modification en lot des affectations.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.time_utils import parse_time
+
+MAX_RESERVES = 4
+MAX_DETAILS = 100
+
+HARD_RULES = {
+    'H1': 'Couverture complète des créneaux',
+    'H2C': 'Responsable ne surveille pas sa propre salle',
+    'H3A': 'Quota maximum du grade',
+    'H4': 'Équité absolue par grade',
+    'H5': 'Au moins une surveillance par enseignant participant',
+    'CONFLIT': "Pas de chevauchement d'horaire",
+    'PARTICIPATION': 'Seuls les enseignants participants surveillent',
+}
+
+SOFT_RULES = {
+    'S1': 'Respect des vœux',
+    'S2': 'Concentration sur le minimum de jours',
+    'S3': 'Équilibrage de charge entre grades',
+    'S4': 'Écarts individuels aux quotas',
+    'S5': 'Priorité aux quotas ajustés faibles',
+    'S6': 'Présence des responsables',
+}
+
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def _hours(series):
+    """Heures normalisées "HH:MM" (parse_time appliqué une fois par valeur distincte)"""
+    mapping = {value: parse_time(value) for value in series.dropna().unique()}
+    return series.map(mapping)
+
+
+def _minutes(series):
+    """Minutes depuis minuit (NaN si l'heure est invalide)"""
+    mapping = {}
+    for value in series.dropna().unique():
+        hhmm = parse_time(value)
+        try:
+            hours, minutes = hhmm.split(':')
+            mapping[value] = int(hours) * 60 + int(minutes)
+        except (AttributeError, ValueError):
+            pass
+    return series.map(mapping).astype(float)
+
+
+def _frame(db, query, params=()):
+    # Tuples bruts : sqlite3.Row est inutile ici et ralentit fetchall
+    cursor = db.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+
+
+def load_plan(db, id_session):
+    """
+    Données nécessaires à la validation (six requêtes, sans jointure SQL)
+
+    Returns:
+        dict de DataFrames : affectations, creneaux, salles, enseignants,
+        voeux, quotas_ajustes
+    """
+    creneaux = _frame(db, '''
+        SELECT creneau_id, dateExam, h_debut, h_fin, cod_salle, enseignant AS responsable
+        FROM creneau
+        WHERE id_session = ?
+    ''', (id_session,))
+    aff = _frame(db, '''
+        SELECT affectation_id, code_smartex_ens, creneau_id, jour, seance, position
+        FROM affectation
+        WHERE id_session = ?
+    ''', (id_session,))
+    # Jointure avec les créneaux faite ici (plus rapide que le JOIN SQLite)
+    positions = pd.Index(creneaux['creneau_id']).get_indexer(aff['creneau_id'])
+    aff = aff[positions >= 0].reset_index(drop=True)
+    positions = positions[positions >= 0]
+    for col in ('dateExam', 'h_debut', 'h_fin', 'cod_salle'):
+        aff[col] = creneaux[col].to_numpy()[positions]
+    salles = _frame(db, '''
+        SELECT dateExam, h_debut, nb_salle
+        FROM salle_par_creneau
+        WHERE id_session = ?
+    ''', (id_session,))
+    enseignants = _frame(db, '''
+        SELECT e.code_smartex_ens, e.grade_code_ens, e.participe_surveillance, g.quota
+        FROM enseignant e
+        LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
+    ''')
+    voeux = _frame(db, '''
+        SELECT code_smartex_ens, jour, seance
+        FROM voeu
+        WHERE id_session = ?
+    ''', (id_session,))
+    quotas_ajustes = _frame(db, '''
+        SELECT code_smartex_ens, quota_ajuste_maj
+        FROM quota_enseignant
+        WHERE id_session = (SELECT MAX(id_session) FROM session WHERE id_session < ?)
+    ''', (id_session,))
+
+    aff['heure'] = _hours(aff['h_debut'])
+    creneaux['heure'] = _hours(creneaux['h_debut'])
+    salles['heure'] = _hours(salles['h_debut'])
+
+    return {
+        'affectations': aff,
+        'creneaux': creneaux,
+        'salles': salles,
+        'enseignants': enseignants,
+        'voeux': voeux,
+        'quotas_ajustes': quotas_ajustes,
+    }
+
+
+def slot_rooms(plan):
+    """
+    Nombre de salles par créneau horaire (dateExam, heure) : salle_par_creneau
+    si renseigné, sinon salles distinctes des créneaux (comme l'optimiseur)
+    """
+    slot = ['dateExam', 'heure']
+    nb_salles = plan['creneaux'].dropna(subset=['cod_salle']).groupby(slot)['cod_salle'].nunique()
+    declared = plan['salles'].drop_duplicates(slot, keep='last').set_index(slot)['nb_salle']
+    return declared.combine_first(nb_salles) if len(declared) else nb_salles
+
+
+# ============================================================================
+# VALIDATION
+# ============================================================================
+
+def _records(df, columns, limit):
+    return [
+        {k: (None if pd.isna(v) else v) for k, v in row.items()}
+        for row in df[columns].head(limit).to_dict('records')
+    ]
+
+
+def _codes(*columns):
+    """Code entier unique par tuple de valeurs (factorize colonne par colonne)"""
+    code = np.zeros(len(columns[0]), dtype=np.int64)
+    for column in columns:
+        values, uniques = pd.factorize(column)
+        code = code * (len(uniques) + 1) + values + 1
+    return code
+
+
+def _isin(df, columns, other):
+    """Lignes de df dont le tuple (columns) figure dans other[columns]"""
+    both = _codes(*(np.concatenate([df[c].to_numpy(dtype=object), other[c].to_numpy(dtype=object)])
+                    for c in columns))
+    return np.isin(both[:len(df)], both[len(df):])
+
+
+def validate_plan(db, id_session, nb_reserves=None, max_details=MAX_DETAILS):
+    """
+    Vérifier toutes les contraintes sur les affectations d'une session
+
+    Args:
+        nb_reserves: réserves par créneau (None = min(nb_salles, 4))
+        max_details: nombre maximum de violations détaillées par règle
+
+    Returns:
+        dict: valide, resume (nombre de violations par règle), mesures
+              (contraintes soft), violations (détail par règle)
+    """
+    plan = load_plan(db, id_session)
+    aff = plan['affectations']
+    creneaux = plan['creneaux']
+    slot = ['dateExam', 'heure']
+
+    counts = {}
+    details = {}
+    mesures = {}
+
+    def report(rule, df, columns):
+        counts[rule] = int(len(df))
+        if len(df) and max_details:
+            details[rule] = _records(df, columns, max_details)
+
+    # Charge par enseignant (tous les enseignants, 0 si aucune affectation)
+    ens = plan['enseignants'].copy()
+    charge = aff['code_smartex_ens'].value_counts()
+    ens['nb'] = ens['code_smartex_ens'].map(charge).fillna(0).astype(int)
+    ens['participe'] = ens['participe_surveillance'].fillna(0).astype(bool)
+    participants = ens[ens['participe']]
+
+    # --- H1 : couverture par créneau horaire --------------------------------
+    nb_salles = slot_rooms(plan)
+    reserves = np.minimum(nb_salles, MAX_RESERVES) if nb_reserves is None else int(nb_reserves)
+    requis = nb_salles * 2 + reserves
+    affectes = aff.groupby(slot).size()
+    index = requis.index.union(affectes.index)
+    couverture = pd.DataFrame({
+        'nb_salles': nb_salles.reindex(index, fill_value=0).astype(int),
+        'requis': requis.reindex(index, fill_value=0).astype(int),
+        'affectes': affectes.reindex(index, fill_value=0).astype(int),
+    })
+    couverture.index.names = ['date', 'h_debut']
+    report('H1', couverture[couverture['requis'] != couverture['affectes']].reset_index(),
+           ['date', 'h_debut', 'nb_salles', 'requis', 'affectes'])
+
+    # --- H2C : responsable dans sa propre salle -----------------------------
+    responsable = aff['creneau_id'].map(creneaux.set_index('creneau_id')['responsable'])
+    report('H2C', aff[responsable == aff['code_smartex_ens']],
+           ['affectation_id', 'code_smartex_ens', 'dateExam', 'h_debut', 'cod_salle'])
+
+    # --- H3A / H5 / PARTICIPATION --------------------------------------------
+    depasse = participants[participants['quota'].notna() & (participants['nb'] > participants['quota'])]
+    report('H3A', depasse, ['code_smartex_ens', 'grade_code_ens', 'nb', 'quota'])
+    report('H5', participants[participants['nb'] == 0], ['code_smartex_ens', 'grade_code_ens'])
+    report('PARTICIPATION', aff[~aff['code_smartex_ens'].isin(participants['code_smartex_ens'])],
+           ['affectation_id', 'code_smartex_ens', 'dateExam', 'h_debut'])
+
+    # --- H4 : équité absolue par grade ---------------------------------------
+    par_grade = participants.groupby('grade_code_ens')['nb'].agg(['min', 'max', 'size', 'mean', 'sum'])
+    inequite = par_grade[(par_grade['size'] > 1) & (par_grade['min'] != par_grade['max'])].reset_index()
+    report('H4', inequite.rename(columns={'size': 'enseignants'}),
+           ['grade_code_ens', 'min', 'max', 'enseignants'])
+
+    # --- CONFLIT : chevauchements ------------------------------------------
+    # Tri par (enseignant, date, début) puis maximum cumulé des fins, décalé
+    # d'un multiple de 10 000 par groupe pour ne pas déborder d'un groupe à l'autre
+    debut = _minutes(aff['h_debut']).to_numpy()
+    fin = _minutes(aff['h_fin']).to_numpy()
+    groupe = _codes(aff['code_smartex_ens'], aff['dateExam'])
+    valide = ~(np.isnan(debut) | np.isnan(fin))
+    ordre = np.flatnonzero(valide)[np.lexsort((debut[valide], groupe[valide]))]
+    conflits = np.zeros(len(aff), dtype=bool)
+    if len(ordre) > 1:
+        decalage = groupe[ordre] * 10000.0
+        fin_max = np.maximum.accumulate(fin[ordre] + decalage)
+        meme_groupe = groupe[ordre][1:] == groupe[ordre][:-1]
+        conflits[ordre[1:]] = meme_groupe & (debut[ordre][1:] + decalage[1:] < fin_max[:-1])
+    report('CONFLIT', aff[conflits],
+           ['affectation_id', 'code_smartex_ens', 'dateExam', 'h_debut', 'h_fin'])
+
+    # --- S1 : vœux non respectés --------------------------------------------
+    voeu_keys = ['code_smartex_ens', 'jour', 'seance']
+    non_respectes = aff[_isin(aff, voeu_keys, plan['voeux'])]
+    report('S1', non_respectes, ['affectation_id', 'code_smartex_ens', 'jour', 'seance'])
+
+    # --- S2 : jours de présence au-delà du minimum --------------------------
+    date_code, dates = pd.factorize(aff['dateExam'])
+    seances = np.unique(_codes(aff['dateExam'], aff['heure']), return_index=True)[1]
+    seances_par_jour = max(np.bincount(date_code[seances]).max(), 1) if len(aff) else 1
+    presences = np.unique(groupe, return_index=True)[1]
+    jours = pd.DataFrame({
+        'nb': charge,
+        'jours': aff['code_smartex_ens'].take(presences).value_counts(),
+    })
+    jours['minimum'] = -(-jours['nb'] // seances_par_jour)
+    jours['exces'] = jours['jours'] - jours['minimum']
+    exces = jours[jours['exces'] > 0].rename_axis('code_smartex_ens').reset_index()
+    exces = exces.sort_values('exces', ascending=False, kind='stable')
+    report('S2', exces, ['code_smartex_ens', 'nb', 'jours', 'minimum'])
+    mesures['S2'] = {'jours_total': int(jours['jours'].sum()),
+                     'jours_minimum': int(jours['minimum'].sum())}
+
+    # --- S3 : écarts de charge moyenne entre grades --------------------------
+    # Pénalité de l'optimiseur : somme sur les paires |total1 * n2 - total2 * n1|
+    totaux = par_grade['sum'].to_numpy(dtype=float)
+    effectifs = par_grade['size'].to_numpy(dtype=float)
+    croise = np.abs(np.outer(totaux, effectifs) - np.outer(effectifs, totaux))
+    moyennes = par_grade['mean'].round(2)
+    mesures['S3'] = {
+        'penalite': int(np.triu(croise, 1).sum()),
+        'moyennes_par_grade': {str(g): float(m) for g, m in moyennes.items()},
+        'ecart_max': float(moyennes.max() - moyennes.min()) if len(moyennes) else 0.0,
+    }
+    counts['S3'] = int((np.triu(croise, 1) > 0).sum())
+
+    # --- S4 : écarts individuels au quota du grade --------------------------
+    avec_quota = participants[participants['quota'].notna()]
+    ecarts = (avec_quota['nb'] - avec_quota['quota']).abs()
+    mesures['S4'] = {'ecart_total': int(ecarts.sum())}
+    counts['S4'] = int((ecarts > 0).sum())
+
+    # --- S5 : charge pondérée par les quotas ajustés ------------------------
+    ajustes = plan['quotas_ajustes'].dropna()
+    nb_ajustes = ajustes['code_smartex_ens'].map(charge).fillna(0)
+    coefficients = np.maximum(1, 20 - ajustes['quota_ajuste_maj'])
+    mesures['S5'] = {'penalite': int((nb_ajustes * coefficients).sum()),
+                     'enseignants_avec_quota_ajuste': int(len(ajustes))}
+
+    # --- S6 : responsables absents du créneau de leur salle ------------------
+    # (responsables participant à la surveillance, comme dans l'optimiseur)
+    responsables = creneaux[creneaux['responsable'].isin(participants['code_smartex_ens'])]
+    responsables = responsables.rename(columns={'responsable': 'code_smartex_ens'})
+    presence_keys = slot + ['code_smartex_ens']
+    absents = responsables[~_isin(responsables, presence_keys, aff)]
+    report('S6', absents, ['code_smartex_ens', 'dateExam', 'heure', 'cod_salle'])
+
+    resume = {
+        rule: {'regle': label, 'type': 'hard', 'violations': counts.get(rule, 0)}
+        for rule, label in HARD_RULES.items()
+    }
+    resume.update({
+        rule: {'regle': label, 'type': 'soft', 'violations': counts.get(rule, 0)}
+        for rule, label in SOFT_RULES.items()
+    })
+    return {
+        'id_session': id_session,
+        'valide': all(counts.get(rule, 0) == 0 for rule in HARD_RULES),
+        'affectations': int(len(aff)),
+        'resume': resume,
+        'mesures': mesures,
+        'violations': details,
+    }
+
+
+def validation_summary(result):
+    """Résumé compact : règles non respectées et leur nombre de violations"""
+    return {
+        'valide': result['valide'],
+        'hard': {rule: r['violations'] for rule, r in result['resume'].items()
+                 if r['type'] == 'hard' and r['violations']},
+        'soft': {rule: r['violations'] for rule, r in result['resume'].items()
+                 if r['type'] == 'soft' and r['violations']},
+    }
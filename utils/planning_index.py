@@ -0,0 +1,285 @@
+"""
+utils/planning_index.py
+Index en mémoire du planning d'une session (permutations et déplacements
+manuels)
+
+Les affectations de la session sont chargées une fois (trois requêtes) et
+indexées par enseignant et par date : la vérification d'une permutation ou
+d'un déplacement (chevauchement d'horaire, participation à la surveillance,
+responsable dans sa propre salle, quota du grade) ne demande plus aucune
+requête. On peut ainsi évaluer toutes les permutations possibles d'une
+affectation en quelques millisecondes, ou valider une série d'opérations
+en les appliquant l'une après l'autre à l'index (apply_swap / apply_move).
+
+Impact d'une permutation (négatif = amélioration), pondéré comme dans
+l'optimiseur (scripts/optimize_example.py) :
+- voeux  : vœux de non-surveillance non respectés (poids 100)
+- jours  : jours de présence des deux enseignants (concentration, poids 50)
+- equite : écart des minutes de surveillance à la moyenne du grade
+           (une permutation ne change pas le nombre de surveillances de
+           chacun, mais peut changer leur durée)
+"""
+
+from collections import Counter, defaultdict
+
+from utils.time_utils import parse_time
+
+POIDS_VOEU = 100
+POIDS_JOUR = 50
+POIDS_EQUITE_HEURE = 10
+
+
+def _minutes(value):
+    hhmm = parse_time(value)
+    if not hhmm or ':' not in hhmm:
+        return None
+    try:
+        hours, minutes = hhmm.split(':')
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+class PlanningIndex:
+    """Affectations d'une session indexées par enseignant et par date"""
+
+    def __init__(self, db, id_session):
+        self.id_session = id_session
+        self.affectations = {}
+        self.by_teacher = defaultdict(lambda: defaultdict(list))
+
+        rows = db.execute('''
+            SELECT a.rowid AS affectation_id, a.code_smartex_ens, a.creneau_id,
+                   a.jour, a.seance, c.cod_salle, c.dateExam, c.h_debut, c.h_fin,
+                   c.enseignant AS responsable
+            FROM affectation a
+            JOIN creneau c ON a.creneau_id = c.creneau_id
+            WHERE a.id_session = ?
+        ''', (id_session,)).fetchall()
+        for row in rows:
+            aff = dict(row)
+            aff['debut'] = _minutes(aff['h_debut'])
+            aff['fin'] = _minutes(aff['h_fin'])
+            if aff['debut'] is not None and aff['fin'] is not None:
+                aff['duree'] = max(0, aff['fin'] - aff['debut'])
+            else:
+                aff['duree'] = 0
+            self.affectations[aff['affectation_id']] = aff
+            self.by_teacher[aff['code_smartex_ens']][aff['dateExam']].append(aff)
+
+        self.enseignants = {
+            row['code_smartex_ens']: dict(row)
+            for row in db.execute('''
+                SELECT e.code_smartex_ens, e.nom_ens, e.prenom_ens, e.grade_code_ens,
+                       e.participe_surveillance, g.quota
+                FROM enseignant e
+                LEFT JOIN grade g ON e.grade_code_ens = g.code_grade
+            ''').fetchall()
+        }
+        self.voeux = {
+            (row['code_smartex_ens'], row['jour'], row['seance'])
+            for row in db.execute(
+                'SELECT code_smartex_ens, jour, seance FROM voeu WHERE id_session = ?', (id_session,)
+            ).fetchall()
+        }
+
+        # Surveillances, minutes de surveillance et jours de présence par enseignant
+        self.counts = Counter()
+        self.minutes = Counter()
+        self.jours = defaultdict(Counter)
+        for aff in self.affectations.values():
+            self.counts[aff['code_smartex_ens']] += 1
+            self.minutes[aff['code_smartex_ens']] += aff['duree']
+            self.jours[aff['code_smartex_ens']][aff['dateExam']] += 1
+        self.grade_members = defaultdict(list)
+        for code in self.by_teacher:
+            self.grade_members[self._grade(code)].append(code)
+
+    # ------------------------------------------------------------------
+    # Contraintes
+    # ------------------------------------------------------------------
+
+    def _grade(self, code):
+        ens = self.enseignants.get(code)
+        return ens['grade_code_ens'] if ens else None
+
+    def participe(self, code):
+        ens = self.enseignants.get(code)
+        return bool(ens and ens['participe_surveillance'])
+
+    def quota(self, code):
+        ens = self.enseignants.get(code)
+        return ens['quota'] if ens else None
+
+    def has_conflict(self, code, aff, exclude_ids):
+        """L'enseignant a-t-il une autre affectation qui chevauche celle-ci ?"""
+        if aff['debut'] is None or aff['fin'] is None:
+            return False
+        for other in self.by_teacher[code].get(aff['dateExam'], ()):
+            if other['affectation_id'] in exclude_ids or other['debut'] is None or other['fin'] is None:
+                continue
+            if other['debut'] < aff['fin'] and other['fin'] > aff['debut']:
+                return True
+        return False
+
+    def swap_error(self, id1, id2):
+        """
+        Raison pour laquelle deux affectations ne peuvent pas être permutées
+        (règles de POST /api/affectations/permuter, plus : un responsable ne
+        surveille pas sa propre salle)
+
+        Returns:
+            tuple: (message, code HTTP) ou None si la permutation est possible
+        """
+        aff1, aff2 = self.affectations.get(id1), self.affectations.get(id2)
+        if not aff1 or not aff2:
+            return 'Affectation(s) non trouvée(s).', 404
+        code1, code2 = aff1['code_smartex_ens'], aff2['code_smartex_ens']
+        if code1 == code2:
+            return 'Impossible de permuter : les deux affectations concernent le même enseignant.', 400
+        if all(aff1[k] == aff2[k] for k in ('cod_salle', 'dateExam', 'h_debut', 'h_fin')):
+            return 'Impossible de permuter : même salle et même créneau.', 400
+        for code in (code1, code2):
+            if not self.participe(code):
+                return f"L'enseignant {code} ne participe pas à la surveillance.", 400
+        exclude = (id1, id2)
+        if self.has_conflict(code1, aff2, exclude):
+            return 'Conflit d’horaire pour le premier enseignant.', 409
+        if self.has_conflict(code2, aff1, exclude):
+            return 'Conflit d’horaire pour le second enseignant.', 409
+        if aff2['responsable'] == code1:
+            return f"Le premier enseignant est responsable de la salle {aff2['cod_salle']} dans ce créneau.", 409
+        if aff1['responsable'] == code2:
+            return f"Le second enseignant est responsable de la salle {aff1['cod_salle']} dans ce créneau.", 409
+        return None
+
+    def move_error(self, affectation_id, code):
+        """
+        Raison pour laquelle une affectation ne peut pas être confiée à un
+        autre enseignant (mêmes vérifications, plus le quota du grade)
+
+        Returns:
+            tuple: (message, code HTTP) ou None si le déplacement est possible
+        """
+        aff = self.affectations.get(affectation_id)
+        if not aff:
+            return 'Affectation non trouvée.', 404
+        if code not in self.enseignants:
+            return f'Enseignant {code} non trouvé.', 404
+        if aff['code_smartex_ens'] == code:
+            return "L'affectation est déjà confiée à cet enseignant.", 400
+        if not self.participe(code):
+            return f"L'enseignant {code} ne participe pas à la surveillance.", 400
+        if self.has_conflict(code, aff, (affectation_id,)):
+            return f"Conflit d’horaire pour l'enseignant {code}.", 409
+        if aff['responsable'] == code:
+            return f"L'enseignant {code} est responsable de la salle {aff['cod_salle']} dans ce créneau.", 409
+        quota = self.quota(code)
+        if quota is not None and self.counts[code] + 1 > quota:
+            return f"Quota atteint pour l'enseignant {code} ({self.counts[code]}/{quota}).", 409
+        return None
+
+    # ------------------------------------------------------------------
+    # Modifications (index uniquement, la base n'est pas modifiée)
+    # ------------------------------------------------------------------
+
+    def _reassign(self, aff, code):
+        old = aff['code_smartex_ens']
+        self.by_teacher[old][aff['dateExam']].remove(aff)
+        self.counts[old] -= 1
+        self.minutes[old] -= aff['duree']
+        self.jours[old][aff['dateExam']] -= 1
+        if not self.jours[old][aff['dateExam']]:
+            del self.jours[old][aff['dateExam']]
+
+        aff['code_smartex_ens'] = code
+        if code not in self.by_teacher:
+            self.grade_members[self._grade(code)].append(code)
+        self.by_teacher[code][aff['dateExam']].append(aff)
+        self.counts[code] += 1
+        self.minutes[code] += aff['duree']
+        self.jours[code][aff['dateExam']] += 1
+
+    def apply_swap(self, id1, id2):
+        aff1, aff2 = self.affectations[id1], self.affectations[id2]
+        code1, code2 = aff1['code_smartex_ens'], aff2['code_smartex_ens']
+        self._reassign(aff1, code2)
+        self._reassign(aff2, code1)
+
+    def apply_move(self, affectation_id, code):
+        self._reassign(self.affectations[affectation_id], code)
+
+    # ------------------------------------------------------------------
+    # Impact
+    # ------------------------------------------------------------------
+
+    def _voeu(self, code, aff):
+        return 1 if (code, aff['jour'], aff['seance']) in self.voeux else 0
+
+    def _spread(self, grade, minutes):
+        members = self.grade_members.get(grade, ())
+        if not members:
+            return 0
+        values = [minutes.get(code, self.minutes[code]) for code in members]
+        mean = sum(values) / len(values)
+        return sum(abs(v - mean) for v in values)
+
+    def swap_impact(self, id1, id2):
+        """Variation des vœux non respectés, jours de présence et écart d'équité"""
+        aff1, aff2 = self.affectations[id1], self.affectations[id2]
+        code1, code2 = aff1['code_smartex_ens'], aff2['code_smartex_ens']
+
+        voeux = (self._voeu(code1, aff2) + self._voeu(code2, aff1)
+                 - self._voeu(code1, aff1) - self._voeu(code2, aff2))
+
+        jours = 0
+        for code, old, new in ((code1, aff1, aff2), (code2, aff2, aff1)):
+            if old['dateExam'] == new['dateExam']:
+                continue
+            days = self.jours[code]
+            jours += (days[new['dateExam']] == 0) - (days[old['dateExam']] == 1)
+
+        equite = 0.0
+        delta = aff2['duree'] - aff1['duree']
+        if delta:
+            after = {code1: self.minutes[code1] + delta, code2: self.minutes[code2] - delta}
+            for grade in {self._grade(code1), self._grade(code2)}:
+                equite += self._spread(grade, after) - self._spread(grade, {})
+
+        score = POIDS_VOEU * voeux + POIDS_JOUR * jours + POIDS_EQUITE_HEURE * equite / 60
+        return {
+            'voeux': voeux,
+            'jours': jours,
+            'equite_minutes': round(equite, 1),
+            'score': round(score, 2),
+        }
+
+    def swap_candidates(self, affectation_id):
+        """
+        Toutes les permutations possibles d'une affectation, de la meilleure
+        à la moins bonne (score croissant)
+
+        Returns:
+            list: dict (affectation partenaire, enseignant, impact)
+        """
+        candidates = []
+        for other_id, other in self.affectations.items():
+            if other_id == affectation_id or self.swap_error(affectation_id, other_id):
+                continue
+            ens = self.enseignants.get(other['code_smartex_ens'], {})
+            candidates.append({
+                'affectation_id': other_id,
+                'code_smartex_ens': other['code_smartex_ens'],
+                'nom_ens': ens.get('nom_ens'),
+                'prenom_ens': ens.get('prenom_ens'),
+                'grade_code_ens': ens.get('grade_code_ens'),
+                'date': other['dateExam'],
+                'jour': other['jour'],
+                'seance': other['seance'],
+                'h_debut': other['h_debut'],
+                'h_fin': other['h_fin'],
+                'cod_salle': other['cod_salle'],
+                'impact': self.swap_impact(affectation_id, other_id),
+            })
+        candidates.sort(key=lambda c: (c['impact']['score'], c['affectation_id']))
+        return candidates
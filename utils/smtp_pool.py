@@ -0,0 +1,221 @@
+"""
+utils/smtp_pool.py
+Pool de connexions SMTP authentifiées pour les envois en masse
+
+Une connexion SMTP (TCP + STARTTLS + LOGIN) coûte plusieurs allers-retours
+réseau : elle est ouverte une fois puis réutilisée pour de nombreux
+messages. Le pool garde au plus `size` connexions, utilisables en
+parallèle depuis plusieurs threads, et espace les envois pour ne pas
+dépasser `rate` messages par seconde (limite imposée par la plupart des
+serveurs de messagerie).
+
+Une connexion fermée par le serveur (délai d'inactivité, code 421...) est
+rouverte et le message renvoyé une fois, sans que l'appelant ne le voie.
+
+Configuration (email_config.json, sinon Config) :
+    SMTP_POOL_SIZE   connexions simultanées
+    SMTP_RATE_LIMIT  messages par seconde (0 = pas de limite)
+    SMTP_TIMEOUT     délai réseau en secondes
+    SMTP_STARTTLS    false pour un serveur local sans TLS (défaut : true)
+"""
+
+import atexit
+import queue
+import smtplib
+import threading
+import time
+
+from config import Config
+
+
+class RateLimiter:
+    """Espacement régulier des envois, partagé entre les threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _as_bool(value, default):
+    """Booléen de configuration : accepte true/false, 1/0, oui/non en texte"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str):
+        return value.strip().lower() not in ('false', '0', 'no', 'non', 'off')
+    return bool(value)
+
+
+def _is_disconnect(error):
+    """La connexion est-elle inutilisable (à rouvrir) après cette erreur ?"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SMTPPool:
+    """Connexions SMTP réutilisables"""
+
+    def __init__(self, email_config, size=None, rate=None, timeout=None):
+        self.config = dict(email_config)
+        self.size = max(1, int(size or self.config.get('SMTP_POOL_SIZE') or Config.SMTP_POOL_SIZE))
+        if rate is None:
+            rate = self.config.get('SMTP_RATE_LIMIT', Config.SMTP_RATE_LIMIT)
+        self.rate = float(rate or 0)
+        self.timeout = float(timeout or self.config.get('SMTP_TIMEOUT') or Config.SMTP_TIMEOUT)
+        # "false" (texte, email_config.json) ne doit pas activer STARTTLS
+        self.starttls = _as_bool(self.config.get('SMTP_STARTTLS'), True)
+
+        self._limiter = RateLimiter(self.rate)
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()
+        self._open = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+    # ------------------------------------------------------------------
+    # Connexions
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        server = smtplib.SMTP(self.config['SMTP_SERVER'], int(self.config['SMTP_PORT']),
+                              timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.config.get('SMTP_USER'):
+                server.login(self.config['SMTP_USER'], self.config['SMTP_PASSWORD'])
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            self._open.add(server)
+        return server
+
+    def _take(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _discard(self, server):
+        with self._lock:
+            self._open.discard(server)
+        try:
+            server.close()
+        except Exception:
+            pass
+
+    def _quit(self, server):
+        try:
+            server.quit()
+        except Exception:
+            pass
+        self._discard(server)
+
+    def _release(self, server):
+        """Rendre une connexion au pool, ou la fermer si le pool a été fermé entre-temps"""
+        with self._lock:
+            if not self._closed:
+                self._idle.put(server)
+                return
+        self._quit(server)
+
+    def close(self):
+        """
+        Fermer toutes les connexions (QUIT) : les inactives tout de suite,
+        celles en cours d'utilisation dès qu'elles sont rendues
+        """
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                server = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._quit(server)
+
+    # ------------------------------------------------------------------
+    # Envoi
+    # ------------------------------------------------------------------
+
+    def send(self, msg):
+        """
+        Envoyer un message sur une connexion du pool
+
+        Raises:
+            smtplib.SMTPException / OSError si l'envoi échoue
+            (après une reconnexion si le serveur a coupé la connexion)
+        """
+        self._limiter.wait()
+        with self._slots:
+            for attempt in range(2):
+                # Nouvelle tentative : connexion neuve (les autres connexions
+                # inactives ont pu être coupées elles aussi)
+                server = self._take() if attempt == 0 else self._connect()
+                try:
+                    server.send_message(msg)
+                except Exception as e:
+                    if _is_disconnect(e):
+                        self._discard(server)
+                        if attempt == 0:
+                            continue
+                    else:
+                        # Refus du message (destinataire...) : la connexion reste valide
+                        self._release(server)
+                    raise
+                self._release(server)
+                return
+
+
+# ============================================================================
+# POOLS PARTAGÉS
+# ============================================================================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _config_key(email_config):
+    return tuple(sorted((k, str(v)) for k, v in email_config.items() if k.startswith('SMTP_')))
+
+
+def get_smtp_pool(email_config):
+    """
+    Pool associé à une configuration email (créé à la première demande)
+
+    Les connexions restent ouvertes d'un envoi à l'autre ; un changement de
+    configuration ferme l'ancien pool (les connexions encore utilisées par
+    un envoi en cours sont fermées à leur retour).
+    """
+    key = _config_key(email_config)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            for old in _pools.values():
+                old.close()
+            _pools.clear()
+            pool = _pools[key] = SMTPPool(email_config)
+        return pool
+
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,225 @@
+"""
+utils/statistics_engine.py
+Moteur de statistiques vectorisé (affectations, vœux, charges, couverture)
+
+Toutes les métriques sont calculées par jointures, groupby et value_counts
+sur des DataFrames pandas : pas de filtre du DataFrame des affectations
+par vœu ou par enseignant, pas d'iterrows. Coût en O(n log n).
+
+Utilisé par :
+- GET /api/statistics/session/<id>   (routes/statistics_routes.py)
+- GET /api/optimize/stats/<id>       (routes/optimize_routes.py)
+- generate_statistics                (scripts/surveillance_stats.py)
+
+Colonnes attendues dans le DataFrame des affectations :
+    code_smartex_ens, jour, seance, creneau_id, cod_salle
+(+ une colonne de date pour les responsables, nommée par l'appelant)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+VOEU_KEYS = ['code_smartex_ens', 'jour', 'seance']
+
+
+# ============================================================================
+# CHARGEMENT
+# ============================================================================
+
+def load_session_affectations(db, id_session):
+    """
+    Affectations d'une session enrichies de l'enseignant et du créneau
+
+    Returns:
+        DataFrame (vide si aucune affectation)
+    """
+    cursor = db.execute('''
+        SELECT
+            a.*,
+            e.nom_ens,
+            e.prenom_ens,
+            e.grade_code_ens,
+            c.dateExam,
+            c.h_debut,
+            c.h_fin,
+            c.cod_salle
+        FROM affectation a
+        JOIN enseignant e ON a.code_smartex_ens = e.code_smartex_ens
+        JOIN creneau c ON a.creneau_id = c.creneau_id
+        WHERE a.id_session = ?
+    ''', (id_session,))
+    columns = [d[0] for d in cursor.description]
+    # a.* et c.* partagent des noms (h_debut, cod_salle...) : garder la version créneau
+    df = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+    return df.loc[:, ~df.columns.duplicated(keep='last')]
+
+
+# ============================================================================
+# MÉTRIQUES
+# ============================================================================
+
+def voeux_matches(aff_df, voeux_df):
+    """
+    Nombre d'affectations tombant sur chaque vœu de non-surveillance
+
+    Args:
+        aff_df: affectations (code_smartex_ens, jour, seance)
+        voeux_df: vœux (code_smartex_ens, jour, seance)
+
+    Returns:
+        DataFrame: vœux dans leur ordre d'origine + colonne 'nb'
+                   (0 = vœu respecté)
+    """
+    voeux = voeux_df[VOEU_KEYS].reset_index(drop=True)
+    if aff_df.empty or voeux.empty:
+        return voeux.assign(nb=0)
+
+    counts = aff_df.groupby(VOEU_KEYS).size().rename('nb').reset_index()
+    merged = voeux.merge(counts, on=VOEU_KEYS, how='left')
+    merged['nb'] = merged['nb'].fillna(0).astype(int)
+    return merged
+
+
+def charges_enseignants(aff_df, teachers_df):
+    """
+    Nombre de surveillances par enseignant (0 pour les non affectés)
+
+    Args:
+        aff_df: affectations (code_smartex_ens)
+        teachers_df: enseignants (code_smartex_ens + colonnes libres)
+
+    Returns:
+        DataFrame: teachers_df + colonne 'nb_surveillances'
+    """
+    counts = aff_df['code_smartex_ens'].value_counts() if not aff_df.empty else pd.Series(dtype=int)
+    result = teachers_df.copy()
+    result['nb_surveillances'] = (
+        result['code_smartex_ens'].map(counts).fillna(0).astype(int)
+    )
+    return result
+
+
+def charges_par_grade(charges_df, grade_col='grade_code_ens'):
+    """
+    Agrégats de charge par grade (ordre de première apparition du grade)
+
+    Returns:
+        DataFrame indexé par grade : nb_enseignants, total, min, max,
+        moyenne, sans_affectation
+    """
+    if charges_df.empty:
+        return pd.DataFrame(columns=['nb_enseignants', 'total', 'min', 'max',
+                                     'moyenne', 'sans_affectation'])
+    nb = charges_df['nb_surveillances']
+    return charges_df.assign(zero=(nb == 0).astype(int)).groupby(grade_col, sort=False).agg(
+        nb_enseignants=('nb_surveillances', 'size'),
+        total=('nb_surveillances', 'sum'),
+        min=('nb_surveillances', 'min'),
+        max=('nb_surveillances', 'max'),
+        moyenne=('nb_surveillances', 'mean'),
+        sans_affectation=('zero', 'sum')
+    )
+
+
+def couverture_salles(aff_df, infos=('dateExam', 'h_debut')):
+    """
+    Nombre de surveillants par (créneau, salle)
+
+    Les affectations sans salle sont ignorées. Les colonnes `infos`
+    présentes sont reprises depuis la première affectation du créneau.
+
+    Returns:
+        DataFrame: creneau_id, cod_salle, nb_surveillants (+ infos)
+    """
+    valid = aff_df.dropna(subset=['creneau_id', 'cod_salle'])
+    if valid.empty:
+        return pd.DataFrame(columns=['creneau_id', 'cod_salle', 'nb_surveillants'])
+
+    result = (valid.groupby(['creneau_id', 'cod_salle'], sort=False)
+              .size().rename('nb_surveillants').reset_index())
+
+    infos = [c for c in infos if c in aff_df.columns]
+    if infos:
+        first = aff_df.groupby('creneau_id', sort=False)[infos].first()
+        result = result.join(first, on='creneau_id')
+    return result
+
+
+def seance_numbers(seances):
+    """'S1' -> 1, 'S2' -> 2 ... (NaN si la séance n'est pas au format Sx)"""
+    extracted = seances.astype(str).str.strip().str.upper().str.extract(r'^S(\d+)$')[0]
+    return pd.to_numeric(extracted, errors='coerce')
+
+
+def dispersion_journaliere(aff_df):
+    """
+    Surveillances multiples d'un même enseignant dans une journée
+
+    Un couple (enseignant, jour) ayant plusieurs affectations est compté
+    comme "consécutif" si deux de ses séances se suivent (écart 1),
+    "espacé" sinon.
+
+    Returns:
+        dict: total_multi, consecutives, espacees
+    """
+    if aff_df.empty:
+        return {'total_multi': 0, 'consecutives': 0, 'espacees': 0}
+
+    df = aff_df[['code_smartex_ens', 'jour', 'seance']].copy()
+    df['num'] = seance_numbers(df['seance'])
+    keys = ['code_smartex_ens', 'jour']
+
+    sizes = df.groupby(keys).size()
+    total_multi = int((sizes > 1).sum())
+
+    seances = (df.dropna(subset=['num'])
+               .drop_duplicates(keys + ['num'])
+               .sort_values(keys + ['num']))
+    seances['gap'] = seances.groupby(keys)['num'].diff()
+    min_gap = seances.groupby(keys)['gap'].min().dropna()
+    # Seuls les jours à plusieurs affectations sont qualifiés
+    min_gap = min_gap[min_gap.index.isin(sizes[sizes > 1].index)]
+
+    consecutives = int((min_gap == 1).sum())
+    return {
+        'total_multi': total_multi,
+        'consecutives': consecutives,
+        'espacees': int(len(min_gap) - consecutives)
+    }
+
+
+def responsables_absents(aff_df, resp_df, date_col='dateExam', aff_date_col='dateExam'):
+    """
+    Responsables sans aucune affectation un jour où ils ont un examen
+
+    Args:
+        aff_df: affectations (code_smartex_ens + aff_date_col)
+        resp_df: responsabilités (code_smartex_ens + date_col)
+
+    Returns:
+        ndarray: codes des responsables absents au moins un jour
+    """
+    resp = resp_df[['code_smartex_ens', date_col]].drop_duplicates()
+    if resp.empty:
+        return np.array([], dtype=int)
+
+    presences = (aff_df[['code_smartex_ens', aff_date_col]]
+                 .drop_duplicates()
+                 .rename(columns={aff_date_col: date_col})
+                 .assign(present=True))
+    merged = resp.merge(presences, on=['code_smartex_ens', date_col], how='left')
+    return merged.loc[merged['present'].isna(), 'code_smartex_ens'].unique()
+
+
+def comptages(aff_df, colonne):
+    """Nombre d'affectations par valeur de `colonne` (valeurs nulles comprises)"""
+    if aff_df.empty:
+        return {}
+    counts = aff_df[colonne].value_counts(dropna=False, sort=False)
+    return {(None if pd.isna(k) else _native(k)): int(v) for k, v in counts.items()}
+
+
+def _native(value):
+    """Convertir un scalaire numpy en type Python (sérialisable en JSON)"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,109 @@
+"""
+utils/xlsx_export.py
+Export Excel (XLSX) du planning de surveillance d'une session
+
+Le classeur est construit avec openpyxl en mode write_only : les lignes
+sont lues au fil du curseur SQLite et écrites aussitôt (chaque feuille est
+mise en tampon dans un fichier temporaire par openpyxl), la mémoire reste
+constante quelle que soit la taille de la session.
+
+Feuilles :
+- une feuille par jour d'examen (séance, enseignant, salle), dans l'ordre
+  des pages du PDF d'affectation
+- une feuille de synthèse par grade (surveillances de chaque enseignant
+  comparées au quota du grade)
+"""
+
+from itertools import groupby
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Caractères interdits dans un nom de feuille Excel (31 caractères maximum)
+_SHEET_FORBIDDEN = str.maketrans({c: '-' for c in '[]:*?/\\'})
+
+_TITLE_FONT = Font(bold=True, size=12)
+_HEADER_FONT = Font(bold=True, color='FFFFFF')
+_HEADER_FILL = PatternFill('solid', fgColor='305496')
+_CENTER = Alignment(horizontal='center')
+
+
+def sheet_title(text):
+    return str(text).translate(_SHEET_FORBIDDEN)[:31]
+
+
+def _title_row(ws, text):
+    cell = WriteOnlyCell(ws, value=text)
+    cell.font = _TITLE_FONT
+    ws.append([cell])
+
+
+def _header_row(ws, labels):
+    cells = []
+    for label in labels:
+        cell = WriteOnlyCell(ws, value=label)
+        cell.font = _HEADER_FONT
+        cell.fill = _HEADER_FILL
+        cell.alignment = _CENTER
+        cells.append(cell)
+    ws.append(cells)
+
+
+def _new_sheet(wb, title, widths, heading, labels):
+    ws = wb.create_sheet(title=sheet_title(title))
+    # Largeurs et volet figé à définir avant la première ligne (write_only)
+    for letter, width in zip('ABCDEFGH', widths):
+        ws.column_dimensions[letter].width = width
+    ws.freeze_panes = 'A4'
+    _title_row(ws, heading)
+    ws.append([])
+    _header_row(ws, labels)
+    return ws
+
+
+def write_planning_xlsx(fileobj, session_info, seance_rows, grade_rows):
+    """
+    Écrire le classeur du planning dans fileobj
+
+    Args:
+        session_info: ligne de la table session
+        seance_rows: lignes (date_examen, seance, jour, enseignant_nom,
+                     cod_salle) triées par date puis séance
+        grade_rows: lignes (grade_code_ens, quota, code_smartex_ens, nom_ens,
+                    prenom_ens, nb_surveillances) triées par grade
+
+    Returns:
+        dict: nombre de feuilles jour / grade et d'affectations écrites
+    """
+    info = (f"AU : {session_info['AU']} – Semestre : {session_info['Semestre']}"
+            f" – Session : {session_info['type_session']}")
+    wb = Workbook(write_only=True)
+    counts = {'jours': 0, 'grades': 0, 'affectations': 0}
+
+    by_date = groupby(seance_rows, key=lambda row: (row['date_examen'], row['jour']))
+    for (date_examen, jour), rows in by_date:
+        ws = _new_sheet(wb, f"Jour {jour} - {date_examen}", (10, 40, 14),
+                        f"{info} – Date : {date_examen}", ('Séance', 'Enseignant', 'Salle'))
+        for row in rows:
+            ws.append([row['seance'], row['enseignant_nom'], row['cod_salle'] or ''])
+            counts['affectations'] += 1
+        counts['jours'] += 1
+
+    by_grade = groupby(grade_rows, key=lambda row: (row['grade_code_ens'], row['quota']))
+    for (grade, quota), rows in by_grade:
+        ws = _new_sheet(wb, f"Grade {grade}", (14, 24, 24, 14, 10, 10),
+                        f"{info} – Grade : {grade} (quota : {quota if quota is not None else '-'})",
+                        ('Code', 'Nom', 'Prénom', 'Surveillances', 'Quota', 'Écart'))
+        for row in rows:
+            ecart = row['nb_surveillances'] - quota if quota is not None else None
+            ws.append([row['code_smartex_ens'], row['nom_ens'], row['prenom_ens'],
+                       row['nb_surveillances'], quota, ecart])
+        counts['grades'] += 1
+
+    if not wb.worksheets:
+        wb.create_sheet(title='Planning').append(['Aucune affectation'])
+    wb.save(fileobj)
+    return counts
@@ -0,0 +1,128 @@
+"""
+utils/zip_stream.py
+Archives ZIP envoyées au fil de l'eau (sans construire l'archive en mémoire)
+
+zipfile écrit dans un flux non "seekable" : chaque entrée est suivie d'un
+descripteur de données (CRC, tailles) au lieu de revenir corriger l'en-tête
+local. Le flux est vidé après chaque bloc lu, la mémoire utilisée reste
+donc constante quelle que soit la taille de l'archive, et le premier
+octet part dès la première entrée.
+
+- Les PDF (déjà compressés) sont stockés tels quels (ZIP_STORED)
+- Les autres fichiers (CSV...) sont compressés (ZIP_DEFLATED)
+- ZIP64 est utilisé dès qu'une taille, un offset ou le nombre d'entrées
+  dépasse les limites du format ZIP classique
+
+Une entrée peut être un fichier du disque ou un contenu produit à la
+volée (octets, ou fonction renvoyant des morceaux d'octets) : des exports
+générés en mémoire sont ainsi archivés sans fichier intermédiaire.
+"""
+
+import io
+import os
+import time
+import zipfile
+
+from flask import Response
+
+CHUNK_SIZE = 64 * 1024
+
+# Formats déjà compressés : les recompresser coûte du CPU pour rien
+STORED_EXTENSIONS = {'.pdf', '.zip', '.png', '.jpg', '.jpeg', '.xlsx', '.parquet', '.gz'}
+
+
+class _Sink(io.RawIOBase):
+    """Tampon d'écriture non seekable, vidé par le générateur"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def compression_for(filename):
+    """ZIP_STORED pour les formats déjà compressés, ZIP_DEFLATED sinon"""
+    extension = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def iter_zip(entries, chunk_size=CHUNK_SIZE):
+    """
+    Générer les octets d'une archive ZIP
+
+    Args:
+        entries: itérable de (source, nom dans l'archive), la source étant
+                 un chemin de fichier, des octets, ou une fonction sans
+                 argument renvoyant un itérable de morceaux d'octets
+
+    Yields:
+        bytes: morceaux successifs de l'archive
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+        for source, arcname in entries:
+            if isinstance(source, (str, os.PathLike)):
+                # Taille connue à l'avance : zipfile choisit seul l'en-tête ZIP64
+                info = zipfile.ZipInfo.from_file(source, arcname)
+                chunks = _read_file(source, chunk_size)
+                force_zip64 = False
+            else:
+                info = zipfile.ZipInfo(arcname, time.localtime()[:6])
+                info.external_attr = 0o644 << 16
+                if isinstance(source, (bytes, bytearray)):
+                    info.file_size = len(source)
+                    chunks = [source]
+                    force_zip64 = False
+                else:
+                    # Taille inconnue : en-tête ZIP64 par précaution
+                    chunks = source()
+                    force_zip64 = True
+            info.compress_type = compression_for(arcname)
+            with archive.open(info, 'w', force_zip64=force_zip64) as target:
+                for chunk in chunks:
+                    target.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Répertoire central (écrit à la fermeture)
+    yield sink.drain()
+
+
+def _read_file(path, chunk_size):
+    with open(path, 'rb') as source:
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def zip_response(entries, download_name, headers=None):
+    """
+    Réponse Flask envoyant une archive ZIP en flux
+
+    Les fichiers doivent avoir été vérifiés au préalable : une fois
+    l'envoi commencé, une erreur ne peut plus changer le statut HTTP.
+    """
+    response = Response(iter_zip(list(entries)), mimetype='application/zip', headers=headers)
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    return response